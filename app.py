@@ -1,8 +1,14 @@
 import streamlit as st
-import tempfile
-import os
-from utils.llm_engine import analyze_and_structure_text
-from utils.ppt_engine import create_presentation
+from utils import telemetry, warmup
+from utils.jobs import jobs, QueueFullError, DONE, FAILED
+from utils.schema import normalize_slides
+from utils.llm_engine import (
+    stream_slides, stream_slide_updates, draft_slides, estimate_slide_count, as_generation_error,
+    OFFLINE_PROVIDER, TWO_STAGE,
+)
+
+JOB_POLL_SECONDS = 0.5
+THUMB_COLUMNS = 3
 
 # --- CONFIGURATION ---
 st.set_page_config(page_title="Text to PPTX Generator", layout="wide", page_icon="✨")
@@ -118,6 +124,96 @@ if "uploader_key" not in st.session_state:
     st.session_state.uploader_key = 0
 if "slides_data" not in st.session_state:
     st.session_state.slides_data = None
+# Background job ids; the work itself lives in utils.jobs and survives reruns
+for key in ("generate_job", "render_job", "job_notice"):
+    if key not in st.session_state:
+        st.session_state[key] = None
+# Stage timings of the last finished run of each kind, for the debug panel
+if "last_timings" not in st.session_state:
+    st.session_state.last_timings = {}
+
+# --- BACKGROUND WORK (runs on the shared job pool, no st.* calls in here) ---
+def generate_job(job, provider, api_key, text, guidance, est_slides, routing, offline_draft=False, two_stage=False):
+    with telemetry.trace("generate", provider=provider, two_stage=two_stage) as run:
+        job.trace = run
+        if offline_draft:
+            # Shown until the first LLM slide arrives; kept as the result if the providers are down
+            job.preview = draft_slides(text, est_slides)
+        if two_stage:
+            # Outline slides first, then each one again once its notes are written
+            updates = stream_slide_updates(provider, api_key, text, guidance, est_slides, cancel=job.cancel_event, **routing)
+        else:
+            updates = enumerate(stream_slides(provider, api_key, text, guidance, est_slides, cancel=job.cancel_event, **routing))
+        try:
+            for i, slide in updates:
+                job.report(slide, index=i)
+                if job.cancelled:
+                    break
+        except Exception as e:
+            if job.progress or not job.preview or as_generation_error(e).kind != "provider":
+                raise
+            return list(job.preview)
+        job.preview = None
+    return list(job.progress)
+
+def render_job(job, template_bytes, slides_data):
+    from utils.ppt_engine import render_presentation  # Loaded by warmup, off the first page load
+    with telemetry.trace("render", slides=len(slides_data)) as run:
+        job.trace = run
+        # Generate fully in memory (no temp files shared between sessions);
+        # slides unchanged since the last download are reused, not re-rendered
+        return render_presentation(template_bytes, slides_data).getvalue()
+
+def render_thumbnail_grid(template_bytes, slides):
+    """
+    Slides as the export will lay them out, drawn locally; cached per slide, so
+    after an edit only that slide is drawn again.
+    """
+    from utils.thumbnails import render_thumbnails  # Loaded by warmup, off the first page load
+    try:
+        images = render_thumbnails(template_bytes, slides)
+    except Exception as e:
+        # Only a preview: a template it can't draw must not block editing or export
+        st.caption(f"🖼️ No thumbnails for this template ({e}).")
+        return
+    for start in range(0, len(slides), THUMB_COLUMNS):
+        for col, i in zip(st.columns(THUMB_COLUMNS), range(start, min(start + THUMB_COLUMNS, len(slides)))):
+            col.image(images[i], caption=f"{i + 1}. {slides[i].title}")
+
+def render_slide_card(i, slide, editable=False):
+    with st.expander(f"Slide {i+1}: {slide.title}", expanded=False):
+        st.markdown(f"""
+        <div class="slide-card">
+            <b>Title:</b> {slide.title}
+        </div>
+        """, unsafe_allow_html=True)
+
+        st.markdown("**Content Points:**")
+        for point in slide.content:
+            st.write(f"• {point}")
+
+        st.markdown(f"**🗣️ Speaker Notes:** _{slide.notes or 'No notes'}_")
+
+        if editable:
+            render_slide_editor(i, slide)
+
+def render_slide_editor(i, slide):
+    """
+    Edits one slide in place; only edited slides are re-rendered on the next download.
+    Edits go through the same validation as generated slides, so an overlong
+    slide may come back as several.
+    """
+    with st.form(f"edit_slide_{i}"):
+        title = st.text_input("Title", value=slide.title)
+        content = st.text_area("Content points (one per line)", value="\n".join(slide.content))
+        notes = st.text_area("Speaker notes", value=slide.notes or "")
+        if st.form_submit_button("💾 Save slide"):
+            edited = {"title": title, "content": content}
+            if notes or slide.notes is not None:
+                edited["notes"] = notes
+            st.session_state.slides_data[i:i + 1] = normalize_slides([edited])
+            st.session_state.render_job = None  # The built deck is stale now
+            st.rerun()
 
 # --- HEADER SECTION ---
 st.markdown("""
@@ -135,20 +231,41 @@ with st.sidebar:
     st.markdown("#### 🧠 AI Model")
     provider = st.selectbox(
         "Select Provider",
-        ["Google Gemini", "OpenAI", "Anthropic"],
+        ["Google Gemini", "OpenAI", "Anthropic", OFFLINE_PROVIDER],
         label_visibility="collapsed"
     )
+    offline = provider == OFFLINE_PROVIDER
     
     st.markdown("#### 🔑 API Key")
     api_key = st.text_input(
         "API Key",
         type="password", 
-        placeholder=f"Paste {provider} Key",
+        placeholder="No key needed offline" if offline else f"Paste {provider} Key",
+        disabled=offline,
         label_visibility="collapsed"
     )
 
     st.info("🔒 Keys are processed securely in memory.")
 
+    # Optional extra providers for failover / hedging
+    with st.expander("🛟 Backup Providers (optional)"):
+        st.caption("Used automatically if the main provider fails. Hedging also races a backup when the main one is slow.")
+        backup_keys = {}
+        for other in ["Google Gemini", "OpenAI", "Anthropic"]:
+            if other != provider:
+                backup_keys[other] = st.text_input(f"{other} Key", type="password", key=f"backup_key_{other}")
+        hedge_enabled = st.checkbox("⚡ Hedge slow requests", value=False, disabled=not any(backup_keys.values()))
+        hedge_after = st.number_input("Hedge after (seconds)", min_value=1.0, max_value=60.0, value=8.0, step=1.0)
+    offline_draft = not offline and st.checkbox(
+        "⚡ Instant offline draft", value=True,
+        help="Drafts slides locally while the AI works, and keeps that draft if every provider fails.",
+    )
+    two_stage = not offline and st.checkbox(
+        "🧩 Outline first, notes in parallel", value=TWO_STAGE,
+        help="Streams a compact outline, then writes each slide's speaker notes in its own concurrent request: "
+             "one extra paid API call per slide (N+1 calls per deck instead of 1).",
+    )
+
     st.markdown("---")
     
     # 2. Tone / Style
@@ -183,6 +300,20 @@ with st.sidebar:
         if st.button("↺ Change Template"):
             st.session_state.uploader_key += 1
             st.rerun()
+    show_thumbnails = st.checkbox(
+        "🖼️ Thumbnail previews", value=True, disabled=not uploaded_template,
+        help="Draws each slide on the template locally, without building the deck.",
+    )
+
+    st.markdown("---")
+    show_timings = st.checkbox("⏱️ Debug timings", value=False, help="Stage-by-stage timings of the last run.")
+
+# Load the SDKs and parse the template in the background while the user is still typing
+warmup.start(
+    providers=[provider] + [name for name, key in backup_keys.items() if key] + ([OFFLINE_PROVIDER] if offline_draft else []),
+    templates=[uploaded_template.getvalue()] if uploaded_template else [],
+)
+telemetry.serve_metrics()  # Only when SMART_PPT_METRICS_PORT is set
 
 # --- MAIN CONTENT ---
 
@@ -204,45 +335,121 @@ with col_act1:
 
 # Step 1: Analyze & Preview Logic
 if generate_clicked:
-    if not api_key:
+    if not api_key and not offline:
         st.error(f"⚠️ Please enter your {provider} API Key in the sidebar.")
     elif not uploaded_template:
         st.error("⚠️ Please upload a .pptx template file in the sidebar.")
     elif not input_text:
         st.error("⚠️ Please enter text to convert.")
     else:
-        with st.spinner("🔮 AI is analyzing structure and designing slides..."):
-            # Estimate Slides
-            est_slides = max(1, len(input_text) // 500)
-            
-            # Get JSON (Logic Untouched)
-            data = analyze_and_structure_text(provider, api_key, input_text, guidance or "Professional", est_slides)
-            
-            if data:
-                st.session_state.slides_data = data
-                st.success("✨ Structure successfully generated! Review the plan below.")
-            else:
-                st.error("❌ Failed to generate structure. Please check the API key or text.")
+        # Estimate Slides (capped by the global slide budget)
+        est_slides = estimate_slide_count(input_text)
+        routing = {"backups": backup_keys, "hedge": hedge_enabled, "hedge_after": hedge_after}
+        try:
+            if st.session_state.generate_job:
+                jobs.cancel(st.session_state.generate_job)
+            st.session_state.generate_job = jobs.submit(
+                generate_job, provider, api_key, input_text, guidance or "Professional", est_slides, routing,
+                offline_draft, two_stage, kind="generate",
+            )
+        except QueueFullError as e:
+            st.error(f"⏳ {e}")
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def generation_progress():
+    """
+    Polls the generation job; slides are rendered as soon as each one streams in.
+    """
+    job = jobs.get(st.session_state.generate_job)
+    if job is None:
+        st.session_state.generate_job = None
+        st.rerun()
+    if not job.finished:
+        st.markdown("### 🎞️ Slides Arriving...")
+        waiting = "⏳ Waiting for a free worker..." if job.status == "queued" else "🔮 AI is analyzing structure and designing slides..."
+        slides = list(job.progress)
+        pending = sum(1 for slide in slides if slide.notes is None)
+        st.info(f"{waiting} ({len(slides)} slides so far" + (f", {pending} awaiting notes)" if pending else ")"))
+        if st.button("✖ Cancel generation"):
+            jobs.cancel(job.id)
+        if not slides and job.preview:
+            st.caption("⚡ Offline draft, replaced as soon as the AI's slides arrive:")
+            slides = job.preview
+        for i, slide in enumerate(slides):
+            render_slide_card(i, slide)
+        return
+
+    # Finished: hand the result to the page and stop polling
+    data = job.result if job.status == DONE else list(job.progress)
+    if job.trace:
+        st.session_state.last_timings["generate"] = job.trace.summary()
+    if job.status == FAILED:
+        notice = ("error", as_generation_error(job.error).message)
+    elif job.status != DONE:
+        notice = ("warning", "✖ Generation cancelled.")
+    elif data and job.preview:
+        notice = ("warning", "⚠️ The AI provider could not be reached. Showing the offline draft instead.")
+    elif data:
+        notice = ("success", "✨ Structure successfully generated! Review the plan below.")
+    else:
+        notice = ("error", "❌ Failed to generate structure. Please check the API key or text.")
+    if data:
+        st.session_state.slides_data = data
+        st.session_state.render_job = None
+        if job.status != DONE:
+            notice = ("warning", f"⚠️ Generation stopped early. Showing the {len(data)} slides received.")
+    st.session_state.job_notice = notice
+    st.session_state.generate_job = None
+    st.rerun()
+
+if st.session_state.generate_job:
+    generation_progress()
+
+if st.session_state.job_notice:
+    level, message = st.session_state.job_notice
+    getattr(st, level)(message)
+    st.session_state.job_notice = None
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def render_progress(job_id):
+    job = jobs.get(job_id)
+    if job is None or job.finished:
+        st.rerun()
+    st.info("🎨 Assembling your mastery...")
+
+def render_download(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        st.session_state.render_job = None
+        st.warning("⌛ The finished deck expired, please build it again.")
+    elif not job.finished:
+        render_progress(job_id)
+    elif job.status == FAILED:
+        st.error(f"Error generating PPT: {job.error}")
+    elif job.status == DONE:
+        if st.session_state.get("celebrated_job") != job_id:
+            st.session_state.celebrated_job = job_id
+            if job.trace:
+                st.session_state.last_timings["render"] = job.trace.summary()
+            st.balloons()
+        st.download_button(
+            label="📄 Click to Save .pptx",
+            data=job.result,
+            file_name="generated_deck.pptx",
+            mime="application/vnd.openxmlformats-officedocument.presentationml.presentation"
+        )
 
 # Step 2: Display Preview & Download
 if st.session_state.slides_data:
     st.markdown("---")
     st.markdown("### 🎞️ Slide Plan Preview")
     
+    if uploaded_template and show_thumbnails:
+        render_thumbnail_grid(uploaded_template.getvalue(), st.session_state.slides_data)
+
     # Create a grippy layout for cards
     for i, slide in enumerate(st.session_state.slides_data):
-        with st.expander(f"Slide {i+1}: {slide.get('title', 'Untitled')}", expanded=False):
-            st.markdown(f"""
-            <div class="slide-card">
-                <b>Title:</b> {slide.get('title', 'Untitled')}
-            </div>
-            """, unsafe_allow_html=True)
-            
-            st.markdown("**Content Points:**")
-            for point in slide.get('content', []):
-                st.write(f"• {point}")
-            
-            st.markdown(f"**🗣️ Speaker Notes:** _{slide.get('notes', 'No notes')}_")
+        render_slide_card(i, slide, editable=True)
 
     st.markdown("---")
     
@@ -250,34 +457,37 @@ if st.session_state.slides_data:
     c1, c2, c3 = st.columns([1, 2, 1])
     with c2:
         if st.button("📥 Download Final PowerPoint", type="primary", use_container_width=True):
-            with st.spinner("🎨 Assembling your mastery..."):
+            if not uploaded_template:
+                st.error("⚠️ Please upload a .pptx template file in the sidebar.")
+            else:
                 try:
-                    # Save Temp Template
-                    with tempfile.NamedTemporaryFile(delete=False, suffix=".pptx") as tmp_file:
-                        tmp_file.write(uploaded_template.getvalue())
-                        tmp_path = tmp_file.name
-                    
-                    # Generate (Logic Untouched)
-                    output_file = create_presentation(tmp_path, st.session_state.slides_data)
-                    
-                    # Re-read for download
-                    with open(output_file, "rb") as f:
-                        file_data = f.read()
-
-                    st.balloons()
-                    st.download_button(
-                        label="📄 Click to Save .pptx",
-                        data=file_data,
-                        file_name="generated_deck.pptx",
-                        mime="application/vnd.openxmlformats-officedocument.presentationml.presentation"
+                    st.session_state.render_job = jobs.submit(
+                        render_job, uploaded_template.getvalue(), list(st.session_state.slides_data), kind="render",
                     )
+                except QueueFullError as e:
+                    st.error(f"⏳ {e}")
+
+        if st.session_state.render_job:
+            render_download(st.session_state.render_job)
 
-                    # Cleanup
-                    if os.path.exists(output_file): os.remove(output_file)
-                    if os.path.exists(tmp_path): os.remove(tmp_path)
+# Optional per-stage breakdown of the last generation / export
+def render_timings(timings):
+    st.markdown("---")
+    st.markdown("### ⏱️ Debug Timings")
+    for kind, summary in timings.items():
+        tokens = ", ".join(f"{p}: {u['input']} in / {u['output']} out" for p, u in summary["tokens"].items())
+        st.caption(f"**{kind}** — {summary['wall_s'] * 1000:.0f} ms total" + (f" · tokens {tokens}" if tokens else ""))
+        st.table([
+            {"stage": name, "calls": stage["count"], "total ms": round(stage["total_s"] * 1000, 1),
+             "max ms": round(stage["max_s"] * 1000, 1), "errors": stage["errors"]}
+            for name, stage in sorted(summary["stages"].items(), key=lambda item: -item[1]["total_s"])
+        ])
 
-                except Exception as e:
-                    st.error(f"Error generating PPT: {e}")
+if show_timings:
+    if st.session_state.last_timings:
+        render_timings(st.session_state.last_timings)
+    else:
+        st.caption("⏱️ No timed runs yet: generate or download a deck first.")
 
 # --- FOOTER ---
 st.markdown("""
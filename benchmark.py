@@ -0,0 +1,371 @@
+"""
+Offline benchmark harness for the render and parse hot paths.
+
+Every case runs in a fresh child process so peak RSS is per case. Wall time is the
+median of --repeat timed runs; allocations come from one extra traced run
+(tracemalloc), kept apart so tracing doesn't skew the timings.
+
+    python benchmark.py                          # all cases, results to bench_results.json
+    python benchmark.py --cases render_10 extract_large
+    python benchmark.py --baseline old.json --max-regression 0.25
+    python benchmark.py --threshold render_100=2.5
+
+The exit code is 1 if a case regresses past --max-regression against the
+baseline, or runs longer than its --threshold.
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+TEMPLATE_PATH = os.path.join(ROOT, "test_template.pptx")
+
+# --- FIXTURES ---
+def make_slides(n):
+    return [
+        {
+            "title": f"Slide {i}: Quarterly results and what they mean for the roadmap",
+            "content": [f"Key point {j} for slide {i} with a realistic amount of text" for j in range(5)],
+            "notes": f"Speaker notes for slide {i}. " * 8,
+        }
+        for i in range(n)
+    ]
+
+def make_payload(kind):
+    body = json.dumps({"slides": make_slides(2000 if kind == "large" else 200)}, indent=2)
+    if kind == "large":
+        return body
+    if kind == "fenced":
+        return "Here is the JSON you asked for:\n```json\n" + body + "\n```\nLet me know if you need changes!"
+    if kind == "malformed":
+        return "Sure! " + body + "\n\nNote: {braces} in trailing commentary }"
+    if kind == "truncated":
+        return body[: int(len(body) * 0.9)]
+    if kind == "defects":
+        # Multi-MB response with trailing commas, raw newlines in strings and a cut-off end
+        body = json.dumps({"slides": make_slides(20000)}, indent=2)
+        body = body.replace('"\n    }', '",\n    }').replace(". Speaker", ".\nSpeaker")
+        return "Here you go:\n" + body[: int(len(body) * 0.97)]
+    raise ValueError(kind)
+
+def make_markdown(sections):
+    parts = ["# Annual Report\n\nThe year brought growth in every region and a leaner cost base."]
+    for i in range(sections):
+        if i % 2:
+            items = "\n".join(f"- Initiative {i}.{j} shipped on time and under budget" for j in range(5))
+            parts.append(f"## Section {i}\n\n{items}")
+        else:
+            prose = " ".join(f"Region {j} grew revenue by {i + j}% while costs in region {j} fell." for j in range(8))
+            parts.append(f"## Section {i}\n\n{prose}\n\nMargins improved as a result. The outlook remains positive.")
+    return "\n\n".join(parts)
+
+def make_png(width, height):
+    """
+    Uncompressible-ish RGB PNG without needing Pillow (a logo-sized asset).
+    """
+    import struct, zlib
+    row = bytes((x * 7 + y) % 256 for y in range(3) for x in range(width))
+    raw = b"".join(b"\x00" + row[: width * 3] for _ in range(height))
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", ihdr) + chunk(b"IDAT", zlib.compress(raw)) + chunk(b"IEND", b"")
+
+def _template_bytes():
+    with open(TEMPLATE_PATH, "rb") as f:
+        return f.read()
+
+# --- CASES ---
+# name -> setup() returning a zero-argument callable to time
+def _render_case(n):
+    def setup():
+        from utils.ppt_engine import create_presentation
+        template, slides = _template_bytes(), make_slides(n)
+        create_presentation(template, slides[:1])  # warm the template cache
+        return lambda: create_presentation(template, slides)
+    return setup
+
+def _stream_case(n):
+    """
+    Streaming writer fed by a generator, so neither the slide dicts nor the
+    slide trees are all alive at once.
+    """
+    def setup():
+        from utils.ppt_engine import create_presentation
+        template = _template_bytes()
+        create_presentation(template, make_slides(1), output=io.BytesIO())  # warm the caches
+        return lambda: create_presentation(template, (make_slides(1)[0] for _ in range(n)), output=io.BytesIO())
+    return setup
+
+def _rerender_case(n):
+    """
+    Re-export of an n-slide deck after editing one slide.
+    """
+    def setup():
+        from utils.ppt_engine import render_presentation
+        template, slides = _template_bytes(), make_slides(n)
+        render_presentation(template, slides)  # prime the fragment cache
+        edits = iter(range(10**9))
+        def run():
+            slides[n // 2] = dict(slides[n // 2], title=f"Edited title {next(edits)}")
+            render_presentation(template, slides)
+        return run
+    return setup
+
+def _image_case(n):
+    """
+    The same logo placed on n slides, then saved.
+    """
+    def setup():
+        from pptx import Presentation
+        from pptx.util import Inches
+        from utils.ppt_engine import fit_image_in_box
+        template, logo = _template_bytes(), make_png(400, 100)
+        def run():
+            prs = Presentation(io.BytesIO(template))
+            layout = prs.slide_layouts[len(prs.slide_layouts) - 1]
+            for _ in range(n):
+                slide = prs.slides.add_slide(layout)
+                fit_image_in_box(slide, logo, Inches(0.5), Inches(0.5), Inches(2), Inches(1))
+            prs.save(io.BytesIO())
+        return run
+    return setup
+
+def _extract_case(kind):
+    def setup():
+        from utils.llm_engine import extract_json_from_text
+        payload = make_payload(kind)
+        def run():
+            cleaned = extract_json_from_text(payload)
+            try:
+                json.loads(cleaned)
+            except json.JSONDecodeError:
+                pass  # Measuring the cost, not the success
+        return run
+    return setup
+
+def _thumbnail_case(n, one_edit=False):
+    """
+    Preview grid of an n-slide deck: every slide drawn (template design already
+    drawn), or after editing one slide, when only that one is.
+    """
+    def setup():
+        from utils.thumbnails import render_thumbnails, thumbnail_cache, warm_thumbnails
+        template, slides = _template_bytes(), make_slides(n)
+        render_thumbnails(template, slides)  # draw the design layer, prime the cache
+        edits = iter(range(10**9))
+        def run():
+            if one_edit:
+                slides[n // 2] = dict(slides[n // 2], title=f"Edited title {next(edits)}")
+            else:
+                thumbnail_cache.clear()
+                warm_thumbnails(template)
+            render_thumbnails(template, slides)
+        return run
+    return setup
+
+def _draft_case(sections):
+    def setup():
+        from utils.extractive import draft_slides
+        text = make_markdown(sections)
+        draft_slides(text, 40)  # Import NumPy and compile the regexes outside the timing
+        def run():
+            draft_slides(text, 40)
+        return run
+    return setup
+
+def _validate_case(n):
+    """
+    Schema validation of a large parsed deck: mostly clean slides, with the
+    usual LLM defects (string content, nested lists, overlong bullets and slides) mixed in.
+    """
+    def setup():
+        from utils.schema import normalize_slides
+        slides = make_slides(n)
+        for i, slide in enumerate(slides):
+            if i % 10 == 1:
+                slide["content"] = "\n".join(f"- {point}" for point in slide["content"])
+            elif i % 10 == 2:
+                slide["content"] = [slide["content"][:2], slide["content"][2:]]
+            elif i % 10 == 3:
+                slide["content"] = slide["content"] + [slide["notes"] * 2] * 6
+        def run():
+            normalize_slides(slides)
+        return run
+    return setup
+
+def _e2e_mock_setup():
+    from utils.llm_engine import analyze_and_structure_text
+    from utils.ppt_engine import create_presentation
+    template = _template_bytes()
+    def run():
+        slides = analyze_and_structure_text("Google Gemini", "TEST_KEY", "Benchmark text.", "Professional", 2)
+        create_presentation(template, slides)
+    return run
+
+def _e2e_fake_provider_setup(latency=0.25):
+    from utils.fake_provider import FakeProviderServer
+    server = FakeProviderServer(latency=latency, payload={"slides": make_slides(12)}).start()
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+    from utils import llm_engine
+    from utils.ppt_engine import create_presentation
+    llm_engine.CACHE_ENABLED = False
+    template = _template_bytes()
+    llm_engine.generate_slides("OpenAI", "fake-key", "warm up", "Professional", 12)  # SDK import + connection
+    def run():
+        slides = llm_engine.generate_slides("OpenAI", "fake-key", "Benchmark text.", "Professional", 12)
+        create_presentation(template, slides)
+    return run
+
+def _e2e_two_stage_setup(latency=0.25):
+    """
+    Outline plus 12 concurrent per-slide refinements against the fake provider;
+    should take about two provider round trips, not thirteen.
+    """
+    from utils.fake_provider import FakeProviderServer
+    outline = [{"title": s["title"], "content": s["content"]} for s in make_slides(12)]
+    server = FakeProviderServer(latency=latency, payload={"slides": outline}).start()
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+    from utils import llm_engine
+    llm_engine.CACHE_ENABLED = False
+    llm_engine.generate_slides("OpenAI", "fake-key", "warm up", "Professional", 12)  # SDK import + connection
+    def run():
+        for _ in llm_engine.stream_slide_updates("OpenAI", "fake-key", "Benchmark text.", "Professional", 12):
+            pass
+    return run
+
+CASES = {
+    "render_10": _render_case(10),
+    "render_100": _render_case(100),
+    "render_1000": _render_case(1000),
+    "stream_1000": _stream_case(1000),
+    "rerender_1000_one_edit": _rerender_case(1000),
+    "images_200_same_logo": _image_case(200),
+    "thumbnails_20": _thumbnail_case(20),
+    "thumbnails_100_one_edit": _thumbnail_case(100, one_edit=True),
+    "extract_large": _extract_case("large"),
+    "extract_fenced": _extract_case("fenced"),
+    "extract_malformed": _extract_case("malformed"),
+    "extract_truncated": _extract_case("truncated"),
+    "extract_defects_large": _extract_case("defects"),
+    "draft_markdown_40": _draft_case(40),
+    "draft_markdown_400": _draft_case(400),
+    "validate_10000": _validate_case(10000),
+    "e2e_mock": _e2e_mock_setup,
+    "e2e_fake_provider": _e2e_fake_provider_setup,
+    "e2e_two_stage": _e2e_two_stage_setup,
+}
+
+# --- RUNNER ---
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def _run_case(name, repeat):
+    """
+    Executed in a child process.
+    """
+    sys.path.insert(0, ROOT)
+    run = CASES[name]()
+    run()  # warm-up
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    run()
+    snapshot = tracemalloc.take_snapshot()
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stats = snapshot.statistics("filename")
+
+    return {
+        "wall_s": round(statistics.median(timings), 6),
+        "wall_min_s": round(min(timings), 6),
+        "wall_max_s": round(max(timings), 6),
+        "repeat": repeat,
+        "peak_rss_mb": _peak_rss_mb(),
+        "traced_peak_mb": round(traced_peak / (1024 * 1024), 3),
+        "live_blocks_after": sum(s.count for s in stats),
+    }
+
+def run_cases(names, repeat):
+    results = {}
+    ctx = multiprocessing.get_context("spawn")
+    for name in names:
+        with ctx.Pool(1) as pool:
+            results[name] = pool.apply(_run_case, (name, repeat))
+        print(f"{name:<22} {results[name]['wall_s'] * 1000:>10.2f} ms   "
+              f"rss {results[name]['peak_rss_mb']:>7.1f} MB   "
+              f"traced peak {results[name]['traced_peak_mb']:>8.3f} MB")
+    return results
+
+def check(results, baseline=None, max_regression=None, thresholds=None):
+    """
+    Returns a list of human-readable failures.
+    """
+    failures = []
+    for name, limit in (thresholds or {}).items():
+        if name in results and results[name]["wall_s"] > limit:
+            failures.append(f"{name}: {results[name]['wall_s']:.4f}s exceeds threshold {limit:.4f}s")
+    if baseline and max_regression is not None:
+        for name, result in results.items():
+            before = baseline.get("cases", {}).get(name)
+            if not before:
+                continue
+            ratio = result["wall_s"] / max(before["wall_s"], 1e-9)
+            if ratio > 1 + max_regression:
+                failures.append(f"{name}: {ratio:.2f}x slower than baseline ({before['wall_s']:.4f}s -> {result['wall_s']:.4f}s)")
+    return failures
+
+def _parse_thresholds(values):
+    thresholds = {}
+    for value in values or []:
+        name, _, seconds = value.partition("=")
+        thresholds[name] = float(seconds)
+    return thresholds
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks for Smart PPT Generator hot paths.")
+    parser.add_argument("--cases", nargs="*", default=list(CASES), choices=list(CASES))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="Previous results JSON to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.25, help="Allowed slowdown vs baseline (0.25 = 25%%)")
+    parser.add_argument("--threshold", action="append", metavar="CASE=SECONDS", help="Absolute wall-time limit for a case")
+    args = parser.parse_args(argv)
+
+    results = run_cases(args.cases, args.repeat)
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": round(time.time()),
+        "cases": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    failures = check(results, baseline, args.max_regression, _parse_thresholds(args.threshold))
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
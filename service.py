@@ -0,0 +1,453 @@
+"""
+HTTP API for the generator, for systems that can't drive the Streamlit UI.
+
+    uvicorn service:app --port 8000
+
+    POST /v1/templates       raw .pptx body (or multipart field "template") -> {"template_id"}
+    POST /v1/slides          {"provider", "text", "guidance"?, "num_slides"?, "backups"?, "stream"?}
+                             -> {"slides": [...]}, or NDJSON (one slide per line) with
+                             "stream": true / Accept: application/x-ndjson
+    POST /v1/presentations   {"template_id" | "template" (base64), "slides"} or multipart
+                             (template file + "slides" JSON field) -> the .pptx
+    GET  /health, /metrics
+
+The provider API key comes in the X-API-Key header (or "Authorization: Bearer");
+provider "Offline (Extractive)" needs none and drafts slides locally.
+
+Identical requests that are in flight at the same time are coalesced: one LLM
+call per (API key, provider, backups and hedging, text hash, guidance, slide
+count), so no caller is served on another's key, and one render per (template
+hash, slides hash); late joiners of a streamed generation get the slides that
+already arrived, then the rest live. Each API key has at most PER_KEY_CONCURRENCY
+generations running (further ones wait, up to PER_KEY_QUEUE, then get 429) and
+renders share RENDER_CONCURRENCY slots. All of this is per process.
+"""
+import os
+import json
+import base64
+import asyncio
+import hashlib
+import threading
+import contextlib
+from collections import OrderedDict
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+from utils import telemetry, warmup
+from utils.llm_engine import stream_slides, estimate_slide_count, as_generation_error, OFFLINE_PROVIDER
+from utils.schema import dump_slides, normalize_slides
+
+PROVIDERS = ("Google Gemini", "OpenAI", "Anthropic", OFFLINE_PROVIDER)
+PER_KEY_CONCURRENCY = int(os.environ.get("SMART_PPT_API_PER_KEY", 2))
+PER_KEY_QUEUE = int(os.environ.get("SMART_PPT_API_PER_KEY_QUEUE", 8))
+RENDER_CONCURRENCY = int(os.environ.get("SMART_PPT_API_RENDERS", 4))
+RENDER_QUEUE = int(os.environ.get("SMART_PPT_API_RENDER_QUEUE", 64))
+MAX_TEMPLATES = int(os.environ.get("SMART_PPT_API_TEMPLATES", 32))
+MAX_BODY_BYTES = int(os.environ.get("SMART_PPT_API_MAX_BODY", 50 * 1024 * 1024))
+PPTX_MIME = "application/vnd.openxmlformats-officedocument.presentationml.presentation"
+CHUNK_BYTES = 1 << 20
+
+class ApiError(Exception):
+    def __init__(self, status, kind, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.kind = kind
+        self.message = message
+        self.headers = headers
+
+# --- COALESCING ---
+class Flight:
+    """
+    One in-flight computation shared by identical requests. Items and the
+    outcome are published on the server loop; any number of followers replay
+    what already arrived and then wait for more.
+    """
+    def __init__(self, key):
+        self.key = key
+        self.items = []
+        self.result = None
+        self.error = None
+        self.done = False
+        self.followers = 0
+        self.cancel = threading.Event()  # Set once nobody is listening any more
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def publish(self, item):
+        self.items.append(item)
+        self._notify()
+
+    def finish(self, result=None, error=None):
+        self.result, self.error, self.done = result, error, True
+        self._notify()
+
+    async def follow(self):
+        """
+        Yields every item of the flight; raises its error at the end, if any.
+        """
+        self.followers += 1
+        try:
+            i = 0
+            while True:
+                while i < len(self.items):
+                    yield self.items[i]
+                    i += 1
+                if self.done:
+                    if self.error:
+                        raise self.error
+                    return
+                await self._changed.wait()
+        finally:
+            self.followers -= 1
+            if not self.followers and not self.done:
+                self.cancel.set()
+
+    async def wait(self):
+        async for _ in self.follow():
+            pass
+        return self.result
+
+class Coalescer:
+    """
+    Flights by request key. Lives on the server's event loop (no locking).
+    """
+    def __init__(self):
+        self._flights = {}
+        self.counts = {"started": 0, "coalesced": 0}
+
+    def get(self, key):
+        flight = self._flights.get(key)
+        if flight is None or flight.cancel.is_set():
+            return None  # A flight everyone left is winding down with partial results
+        self.counts["coalesced"] += 1
+        return flight
+
+    def start(self, key, work, on_done=None):
+        """
+        Runs `await work(flight)` as the flight for `key`; its return value is the result.
+        """
+        flight = self._flights[key] = Flight(key)
+        self.counts["started"] += 1
+
+        async def run():
+            try:
+                flight.finish(result=await work(flight))
+            except Exception as e:
+                flight.finish(error=e)
+            finally:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                if on_done:
+                    on_done()
+        asyncio.ensure_future(run())
+        return flight
+
+    def stats(self):
+        return {"in_flight": len(self._flights), **self.counts}
+
+class KeyLimiter:
+    """
+    At most `limit` concurrent holders per key; at most `queue` more wait, the
+    rest are turned away with 429.
+    """
+    def __init__(self, limit, queue):
+        self.limit = limit
+        self.queue = queue
+        self._semaphores = {}
+        self._users = {}  # key -> holders + waiters, to drop idle semaphores
+
+    async def acquire(self, key):
+        semaphore = self._semaphores.setdefault(key, asyncio.Semaphore(self.limit))
+        users = self._users.get(key, 0)
+        if users >= self.limit + self.queue:
+            raise ApiError(429, "busy", "Too many concurrent requests for this key.", {"Retry-After": "1"})
+        self._users[key] = users + 1
+        try:
+            await semaphore.acquire()
+        except BaseException:
+            self._drop(key)
+            raise
+
+    def release(self, key):
+        self._semaphores[key].release()
+        self._drop(key)
+
+    def _drop(self, key):
+        self._users[key] -= 1
+        if not self._users[key]:
+            del self._users[key], self._semaphores[key]
+
+    def stats(self):
+        return {"keys": len(self._users), "users": sum(self._users.values())}
+
+coalescer = Coalescer()
+key_limiter = KeyLimiter(PER_KEY_CONCURRENCY, PER_KEY_QUEUE)
+render_limiter = KeyLimiter(RENDER_CONCURRENCY, RENDER_QUEUE)  # One shared key: renders are local CPU work
+
+async def _join_or_start(key, limiter, limit_key, work):
+    """
+    Joins the in-flight twin of a request, or takes a limiter slot and starts it.
+    """
+    flight = coalescer.get(key)
+    if flight is not None:
+        return flight
+    await limiter.acquire(limit_key)
+    flight = coalescer.get(key)  # An identical request may have started while we waited
+    if flight is not None:
+        limiter.release(limit_key)
+        return flight
+    return coalescer.start(key, work, on_done=lambda: limiter.release(limit_key))
+
+# --- TEMPLATES ---
+class TemplateStore:
+    """
+    Uploaded templates by SHA-256, most recently used kept.
+    """
+    def __init__(self, max_templates=MAX_TEMPLATES):
+        self.max_templates = max_templates
+        self._templates = OrderedDict()
+
+    def put(self, template_bytes):
+        template_id = hashlib.sha256(template_bytes).hexdigest()
+        self._templates[template_id] = template_bytes
+        self._templates.move_to_end(template_id)
+        while len(self._templates) > self.max_templates:
+            self._templates.popitem(last=False)
+        return template_id
+
+    def get(self, template_id):
+        template_bytes = self._templates.get(template_id)
+        if template_bytes is None:
+            raise ApiError(404, "unknown_template", "Unknown template_id; upload it to /v1/templates first.")
+        self._templates.move_to_end(template_id)
+        return template_bytes
+
+templates = TemplateStore()
+
+def _check_template(template_bytes):
+    from utils.ppt_engine import warm_template
+    try:
+        warm_template(template_bytes)
+    except Exception as e:
+        raise ApiError(400, "invalid_template", f"Not a usable .pptx template: {e}") from e
+
+# --- REQUEST HELPERS ---
+def _api_key(request, payload):
+    auth = request.headers.get("authorization", "")
+    key = request.headers.get("x-api-key") or (auth[7:] if auth.lower().startswith("bearer ") else None)
+    key = key or payload.get("api_key")
+    if not key:
+        raise ApiError(401, "missing_key", "Send the provider API key in the X-API-Key header.")
+    return key
+
+def _key_id(api_key):
+    # Keys are only ever held in memory for the call; limits are tracked by hash
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+async def _body(request):
+    length = request.headers.get("content-length")
+    if length and int(length) > MAX_BODY_BYTES:
+        raise ApiError(413, "too_large", f"Request body is over {MAX_BODY_BYTES} bytes.")
+    body = await request.body()
+    if len(body) > MAX_BODY_BYTES:
+        raise ApiError(413, "too_large", f"Request body is over {MAX_BODY_BYTES} bytes.")
+    return body
+
+async def _json(request):
+    try:
+        payload = json.loads(await _body(request))
+    except ValueError as e:
+        raise ApiError(400, "invalid_request", f"Body is not valid JSON: {e}") from e
+    if not isinstance(payload, dict):
+        raise ApiError(400, "invalid_request", "Body must be a JSON object.")
+    return payload
+
+def _error_body(exc):
+    if isinstance(exc, ApiError):
+        return {"error": exc.kind, "message": exc.message}
+    error = as_generation_error(exc)
+    return {"error": error.kind, "message": error.message}
+
+def _error_response(exc):
+    if isinstance(exc, ApiError):
+        return JSONResponse(_error_body(exc), status_code=exc.status, headers=exc.headers)
+    return JSONResponse(_error_body(exc), status_code=502)
+
+def _slides_key(provider, api_key, text, guidance, num_slides, routing):
+    """
+    Coalescing key of a generation. It includes the key and every route, since
+    the caller's own key pays for the call and decides how it fails.
+    """
+    backups = tuple(sorted((name, _key_id(key)) for name, key in (routing["backups"] or {}).items() if key))
+    return ("slides", provider, _key_id(api_key) if api_key else None, backups, routing["hedge"],
+            routing["hedge_after"], hashlib.sha256(text.encode("utf-8")).hexdigest(), guidance, num_slides)
+
+def _slides_hash(slides):
+    return hashlib.sha256(dump_slides(slides).encode("utf-8")).hexdigest()
+
+# --- WORK ---
+def _generate(flight, loop, provider, api_key, text, guidance, num_slides, routing):
+    # Runs on a worker thread; slides are handed to the server loop as they stream in
+    with telemetry.trace("api_generate", provider=provider):
+        for slide in stream_slides(provider, api_key, text, guidance, num_slides, cancel=flight.cancel, **routing):
+            loop.call_soon_threadsafe(flight.publish, slide.to_dict())
+
+def _render(template_bytes, slides):
+    from utils.ppt_engine import render_presentation
+    with telemetry.trace("api_render", slides=len(slides)):
+        return render_presentation(template_bytes, slides).getvalue()
+
+# --- ENDPOINTS ---
+async def health(request):
+    return JSONResponse({"status": "ok", "warmup": warmup.status(), "coalescing": coalescer.stats(),
+                         "keys": key_limiter.stats()})
+
+async def metrics(request):
+    return Response(telemetry.registry.prometheus(), media_type="text/plain; version=0.0.4")
+
+async def upload_template(request):
+    try:
+        if request.headers.get("content-type", "").startswith("multipart/form-data"):
+            async with request.form(max_part_size=MAX_BODY_BYTES) as form:
+                upload = form.get("template")
+                if upload is None or isinstance(upload, str):
+                    raise ApiError(400, "invalid_request", 'Multipart uploads need a "template" file field.')
+                template_bytes = await upload.read()
+        else:
+            template_bytes = await _body(request)
+        await asyncio.to_thread(_check_template, template_bytes)
+    except ApiError as e:
+        return _error_response(e)
+    return JSONResponse({"template_id": templates.put(template_bytes)}, status_code=201)
+
+async def create_slides(request):
+    try:
+        payload = await _json(request)
+        provider = payload.get("provider", "Google Gemini")
+        text = payload.get("text")
+        if provider not in PROVIDERS:
+            raise ApiError(400, "invalid_request", f"provider must be one of {', '.join(PROVIDERS)}.")
+        # Offline drafts need no key; their callers share limits per client address
+        api_key = _api_key(request, payload) if provider != OFFLINE_PROVIDER else ""
+        if not isinstance(text, str) or not text.strip():
+            raise ApiError(400, "invalid_request", '"text" must be a non-empty string.')
+        guidance = payload.get("guidance") or "Professional"
+        if not isinstance(guidance, str):
+            raise ApiError(400, "invalid_request", '"guidance" must be a string.')
+        num_slides = payload.get("num_slides") or estimate_slide_count(text)
+        if isinstance(num_slides, bool) or not isinstance(num_slides, int) or num_slides < 1:
+            raise ApiError(400, "invalid_request", '"num_slides" must be a positive integer.')
+        backups, hedge_after = payload.get("backups"), payload.get("hedge_after")
+        if backups is not None and not (isinstance(backups, dict)
+                                        and all(isinstance(v, str) for v in backups.values())):
+            raise ApiError(400, "invalid_request", '"backups" must map provider names to API keys.')
+        if hedge_after is not None and (isinstance(hedge_after, bool) or not isinstance(hedge_after, (int, float))
+                                        or hedge_after <= 0):
+            raise ApiError(400, "invalid_request", '"hedge_after" must be a positive number of seconds.')
+        routing = {"backups": backups, "hedge": bool(payload.get("hedge")), "hedge_after": hedge_after}
+
+        key = _slides_key(provider, api_key, text, guidance, num_slides, routing)
+        loop = asyncio.get_running_loop()
+        flight = await _join_or_start(key, key_limiter, _key_id(api_key or f"offline:{request.client and request.client.host}"), lambda flight: asyncio.to_thread(
+            _generate, flight, loop, provider, api_key, text, guidance, num_slides, routing))
+    except ApiError as e:
+        return _error_response(e)
+
+    no_slides = ApiError(502, "invalid_structure", "The provider returned no slides.")
+    if payload.get("stream") or "application/x-ndjson" in request.headers.get("accept", ""):
+        # Wait for the first slide, so failures before it still get a proper status code
+        slides = flight.follow()
+        try:
+            first = await slides.__anext__()
+        except StopAsyncIteration:
+            return _error_response(no_slides)
+        except Exception as e:
+            return _error_response(e)
+
+        async def lines():
+            yield json.dumps(first) + "\n"
+            try:
+                async for slide in slides:
+                    yield json.dumps(slide) + "\n"
+            except Exception as e:
+                # Headers are gone already; the error travels as the last line
+                yield json.dumps(_error_body(e)) + "\n"
+            finally:
+                await slides.aclose()
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    try:
+        await flight.wait()
+    except Exception as e:
+        return _error_response(e)
+    if not flight.items:
+        return _error_response(no_slides)
+    return JSONResponse({"slides": flight.items})
+
+async def create_deck(request):
+    try:
+        if request.headers.get("content-type", "").startswith("multipart/form-data"):
+            async with request.form(max_part_size=MAX_BODY_BYTES) as form:
+                upload = form.get("template")
+                if upload is None or isinstance(upload, str):
+                    raise ApiError(400, "invalid_request", 'Multipart uploads need a "template" file field.')
+                template_bytes = await upload.read()
+                try:
+                    slides = json.loads(form.get("slides") or "null")
+                except ValueError as e:
+                    raise ApiError(400, "invalid_request", f'"slides" is not valid JSON: {e}') from e
+        else:
+            payload = await _json(request)
+            slides = payload.get("slides")
+            if payload.get("template_id"):
+                template_bytes = templates.get(payload["template_id"])
+            elif payload.get("template"):
+                try:
+                    template_bytes = base64.b64decode(payload["template"], validate=True)
+                except ValueError as e:
+                    raise ApiError(400, "invalid_request", f'"template" is not valid base64: {e}') from e
+            else:
+                raise ApiError(400, "invalid_request", 'Send "template_id" or a base64 "template".')
+        if isinstance(slides, dict):
+            slides = slides.get("slides")
+        if not isinstance(slides, list) or not slides or not all(isinstance(s, dict) for s in slides):
+            raise ApiError(400, "invalid_request", '"slides" must be a non-empty list of slide objects.')
+        # Validated up front: equivalent decks coalesce, and oversized slides are split before rendering
+        slides = normalize_slides(slides)
+
+        key = ("deck", hashlib.sha256(template_bytes).hexdigest(), _slides_hash(slides))
+        flight = await _join_or_start(key, render_limiter, "render",
+                                      lambda flight: asyncio.to_thread(_render, template_bytes, slides))
+        deck = await flight.wait()
+    except Exception as e:
+        if not isinstance(e, ApiError):
+            e = ApiError(500, "render_failed", f"Error generating PPT: {e}")
+        return _error_response(e)
+
+    async def chunks():
+        for start in range(0, len(deck), CHUNK_BYTES):
+            yield deck[start:start + CHUNK_BYTES]
+    return StreamingResponse(chunks(), media_type=PPTX_MIME, headers={
+        "Content-Length": str(len(deck)),
+        "Content-Disposition": 'attachment; filename="generated_deck.pptx"',
+    })
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    warmup.start()
+    telemetry.serve_metrics()
+    yield
+
+app = Starlette(
+    routes=[
+        Route("/health", health),
+        Route("/metrics", metrics),
+        Route("/v1/templates", upload_template, methods=["POST"]),
+        Route("/v1/slides", create_slides, methods=["POST"]),
+        Route("/v1/presentations", create_deck, methods=["POST"]),
+    ],
+    lifespan=lifespan,
+)
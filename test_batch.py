@@ -0,0 +1,60 @@
+import os
+import json
+from utils.batch import iter_items, main, run_batch
+from utils.llm_engine import OFFLINE_PROVIDER
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_template.pptx")
+
+def _inputs(tmp_path):
+    source = tmp_path / "in"
+    source.mkdir()
+    (source / "alpha.txt").write_text("A short report about quarterly results.", encoding="utf-8")
+    (source / "beta.md").write_text("# Roadmap\n\n- Ship the beta\n- Gather feedback\n", encoding="utf-8")
+    return source
+
+def test_batch_converts_and_resumes(tmp_path):
+    source, out = _inputs(tmp_path), tmp_path / "out"
+    # TEST_KEY short-circuits to the mock slides, so this runs offline
+    summary = run_batch(str(source), TEMPLATE_PATH, str(out), "Google Gemini", "TEST_KEY",
+                        llm_workers=2, render_workers=1, log=lambda *_: None)
+    assert summary == {"total": 2, "skipped": 0, "done": 2, "failed": 0}
+    for item in ("alpha", "beta"):
+        assert os.path.getsize(out / f"{item}.pptx") > 0
+        assert json.loads((out / f"{item}.slides.json").read_text(encoding="utf-8"))
+    assert not [name for name in os.listdir(out) if name.endswith(".tmp")]
+
+    # A rerun skips finished items; with a lost deck, it re-renders from the saved slides
+    os.remove(out / "beta.pptx")
+    summary = run_batch(str(source), TEMPLATE_PATH, str(out), "Google Gemini", "TEST_KEY",
+                        llm_workers=2, render_workers=1, log=lambda *_: None)
+    assert summary == {"total": 2, "skipped": 1, "done": 1, "failed": 0}
+    assert os.path.getsize(out / "beta.pptx") > 0
+
+def test_batch_reads_legacy_slide_json(tmp_path):
+    source, out = _inputs(tmp_path), tmp_path / "out"
+    out.mkdir()
+    # Saved before slides were records: a list of slide dicts
+    (out / "alpha.slides.json").write_text(json.dumps([{"title": "Saved", "content": ["kept"], "notes": "n"}]),
+                                           encoding="utf-8")
+    assert main(["--input", str(source), "--template", TEMPLATE_PATH, "--output", str(out),
+                 "--api-key", "TEST_KEY", "--render-workers", "1"]) == 0
+    records = {r["id"]: r for r in map(json.loads, (out / "progress.jsonl").read_text(encoding="utf-8").splitlines())}
+    assert records["alpha"]["status"] == records["beta"]["status"] == "done"
+    assert records["alpha"]["slides"] == 1  # From the saved file, not regenerated
+
+def test_batch_cli_offline_provider_needs_no_key(tmp_path, monkeypatch):
+    monkeypatch.delenv("SMART_PPT_API_KEY", raising=False)
+    source, out = _inputs(tmp_path), tmp_path / "out"
+    assert main(["--input", str(source), "--template", TEMPLATE_PATH, "--output", str(out),
+                 "--provider", OFFLINE_PROVIDER, "--render-workers", "1"]) == 0
+    assert os.path.getsize(out / "beta.pptx") > 0
+
+def test_items_with_the_same_stem_get_their_own_decks(tmp_path):
+    source = _inputs(tmp_path)
+    (source / "alpha.md").write_text("# Alpha notes\n\n- Another document\n", encoding="utf-8")
+    assert [item["id"] for item in iter_items(str(source))] == ["alpha", "alpha-2", "beta"]
+    out = tmp_path / "out"
+    summary = run_batch(str(source), TEMPLATE_PATH, str(out), "Google Gemini", "TEST_KEY",
+                        render_workers=1, log=lambda *_: None)
+    assert summary["done"] == 3
+    assert os.path.getsize(out / "alpha-2.pptx") > 0
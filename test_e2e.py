@@ -1,44 +1,45 @@
-from utils.llm_engine import LLMEngine
-from utils.ppt_engine import PPTEngine
+from utils.llm_engine import analyze_and_structure_text
+from utils.ppt_engine import create_presentation
 import os
 
-def run_test():
+def test_functional():
     print("Starting Functional Test...")
-    
+
     # 1. Setup
-    api_key = "TEST_MOCK"
-    provider = "TEST_MOCK" # modified engine supports this
+    api_key = "TEST_KEY"
+    provider = "Google Gemini" # TEST_KEY short-circuits to the mock slides
     text = "This is a test of the emergency broadcast system."
-    template_path = os.path.abspath("test_template.pptx")
-    
+    template_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_template.pptx")
+
     if not os.path.exists(template_path):
         print("Error: test_template.pptx not found. Run create_test_template.py first.")
         return
 
-    # 2. Initialize Engines
-    print("Initializing Engines...")
-    llm = LLMEngine(provider=provider, api_key=api_key)
-    ppt_gen = PPTEngine(template_path=template_path)
-    
+    # 2. Load Template (bytes, no temp files)
+    print("Loading Template...")
+    with open(template_path, "rb") as f:
+        template_bytes = f.read()
+
     # 3. Generate Content
     print("Generatng Slides (Mock)...")
-    slides_data = llm.generate_slides(text)
-    print(f"Received {len(slides_data['slides'])} slides.")
-    
+    slides_data = analyze_and_structure_text(provider, api_key, text, "Professional", 1)
+    print(f"Received {len(slides_data)} slides.")
+
     # 4. Create PPT
     print("Creating Presentation...")
-    final_ppt = ppt_gen.create_presentation(slides_data)
-    
+    final_ppt = create_presentation(template_bytes, slides_data)
+
     # 5. Save Output
     output_file = "functional_test_output.pptx"
     with open(output_file, "wb") as f:
         f.write(final_ppt.getbuffer())
-        
+
     if os.path.exists(output_file):
         size = os.path.getsize(output_file)
         print(f"SUCCESS: {output_file} generated ({size} bytes).")
     else:
         print("FAILURE: Output file not generated.")
+    assert os.path.getsize(output_file) > 0
 
 if __name__ == "__main__":
-    run_test()
+    test_functional()
@@ -0,0 +1,27 @@
+import json
+from utils.json_repair import find_json, repair_json, salvage_slides
+
+SLIDE_A = '{"title": "A", "content": ["x"], "notes": "n"}'
+
+def test_repairs_common_defects():
+    candidate = find_json('Here you go:\n{"slides": [{"title": "A", "content": ["x", "y",],}],}\nThanks!')
+    assert candidate.value == {"slides": [{"title": "A", "content": ["x", "y"]}]}
+    assert "trailing_comma" in candidate.repairs
+    assert json.loads(repair_json('{"notes": "line one\nline two", "path": "C:\\Users"}')) == \
+        {"notes": "line one\nline two", "path": "C:\\Users"}
+
+def test_truncated_array_keeps_complete_slides():
+    # Cut off after the last slide's bullets, in its notes
+    for text in (f'[{SLIDE_A}, {{"title": "B", "content": ["y"], "notes": "cut',
+                 f'{{"slides": [{SLIDE_A}, {{"title": "B", "content": ["y"], "notes": "cut'):
+        assert salvage_slides(text) == [json.loads(SLIDE_A)]
+        assert "truncated" in find_json(text).repairs
+
+def test_truncated_first_slide_keeps_complete_values():
+    assert salvage_slides('[{"title": "A", "content": ["x", "y"], "notes": "cu') == \
+        [{"title": "A", "content": ["x", "y"]}]
+
+def test_no_json():
+    assert find_json("No JSON here [just prose") is None
+    assert salvage_slides("nothing") == []
+    assert repair_json("nothing") == "nothing"
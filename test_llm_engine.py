@@ -0,0 +1,176 @@
+import json
+import asyncio
+from utils import llm_engine, resilience
+from utils.schema import Slide, dump_slides, normalize_slides
+from utils.resilience import CircuitBreaker, ProviderGuard, RetryMetrics, RetryPolicy, TokenBucket
+
+def _answer(title):
+    return json.dumps({"slides": [{"title": title, "content": ["point"], "notes": "notes"}]})
+
+def _half_open_guard(provider):
+    breaker = CircuitBreaker(provider, failure_threshold=1, reset_timeout=0)
+    breaker.before_call()
+    breaker.record_failure()
+    return ProviderGuard(provider, policy=RetryPolicy(max_attempts=1), bucket=TokenBucket(1000, 1000),
+                         breaker=breaker, metrics=RetryMetrics())
+
+# --- HEDGING & FAILOVER ---
+def test_cancelled_hedge_leaves_half_open_primary_usable(monkeypatch):
+    monkeypatch.setattr(llm_engine, "CACHE_ENABLED", False)
+    guard = _half_open_guard("OpenAI")
+    monkeypatch.setitem(resilience._guards, "OpenAI", guard)
+    primary_delay = [60]
+
+    async def primary(api_key, system_prompt, text):
+        await asyncio.sleep(primary_delay[0])
+        return _answer("Primary")
+
+    async def backup(api_key, system_prompt, text):
+        return _answer("Backup")
+    monkeypatch.setitem(llm_engine.ASYNC_PROVIDERS, "OpenAI", primary)
+    monkeypatch.setitem(llm_engine.ASYNC_PROVIDERS, "Anthropic", backup)
+    routes = [("OpenAI", "k1"), ("Anthropic", "k2")]
+
+    async def main():
+        # The primary is the half-open trial; the hedge wins and the trial is cancelled
+        slides = await llm_engine.request_with_failover_async(routes, "prompt", "text", hedge=True, hedge_after=0.01)
+        assert [s.title for s in slides] == ["Backup"]
+        await asyncio.sleep(0)  # Let the cancellation land
+        assert guard.breaker.state == CircuitBreaker.HALF_OPEN
+        # The next request is a fresh trial, not a CircuitOpenError
+        primary_delay[0] = 0
+        slides = await llm_engine.request_with_failover_async(routes[:1], "prompt", "text")
+        assert [s.title for s in slides] == ["Primary"]
+    asyncio.run(main())
+    assert guard.breaker.state == CircuitBreaker.CLOSED
+
+# --- TWO-STAGE PIPELINE ---
+def test_refinement_matches_the_requested_slide():
+    outline = Slide("Roadmap", ["Ship the beta"])
+    polished = llm_engine._apply_refinement(outline, [Slide("roadmap", ["Ship the beta in May"], "Say when.")])
+    assert polished.content == ("Ship the beta in May",) and polished.notes == "Say when."
+    # A different slide back: the outline slide stands
+    assert llm_engine._apply_refinement(outline, [Slide("Budget", ["Spend less"], "n")]) is outline
+    assert llm_engine._apply_refinement(outline, []) is outline
+
+def test_refinement_split_by_validation_keeps_outline_bullets():
+    outline = Slide("Roadmap", ["Ship the beta"])
+    answer = normalize_slides([{"title": "Roadmap", "content": [f"Step {i}" for i in range(12)], "notes": "n"}])
+    assert [s.title for s in answer] == ["Roadmap", "Roadmap (cont.)"]
+    polished = llm_engine._apply_refinement(outline, answer)
+    assert polished.content == outline.content and polished.notes == "n"
+
+# --- MAP-REDUCE FOR LONG DOCUMENTS ---
+def test_text_chunks_respect_size_and_sections():
+    text = "\n\n".join(["Intro paragraph " + "x" * 40, "# Results", "Result paragraph " + "y" * 40,
+                       "One long paragraph. " * 20])
+    chunks = list(llm_engine.iter_text_chunks(text, max_chars=100))
+    assert all(len(chunk) <= 100 for chunk in chunks)
+    assert chunks[0] == "Intro paragraph " + "x" * 40  # The heading starts a new chunk
+    assert chunks[1].startswith("# Results\n\nResult paragraph")
+    assert all(chunk.endswith(".") for chunk in chunks[2:])  # Split between sentences
+    assert "".join(chunks[2:]).replace(" ", "") == ("One long paragraph. " * 20).replace(" ", "")
+
+def test_merge_chunk_slides_folds_repeats_and_holds_budget():
+    first = [Slide("Overview", ["a", "b"]), Slide("Costs", ["c"]), Slide("Extra", ["dropped"])]
+    second = [Slide("overview!", ["b", "new"]), Slide("Plans", ["p"]), Slide("More", ["m"])]
+    merged = llm_engine.merge_chunk_slides([(first, 2), (second, 2)], budget=3)
+    assert [s.title for s in merged] == ["Overview", "Costs", "Plans"]
+    assert merged[0].content == ("a", "b", "new")  # Only the new bullets were folded in
+    many = [Slide("Overview", [f"point {i}" for i in range(10)])]
+    merged = llm_engine.merge_chunk_slides([(first, 1), (many, 1)], budget=5)
+    assert len(merged[0].content) == llm_engine.MAX_MERGED_BULLETS
+
+# --- RESPONSE CACHE ---
+def test_response_cache_key_ignores_whitespace():
+    key = llm_engine.ResponseCache.make_key("OpenAI", "gpt", "Prompt  text", "Some\n text ")
+    assert key == llm_engine.ResponseCache.make_key("OpenAI", "gpt", "Prompt text", "Some text")
+    assert key != llm_engine.ResponseCache.make_key("Anthropic", "gpt", "Prompt text", "Some text")
+
+def test_response_cache_expires_after_ttl(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(llm_engine.time, "time", lambda: now[0])
+    cache = llm_engine.ResponseCache(str(tmp_path / "cache.sqlite3"), ttl=60)
+    slides = [Slide("Title", ["point"], "notes")]
+    cache.put("k", slides, elapsed=2.5)
+    now[0] += 59
+    assert cache.get("k") == slides
+    now[0] += 2
+    assert cache.get("k") is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "saved_seconds": 2.5, "entries": 0, "bytes": 0}
+
+def test_response_cache_evicts_least_recently_used(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(llm_engine.time, "time", lambda: now[0])
+    slides = [Slide("Title", ["point"], "notes")]
+    size = len(dump_slides(slides).encode("utf-8"))
+    cache = llm_engine.ResponseCache(str(tmp_path / "cache.sqlite3"), max_bytes=2 * size)
+    for key in ("a", "b"):
+        now[0] += 1
+        cache.put(key, slides, elapsed=1)
+    now[0] += 1
+    assert cache.get("a") == slides  # "b" is now the least recently used
+    now[0] += 1
+    cache.put("c", slides, elapsed=1)
+    assert cache.get("b") is None
+    assert cache.get("a") == cache.get("c") == slides
+    assert cache.stats()["bytes"] == 2 * size
+
+# --- OUTLINE REUSE ---
+def test_failed_outline_update_falls_back_to_a_fresh_outline(tmp_path, monkeypatch):
+    from utils.similarity import OutlineIndex
+    monkeypatch.setattr(llm_engine, "CACHE_ENABLED", True)
+    monkeypatch.setattr(llm_engine, "REUSE_OUTLINES", True)
+    monkeypatch.setattr(llm_engine, "response_cache", llm_engine.ResponseCache(str(tmp_path / "cache.sqlite3")))
+    monkeypatch.setattr(llm_engine, "_outline_index", OutlineIndex(str(tmp_path / "outlines.sqlite3"), threshold=0.5))
+    monkeypatch.setitem(resilience._guards, "OpenAI", ProviderGuard(
+        "OpenAI", policy=RetryPolicy(max_attempts=1), bucket=TokenBucket(1000, 1000),
+        breaker=CircuitBreaker("OpenAI"), metrics=RetryMetrics()))
+    paragraphs = [f"Paragraph {i} talks about quarterly revenue, hiring plans and the beta launch." for i in range(6)]
+    llm_engine._outline_index.add(llm_engine._owner("k1"), "Professional", paragraphs, [Slide("Old", ["x"], "n")])
+    prompts = []
+
+    async def provider(api_key, system_prompt, text):
+        prompts.append(system_prompt)
+        if system_prompt == llm_engine.build_update_prompt("Professional"):
+            raise ConnectionError("provider unavailable")
+        return _answer("Fresh")
+    monkeypatch.setitem(llm_engine.ASYNC_PROVIDERS, "OpenAI", provider)
+    text = "\n\n".join(paragraphs[:-1] + ["Paragraph 5 talks about something new entirely."])
+    slides = asyncio.run(llm_engine.generate_slides_async("OpenAI", "k1", text, "Professional", 3))
+    assert [s.title for s in slides] == ["Fresh"]
+    assert len(prompts) == 2  # The update was tried first
+
+# --- PROVIDERS ---
+def test_google_uses_the_pooled_client_public_api(monkeypatch):
+    from google.ai import generativelanguage as glm
+    requests = []
+
+    def response(*texts, usage=None):
+        return glm.GenerateContentResponse(
+            candidates=[glm.Candidate(content=glm.Content(parts=[glm.Part(text=t) for t in texts]))],
+            usage_metadata=usage)
+
+    class Client:
+        async def generate_content(self, request):
+            requests.append(request)
+            return response('{"slides": ', "[]}")
+
+        async def stream_generate_content(self, request):
+            requests.append(request)
+
+            async def chunks():
+                yield response('{"slides": ')
+                yield response("[]}", usage=glm.GenerateContentResponse.UsageMetadata(prompt_token_count=3))
+            return chunks()
+    monkeypatch.setattr(llm_engine.client_pool, "get", lambda provider, api_key: Client())
+
+    async def main():
+        text = await llm_engine.get_google_json_async("key", "prompt", "text")
+        deltas = [delta async for delta in llm_engine.stream_google_json("key", "prompt", "text")]
+        return text, deltas
+    text, deltas = asyncio.run(main())
+    assert text == '{"slides": []}' and deltas == ['{"slides": ', "[]}"]
+    assert requests[0].model == f"models/{llm_engine.GOOGLE_MODEL}"
+    assert requests[0].generation_config.response_mime_type == "application/json"
+    assert requests[0].contents[0].parts[0].text.endswith("Text to convert:\ntext")
@@ -0,0 +1,24 @@
+from pptx.opc.package import OpcPackage
+from pptx.opc.packuri import PackURI
+from utils.ppt_engine import _PartnameAllocator
+
+class _Part:
+    def __init__(self, partname):
+        self.partname = PackURI(partname)
+
+class _Package:
+    def __init__(self, numbers):
+        self.parts = [_Part(f"/ppt/notesSlides/notesSlide{n}.xml") for n in numbers]
+
+    def iter_parts(self):
+        return iter(self.parts)
+
+def test_partname_allocator_numbers_like_python_pptx():
+    tmpl = "/ppt/notesSlides/notesSlide%d.xml"
+    for numbers in ([], [1, 2], [1, 4], [2, 3], [1, 3, 7]):
+        package, allocate = _Package(numbers), _PartnameAllocator(_Package(numbers))
+        for _ in range(4):
+            expected = OpcPackage.next_partname(package, tmpl)
+            assert allocate(tmpl) == expected, numbers
+            package.parts.append(_Part(expected))
+    assert _PartnameAllocator(_Package([1, 4]))(tmpl) == "/ppt/notesSlides/notesSlide3.xml"
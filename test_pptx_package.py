@@ -0,0 +1,47 @@
+import io
+import zipfile
+import pytest
+from pptx import Presentation
+from utils.pptx_package import DeckSkeleton, DeckWriter, RT_NOTES_SLIDE, read_fragments
+
+def _deck():
+    prs = Presentation()
+    for title, notes in [("First", "Notes one"), ("Second", None), ("Third", "Notes three")]:
+        slide = prs.slides.add_slide(prs.slide_layouts[1])
+        slide.shapes.title.text = title
+        if notes:
+            slide.notes_slide.notes_text_frame.text = notes
+    out = io.BytesIO()
+    prs.save(out)
+    return out.getvalue()
+
+def _summary(data):
+    prs = Presentation(io.BytesIO(data))
+    return [(s.shapes.title.text, s.notes_slide.notes_text_frame.text if s.has_notes_slide else None)
+            for s in prs.slides]
+
+def test_fragments_round_trip_in_any_order():
+    deck = _deck()
+    fragments = read_fragments(deck)
+    assert [f.notes_xml is not None for f in fragments] == [True, False, True]
+    # Partner links are left for the writer to number
+    assert [rel.target for rel in fragments[0].slide_rels if rel.reltype == RT_NOTES_SLIDE] == [None]
+
+    out = io.BytesIO()
+    with DeckWriter(out, DeckSkeleton.from_deck(deck)) as writer:
+        for fragment in reversed(fragments):
+            writer.add_slide(fragment)
+    assert _summary(out.getvalue()) == [("Third", "Notes three"), ("Second", None), ("First", "Notes one")]
+    with zipfile.ZipFile(io.BytesIO(out.getvalue())) as zf:
+        assert zf.testzip() is None
+        assert "ppt/notesSlides/notesSlide1.xml" in zf.namelist()
+        assert "ppt/notesSlides/notesSlide2.xml" not in zf.namelist()
+
+def test_fragment_from_another_skeleton_is_rejected():
+    fragment = read_fragments(_deck())[0]
+    fragment = fragment._replace(slide_rels=tuple(
+        rel._replace(target="ppt/slideLayouts/missing.xml") if rel.target and "slideLayout" in rel.target else rel
+        for rel in fragment.slide_rels))
+    with DeckWriter(io.BytesIO(), DeckSkeleton.from_deck(_deck())) as writer:
+        with pytest.raises(ValueError, match="skeleton"):
+            writer.add_slide(fragment)
@@ -0,0 +1,170 @@
+import asyncio
+import pytest
+from utils.resilience import (
+    FATAL, RATE_LIMITED, RETRYABLE,
+    CircuitBreaker, CircuitOpenError, ProviderGuard, RetryMetrics, RetryPolicy, TokenBucket, classify_error,
+)
+
+class StatusError(Exception):
+    def __init__(self, status, headers=None):
+        super().__init__(f"HTTP {status}")
+        self.status_code = status
+        self.response = type("Response", (), {"headers": headers or {}})()
+
+def _guard(breaker=None, attempts=2):
+    return ProviderGuard("Test", policy=RetryPolicy(max_attempts=attempts, base_delay=0),
+                         bucket=TokenBucket(1000, 1000), breaker=breaker or CircuitBreaker("Test"),
+                         metrics=RetryMetrics())
+
+def _half_open():
+    breaker = CircuitBreaker("Test", failure_threshold=1, reset_timeout=0)
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    return breaker
+
+# --- CLASSIFICATION ---
+def test_classify_error():
+    assert classify_error(StatusError(401)) == (FATAL, None)
+    assert classify_error(StatusError(503)) == (RETRYABLE, None)
+    assert classify_error(StatusError(429, {"retry-after": "2"})) == (RATE_LIMITED, 2.0)
+    assert classify_error(StatusError(429, {"retry-after-ms": "250"})) == (RATE_LIMITED, 0.25)
+    assert classify_error(asyncio.TimeoutError())[0] == RETRYABLE
+
+def test_backoff_respects_server_hint_budget():
+    policy = RetryPolicy(base_delay=0.5, max_retry_after=10)
+    assert 3 <= policy.backoff(0, retry_after=3) <= 3.5
+    assert 0 <= policy.backoff(5) <= policy.max_delay
+    with pytest.raises(Exception, match="retry after"):
+        policy.backoff(0, retry_after=11)
+
+# --- CIRCUIT BREAKER ---
+def test_breaker_opens_after_threshold_and_fails_fast():
+    breaker = CircuitBreaker("Test", failure_threshold=2, reset_timeout=60)
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+def test_breaker_half_open_admits_one_trial():
+    breaker = _half_open()
+    assert breaker.before_call() is True
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.before_call() is False
+
+def test_breaker_failed_trial_reopens():
+    breaker = _half_open()
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+def test_fatal_error_does_not_count():
+    breaker = CircuitBreaker("Test", failure_threshold=1)
+    guard = _guard(breaker)
+
+    async def unauthorized():
+        raise StatusError(401)
+    with pytest.raises(StatusError):
+        asyncio.run(guard.call(unauthorized))
+    assert breaker.state == CircuitBreaker.CLOSED
+
+# --- GUARD ---
+def test_guard_retries_then_succeeds():
+    calls = []
+
+    async def flaky():
+        calls.append(1)
+        if len(calls) == 1:
+            raise StatusError(503)
+        return "ok"
+    assert asyncio.run(_guard().call(flaky)) == "ok"
+    assert len(calls) == 2
+
+def test_cancelled_half_open_trial_frees_the_breaker():
+    breaker = _half_open()
+    guard = _guard(breaker)
+    started = asyncio.Event()
+
+    async def hangs():
+        started.set()
+        await asyncio.sleep(60)
+
+    async def ok():
+        return "ok"
+
+    async def main():
+        task = asyncio.ensure_future(guard.call(hangs))
+        await started.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # No verdict from a cancelled trial: still half-open, and the next call is the trial
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        return await guard.call(ok)
+    assert asyncio.run(main()) == "ok"
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_cancelled_half_open_stream_frees_the_breaker():
+    breaker = _half_open()
+    guard = _guard(breaker)
+    started = asyncio.Event()
+
+    async def stalls():
+        yield "first"
+        started.set()
+        await asyncio.sleep(60)
+        yield "never"
+
+    async def consume():
+        async for _ in guard.stream(stalls):
+            pass
+
+    async def main():
+        task = asyncio.ensure_future(consume())
+        await started.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert breaker.before_call() is True  # The slot is free again
+    asyncio.run(main())
+
+def test_closed_half_open_stream_frees_the_breaker():
+    breaker = _half_open()
+    guard = _guard(breaker)
+
+    async def items():
+        yield "first"
+        yield "second"
+
+    async def main():
+        stream = guard.stream(items)
+        async for _ in stream:
+            break  # The consumer stops early
+        await stream.aclose()
+    asyncio.run(main())
+    # An early close says nothing about the provider: still half-open, trial slot free
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker._trial_in_flight is False
+
+def test_breaker_opening_mid_retry_raises_the_provider_error():
+    breaker = CircuitBreaker("Test", failure_threshold=1, reset_timeout=60)
+    guard = _guard(breaker, attempts=3)
+
+    async def unavailable():
+        raise StatusError(503)
+    with pytest.raises(StatusError, match="503"):
+        asyncio.run(guard.call(unavailable))
+    assert breaker.state == CircuitBreaker.OPEN
+
+    def unavailable_blocking():
+        raise StatusError(503)
+    guard = _guard(CircuitBreaker("Test", failure_threshold=1, reset_timeout=60), attempts=3)
+    with pytest.raises(StatusError, match="503"):
+        guard.call_blocking(unavailable_blocking)
@@ -0,0 +1,48 @@
+import pickle
+from utils.schema import (
+    MAX_BULLET_CHARS, MAX_BULLETS, MAX_NOTES_CHARS, MAX_TITLE_CHARS, UNTITLED,
+    Slide, dump_slides, load_slides, normalize_slide, normalize_slides,
+)
+
+def test_normalize_coerces_aliases_and_shapes():
+    fixes = set()
+    slide, = normalize_slide({"heading": "Plan", "bullets": "- One\n2) Two\n\n", "speaker_notes": 5}, fixes)
+    assert slide == Slide("Plan", ["One", "Two"], "5")
+    assert fixes == {"coerced_content", "coerced_notes"}
+    slide, = normalize_slide({"content": [["a", ["b"]], {"text": "c"}, 7]}, fixes)
+    assert slide == Slide(UNTITLED, ["a", "b", "c", "7"], None)
+    assert {"missing_title", "flattened_content"} <= fixes
+    assert normalize_slide("not a slide") == []
+
+def test_too_many_bullets_split_into_balanced_parts():
+    fixes = set()
+    parts = normalize_slide({"title": "Plan", "content": [f"Point {i}" for i in range(MAX_BULLETS + 1)],
+                             "notes": "n"}, fixes)
+    assert [s.title for s in parts] == ["Plan", "Plan (cont.)"]
+    assert [len(s.content) for s in parts] == [5, 4]
+    assert [s.notes for s in parts] == ["n", None]  # Notes aren't repeated on continuations
+    assert "split_slide" in fixes
+
+def test_continuation_keeps_its_marker_on_long_titles():
+    title = "Quarterly " * 12
+    parts = normalize_slide({"title": title, "content": [f"Point {i}" for i in range(MAX_BULLETS + 1)]})
+    assert parts[1].title.endswith("… (cont.)")
+    assert len(parts[1].title) <= MAX_TITLE_CHARS
+
+def test_long_text_split_or_truncated():
+    fixes = set()
+    sentence = "word " * 30 + "end."
+    slide, = normalize_slide({"title": "T " * 100, "content": [sentence + " " + sentence, "x" * 500],
+                              "notes": "n" * (MAX_NOTES_CHARS + 10)}, fixes)
+    assert len(slide.title) <= MAX_TITLE_CHARS and slide.title.endswith("…")
+    assert slide.content[:2] == (sentence, sentence)  # Split between sentences
+    assert len(slide.content[2]) == MAX_BULLET_CHARS and slide.content[2].endswith("…")
+    assert len(slide.notes) == MAX_NOTES_CHARS
+    assert {"truncated_title", "split_bullet", "truncated_bullet", "truncated_notes"} <= fixes
+
+def test_rows_round_trip_and_legacy_dicts():
+    slides = [Slide("A", ["x"], "n"), Slide("B", [], None)]
+    assert load_slides(dump_slides(slides)) == slides
+    assert load_slides('[{"title": "A", "content": ["x"], "notes": "n"}]') == slides[:1]
+    assert pickle.loads(pickle.dumps(slides)) == slides
+    assert normalize_slides(slides) == slides
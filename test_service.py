@@ -0,0 +1,47 @@
+import json
+import asyncio
+from service import app, _slides_key, OFFLINE_PROVIDER
+
+def _post(path, payload, api_key=None):
+    """
+    One request straight through the ASGI app: (status, parsed JSON body).
+    """
+    body = json.dumps(payload).encode("utf-8")
+    headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    if api_key:
+        headers.append((b"x-api-key", api_key.encode()))
+    scope = {"type": "http", "http_version": "1.1", "method": "POST", "scheme": "http", "path": path,
+             "raw_path": path.encode(), "root_path": "", "query_string": b"", "headers": headers,
+             "client": ("127.0.0.1", 5000), "server": ("testserver", 80)}
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+    asyncio.run(app(scope, receive, send))
+    return messages[0]["status"], json.loads(b"".join(m.get("body", b"") for m in messages[1:]))
+
+ROUTING = {"backups": None, "hedge": False, "hedge_after": None}
+
+def test_slides_key_separates_callers_and_routes():
+    key = _slides_key("OpenAI", "key-a", "text", "Professional", 3, ROUTING)
+    assert key == _slides_key("OpenAI", "key-a", "text", "Professional", 3, dict(ROUTING))
+    assert key != _slides_key("OpenAI", "key-b", "text", "Professional", 3, ROUTING)
+    assert key != _slides_key("OpenAI", "key-a", "text", "Professional", 3, dict(ROUTING, backups={"Anthropic": "k"}))
+    assert key != _slides_key("OpenAI", "key-a", "text", "Professional", 3, dict(ROUTING, hedge=True))
+    assert "key-a" not in repr(key)  # Only a hash of the key is kept
+
+def test_create_slides_rejects_bad_parameters():
+    base = {"provider": "OpenAI", "text": "Some text"}
+    for field, value in [("num_slides", True), ("num_slides", -1), ("hedge_after", "soon"),
+                         ("hedge_after", True), ("backups", ["key"]), ("guidance", {"tone": "x"})]:
+        status, body = _post("/v1/slides", dict(base, **{field: value}), api_key="key")
+        assert status == 400, (field, value)
+        assert body["error"] == "invalid_request"
+
+def test_create_slides_offline():
+    status, body = _post("/v1/slides", {"provider": OFFLINE_PROVIDER, "text": "# Plan\n\n- One\n- Two\n"})
+    assert status == 200
+    assert body["slides"][0]["title"] == "Plan"
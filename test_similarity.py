@@ -0,0 +1,37 @@
+from utils.schema import Slide
+from utils.similarity import OutlineIndex, changed_chars, diff_paragraphs, minhash, similarity
+
+PARAGRAPHS = [
+    "The quarterly report covers revenue growth across all regions and product lines this year.",
+    "Costs rose slightly because of new hiring in engineering, support and the sales teams.",
+    "Next quarter the team plans to ship the beta and gather feedback from early customers.",
+]
+
+def test_minhash_estimates_similarity():
+    text = " ".join(PARAGRAPHS)
+    assert similarity(minhash(text), minhash(text)) == 1.0
+    edited = text.replace("slightly", "sharply")
+    assert 0.5 < similarity(minhash(text), minhash(edited)) < 1.0
+    assert similarity(minhash(text), minhash("An unrelated note about gardening tools and seeds.")) < 0.1
+
+def test_diff_paragraphs():
+    new = [PARAGRAPHS[0], "  " + PARAGRAPHS[1].replace(" ", "  "), "A brand new closing paragraph."]
+    changes = diff_paragraphs(PARAGRAPHS, new)
+    assert len(changes) == 1  # Whitespace-only edits don't count
+    assert changes[0].removed == PARAGRAPHS[2:] and changes[0].added == new[2:] and changes[0].after == new[1]
+    assert changed_chars(changes) == len(PARAGRAPHS[2]) + len(new[2])
+    assert diff_paragraphs(PARAGRAPHS, list(PARAGRAPHS)) == []
+
+def test_index_finds_near_duplicates_above_threshold(tmp_path):
+    index = OutlineIndex(str(tmp_path / "outlines.db"), threshold=0.5)
+    slides = [Slide("Quarterly Report", ["Revenue grew"], "n")]
+    index.add("owner", "Professional", PARAGRAPHS, slides)
+    edited = PARAGRAPHS[:2] + [PARAGRAPHS[2].replace("beta", "release candidate")]
+    match = index.find("owner", "Professional", edited)
+    assert match is not None and 0.5 <= match.similarity < 1.0
+    assert match.paragraphs == PARAGRAPHS and match.slides == slides
+    # Scoped by owner and guidance, and below the threshold nothing matches
+    assert index.find("someone else", "Professional", edited) is None
+    assert index.find("owner", "Casual", edited) is None
+    assert OutlineIndex(index.path, threshold=0.99).find("owner", "Professional", edited) is None
+    assert index.stats() == {"hits": 1, "misses": 2, "entries": 1}
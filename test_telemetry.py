@@ -0,0 +1,37 @@
+import time
+import threading
+import urllib.request
+from utils import telemetry
+
+def test_serve_metrics_binds_once_under_concurrent_starts(monkeypatch):
+    monkeypatch.setattr(telemetry, "_server", None)
+
+    bound = []
+
+    class SlowServer(telemetry.ThreadingHTTPServer):
+        def __init__(self, *args):
+            time.sleep(0.05)  # Widen the window between the check and the bind
+            super().__init__(*args)
+            bound.append(self)
+    monkeypatch.setattr(telemetry, "ThreadingHTTPServer", SlowServer)
+    servers = []
+    start = threading.Barrier(8)
+
+    def session():
+        start.wait()
+        servers.append(telemetry.serve_metrics(port=0))
+    threads = [threading.Thread(target=session) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    server = servers[0]
+    try:
+        assert bound == [server]
+        assert len(servers) == 8 and all(s is server for s in servers)
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.server_address[1]}/metrics", timeout=5) as response:
+            assert response.status == 200
+    finally:
+        for s in bound:
+            s.shutdown()
+            s.server_close()
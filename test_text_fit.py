@@ -0,0 +1,32 @@
+from utils.text_fit import FontMetrics, HELVETICA_WIDTHS, fit_font_size, get_metrics, text_height, wrapped_lines
+
+FONT = "No Such Font"  # Not installed anywhere: always the bundled Helvetica widths
+
+def test_metrics_fall_back_to_builtin_widths():
+    metrics = get_metrics(FONT)
+    assert metrics.source == "builtin"
+    assert metrics.text_width("a") == HELVETICA_WIDTHS[ord("a") - 32] / 1000
+    assert get_metrics(FONT, bold=True).text_width("abc") > metrics.text_width("abc")
+    assert FontMetrics(FONT, HELVETICA_WIDTHS, "builtin").char_width("中") == 1000
+
+def test_wrapped_lines():
+    assert wrapped_lines("", FONT, 20, 100) == 1
+    assert wrapped_lines("short", FONT, 10, 500) == 1
+    # Each "aaaa" is 2.224 em: two words fit a 5 em line, a third wraps
+    assert wrapped_lines("aaaa aaaa", FONT, 10, 50) == 1
+    assert wrapped_lines("aaaa aaaa aaaa", FONT, 10, 50) == 2
+    # A word wider than the box is broken across lines
+    assert wrapped_lines("a" * 20, FONT, 10, 50) == 3
+
+def test_text_height_adds_paragraph_spacing():
+    single = text_height(["one"], FONT, 10, 500)
+    assert single == 10 * 1.2
+    assert text_height(["one", "two"], FONT, 10, 500, space_before=6) == 2 * single + 6
+
+def test_fit_font_size():
+    assert fit_font_size("Title", 500, 100, font=FONT, max_size=40) == 40
+    fitted = fit_font_size(["A long bullet point that needs wrapping"] * 6, 300, 150, font=FONT)
+    assert 12 < fitted < 28
+    assert text_height(["A long bullet point that needs wrapping"] * 6, FONT, fitted, 300) <= 150
+    assert text_height(["A long bullet point that needs wrapping"] * 6, FONT, fitted + 1, 300) > 150
+    assert fit_font_size("word " * 500, 100, 20, font=FONT) == 12  # Nothing fits: min_size
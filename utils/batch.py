@@ -0,0 +1,253 @@
+"""
+Headless batch conversion: turns a directory of documents (or a JSONL manifest)
+into decks without the Streamlit UI.
+
+    python -m utils.batch --input reports/ --template corp.pptx --output decks/ \
+        --provider "Google Gemini" --api-key $GEMINI_KEY
+
+With --provider "Offline (Extractive)" the decks are drafted locally, without an
+API key or network access.
+
+LLM calls run on a thread pool (each thread drives the shared async engine loop);
+python-pptx rendering is CPU-bound XML work, so it runs on a process pool.
+Progress is appended to <output>/progress.jsonl as items finish; re-running the
+same command skips items that are already done, and reuses saved slide JSON
+for items whose rendering failed.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+INPUT_EXTENSIONS = (".txt", ".md", ".markdown")
+PROGRESS_FILE = "progress.jsonl"
+
+# --- INPUTS ---
+def _safe_id(value):
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", str(value)).strip("._") or "item"
+
+def iter_items(source):
+    """
+    Yields {"id", "path" | "text", "guidance"?} dicts from a directory of
+    .txt/.md files or from a JSONL manifest (one object per line).
+    Ids are unique: a repeated one (report.md next to report.txt) gets a
+    numeric suffix, in input order, so no item overwrites another's deck.
+    """
+    seen = set()
+    for item in _iter_entries(source):
+        item_id, n = item["id"], 1
+        while item_id in seen:
+            n += 1
+            item_id = f"{item['id']}-{n}"
+        seen.add(item_id)
+        item["id"] = item_id
+        yield item
+
+def _iter_entries(source):
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            if name.lower().endswith(INPUT_EXTENSIONS):
+                yield {"id": _safe_id(os.path.splitext(name)[0]), "path": os.path.join(source, name)}
+        return
+
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            if "path" in entry and not os.path.isabs(entry["path"]):
+                entry["path"] = os.path.join(base, entry["path"])
+            entry["id"] = _safe_id(entry.get("id") or os.path.splitext(os.path.basename(entry.get("path", "")))[0] or line_no)
+            yield entry
+
+def _read_text(item):
+    if "text" in item:
+        return item["text"]
+    with open(item["path"], encoding="utf-8") as f:
+        return f.read()
+
+# --- PROGRESS ---
+class ProgressLog:
+    """
+    Append-only JSONL record of finished items; the last record per id wins.
+    """
+    def __init__(self, out_dir):
+        self.path = os.path.join(out_dir, PROGRESS_FILE)
+        self._lock = threading.Lock()
+
+    def load(self):
+        state = {}
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # Torn last line from an interrupted run
+                    state[record["id"]] = record
+        return state
+
+    def write(self, **record):
+        record["ts"] = round(time.time(), 3)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+
+# --- WORKERS ---
+def _structure_item(item, provider, api_key, guidance, out_dir):
+    """
+    LLM stage (thread pool). Saves the slide JSON next to the deck so a resumed
+    run doesn't pay for the same generation twice.
+    """
+    from utils.llm_engine import generate_slides, estimate_slide_count
+    from utils.schema import dump_slides, load_slides
+
+    slides_path = os.path.join(out_dir, f"{item['id']}.slides.json")
+    if os.path.exists(slides_path):
+        with open(slides_path, encoding="utf-8") as f:
+            return load_slides(f.read()), 0.0
+
+    text = _read_text(item)
+    started = time.perf_counter()
+    slides = generate_slides(item.get("provider", provider), api_key, text,
+                             item.get("guidance") or guidance, estimate_slide_count(text))
+    if not slides:
+        raise ValueError("Provider returned no slides.")
+
+    tmp_path = slides_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(dump_slides(slides))
+    os.replace(tmp_path, slides_path)
+    return slides, time.perf_counter() - started
+
+_worker_template = None
+
+def _init_render_worker(template_path):
+    global _worker_template
+    with open(template_path, "rb") as f:
+        _worker_template = f.read()
+
+def _render_item(item_id, slides, out_dir):
+    """
+    Render stage (process pool). Streams the deck to disk slide by slide, and
+    writes atomically so a killed run never leaves a half deck.
+    """
+    from utils.ppt_engine import create_presentation
+
+    started = time.perf_counter()
+    deck_path = os.path.join(out_dir, f"{item_id}.pptx")
+    tmp_path = deck_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        create_presentation(_worker_template, slides, output=f)
+    os.replace(tmp_path, deck_path)
+    return deck_path, time.perf_counter() - started
+
+# --- PIPELINE ---
+def run_batch(source, template_path, out_dir, provider, api_key, guidance="Professional",
+              llm_workers=4, render_workers=None, force=False, log=print):
+    """
+    Converts every item of `source` into <out_dir>/<id>.pptx. Returns a summary dict.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    progress = ProgressLog(out_dir)
+    state = {} if force else progress.load()
+
+    todo = []
+    skipped = 0
+    for item in iter_items(source):
+        record = state.get(item["id"])
+        if record and record.get("status") == "done" and os.path.exists(os.path.join(out_dir, f"{item['id']}.pptx")):
+            skipped += 1
+            continue
+        if force:
+            slides_path = os.path.join(out_dir, f"{item['id']}.slides.json")
+            if os.path.exists(slides_path):
+                os.remove(slides_path)
+        todo.append(item)
+
+    summary = {"total": len(todo) + skipped, "skipped": skipped, "done": 0, "failed": 0}
+    log(f"{len(todo)} to convert, {skipped} already done.")
+    if not todo:
+        return summary
+
+    lock = threading.Lock()
+
+    def on_rendered(item_id, n_slides, llm_seconds):
+        def callback(future):
+            try:
+                deck_path, render_seconds = future.result()
+            except Exception as e:
+                progress.write(id=item_id, status="failed", stage="render", error=str(e))
+                with lock:
+                    summary["failed"] += 1
+                log(f"✗ {item_id}: render failed: {e}")
+                return
+            progress.write(id=item_id, status="done", slides=n_slides, output=os.path.basename(deck_path),
+                           llm_seconds=round(llm_seconds, 3), render_seconds=round(render_seconds, 3))
+            with lock:
+                summary["done"] += 1
+            log(f"✓ {item_id}: {n_slides} slides")
+        return callback
+
+    with ProcessPoolExecutor(max_workers=render_workers, initializer=_init_render_worker, initargs=(template_path,)) as renderers, \
+            ThreadPoolExecutor(max_workers=llm_workers) as llm_pool:
+        llm_futures = {
+            llm_pool.submit(_structure_item, item, provider, api_key, guidance, out_dir): item
+            for item in todo
+        }
+        render_futures = []
+        for future in as_completed(llm_futures):
+            item = llm_futures[future]
+            try:
+                slides, llm_seconds = future.result()
+            except Exception as e:
+                progress.write(id=item["id"], status="failed", stage="llm", error=str(e))
+                with lock:
+                    summary["failed"] += 1
+                log(f"✗ {item['id']}: generation failed: {e}")
+                continue
+            render_future = renderers.submit(_render_item, item["id"], slides, out_dir)
+            render_future.add_done_callback(on_rendered(item["id"], len(slides), llm_seconds))
+            render_futures.append(render_future)
+
+        for future in render_futures:
+            try:
+                future.result()
+            except Exception:
+                pass  # Already recorded by the callback
+
+    return summary
+
+def main(argv=None):
+    from utils.llm_engine import OFFLINE_PROVIDER
+
+    parser = argparse.ArgumentParser(prog="python -m utils.batch", description="Convert a directory or JSONL manifest of documents into decks.")
+    parser.add_argument("--input", required=True, help="Directory of .txt/.md files, or a JSONL manifest")
+    parser.add_argument("--template", required=True, help="Path to the .pptx/.potx template")
+    parser.add_argument("--output", required=True, help="Output directory (also holds progress.jsonl)")
+    parser.add_argument("--provider", default="Google Gemini", choices=["Google Gemini", "OpenAI", "Anthropic", OFFLINE_PROVIDER],
+                        help=f'"{OFFLINE_PROVIDER}" drafts decks locally: no API key, no network')
+    parser.add_argument("--api-key", default=os.environ.get("SMART_PPT_API_KEY"), help="Defaults to $SMART_PPT_API_KEY")
+    parser.add_argument("--guidance", default="Professional")
+    parser.add_argument("--llm-workers", type=int, default=4)
+    parser.add_argument("--render-workers", type=int, default=None, help="Defaults to the CPU count")
+    parser.add_argument("--force", action="store_true", help="Ignore previous progress and regenerate everything")
+    args = parser.parse_args(argv)
+
+    if not args.api_key and args.provider != OFFLINE_PROVIDER:
+        parser.error("an API key is required (--api-key or SMART_PPT_API_KEY)")
+
+    summary = run_batch(args.input, args.template, args.output, args.provider, args.api_key or "",
+                        guidance=args.guidance, llm_workers=args.llm_workers,
+                        render_workers=args.render_workers, force=args.force)
+    print(json.dumps(summary))
+    return 1 if summary["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
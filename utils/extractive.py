@@ -0,0 +1,271 @@
+"""
+Offline, deterministic slide drafting: no LLM call, no API key.
+
+    slides = draft_slides(text, num_slides_est)   # [{"title", "content", "notes"}]
+
+Markdown structure is taken as given: headings become slide titles and list
+items their bullets. Prose is split into sentences and ranked with TextRank
+over TF-IDF vectors (NumPy); the most central sentences of a section become its
+bullets, in document order, and the rest its speaker notes. Text without any
+headings is cut into `num_slides_est` balanced groups of paragraphs, each
+titled after its top sentence.
+
+Same input, same deck, in milliseconds. The engine serves it as the offline
+provider (llm_engine.OFFLINE_PROVIDER); the app also shows it as an instant
+preview while an LLM streams, and falls back to it when providers are unreachable.
+"""
+import re
+from collections import namedtuple
+import numpy as np
+
+MAX_SLIDES = 40
+PROSE_BULLETS = 4           # Sentences promoted to bullets from a prose-only section
+MAX_BULLET_CHARS = 140
+MAX_TITLE_WORDS = 9
+MAX_NOTES_CHARS = 700
+MAX_TERMS = 4096            # Vocabulary cap (most frequent terms) for the TF-IDF matrix
+MAX_GRAPH = 1500            # Larger units are ranked by centroid similarity instead of TextRank
+DAMPING = 0.85
+ITERATIONS = 50
+
+Section = namedtuple("Section", "title level bullets sentences")
+
+# --- MARKDOWN ---
+_ATX = re.compile(r"^\s{0,3}(#{1,6})\s+(.*?)\s*#*\s*$")
+_SETEXT = re.compile(r"^\s{0,3}(=+|-+)\s*$")
+_BOLD_HEADING = re.compile(r"^\s*(?:\*\*|__)([^*_]{2,80})(?:\*\*|__):?\s*$")
+_LIST_ITEM = re.compile(r"^(\s*)(?:[-*+•]|\d{1,3}[.)])\s+(.*)$")
+_FENCE = re.compile(r"^\s{0,3}(```|~~~)")
+_RULE = re.compile(r"^\s{0,3}([-*_])(\s*\1){2,}\s*$")
+_TABLE_ROW = re.compile(r"^\s*\|.*\|\s*$")
+
+_IMAGE = re.compile(r"!\[[^\]]*\]\([^)]*\)")
+_LINK = re.compile(r"\[([^\]]+)\]\([^)]*\)")
+_EMPHASIS = re.compile(r"(\*\*|__|\*|_|`)(?=\S)(.+?)(?<=\S)\1")
+_SENTENCE = re.compile(r"(?<=[.!?])[\"')\]]*\s+(?=[\"'(\[]*[A-Z0-9])")
+_TOKEN = re.compile(r"[a-z0-9][a-z0-9'-]*")
+
+_STOPWORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been before being below
+between both but by can could did do does doing down during each few for from further had has have having
+he her here hers him his how i if in into is it its itself just me more most my no nor not now of off on
+once only or other our ours out over own same she should so some such than that the their theirs them then
+there these they this those through to too under until up very was we were what when where which while who
+whom why will with would you your yours
+""".split())
+
+def _inline(text):
+    text = _IMAGE.sub("", text)
+    text = _LINK.sub(r"\1", text)
+    text = _EMPHASIS.sub(r"\2", text)
+    return " ".join(text.split())
+
+def split_sentences(text):
+    return [s for s in (part.strip() for part in _SENTENCE.split(text)) if s]
+
+def parse_markdown(text):
+    """
+    Sections of a markdown (or plain) document, in order. Text before the first
+    heading is a section with title None. Code blocks, tables and rules are skipped.
+    """
+    sections = []
+    title, level, bullets, prose = None, 0, [], []
+
+    def close():
+        if title is not None or bullets or prose:
+            sentences = [s for paragraph in prose for s in split_sentences(paragraph)]
+            sections.append(Section(title, level, bullets, sentences))
+
+    lines = text.splitlines()
+    paragraph = []
+    in_fence = skip = False
+    for i, line in enumerate(lines):
+        if skip:  # The underline of a setext heading
+            skip = False
+            continue
+        if _FENCE.match(line):
+            in_fence = not in_fence
+            continue
+        if in_fence or _TABLE_ROW.match(line):
+            continue
+        heading = _ATX.match(line) or _BOLD_HEADING.match(line)
+        underline = i + 1 < len(lines) and line.strip() and not paragraph and _SETEXT.match(lines[i + 1])
+        if heading or underline:
+            if paragraph:
+                prose.append(_inline(" ".join(paragraph)))
+                paragraph = []
+            close()
+            if underline:
+                title, level = _inline(line), 1 if lines[i + 1].strip()[0] == "=" else 2
+                skip = True
+            elif heading.re is _ATX:
+                title, level = _inline(heading.group(2)), len(heading.group(1))
+            else:
+                title, level = _inline(heading.group(1)), 3
+            bullets, prose = [], []
+            continue
+        if _RULE.match(line):
+            continue
+        item = _LIST_ITEM.match(line)
+        if item:
+            if paragraph:
+                prose.append(_inline(" ".join(paragraph)))
+                paragraph = []
+            bullets.append(_inline(item.group(2)))
+        elif not line.strip():
+            if paragraph:
+                prose.append(_inline(" ".join(paragraph)))
+                paragraph = []
+        elif bullets and not paragraph and line[:1].isspace():
+            bullets[-1] = f"{bullets[-1]} {_inline(line)}"  # Wrapped list item
+        else:
+            paragraph.append(line.strip())
+    if paragraph:
+        prose.append(_inline(" ".join(paragraph)))
+    close()
+    return [s for s in sections if s.title or s.bullets or s.sentences]
+
+# --- RANKING ---
+def tfidf_matrix(sentences):
+    """
+    L2-normalized TF-IDF rows (float32, sublinear tf) for `sentences`, over at
+    most MAX_TERMS of the most frequent non-stopword terms.
+    """
+    docs = [[t for t in _TOKEN.findall(s.lower()) if t not in _STOPWORDS] for s in sentences]
+    counts = {}
+    for doc in docs:
+        for term in set(doc):
+            counts[term] = counts.get(term, 0) + 1
+    vocab = {term: i for i, term in enumerate(sorted(counts, key=lambda t: (-counts[t], t))[:MAX_TERMS])}
+    width = max(len(vocab), 1)
+    cells = np.fromiter((i * width + vocab[t] for i, doc in enumerate(docs) for t in doc if t in vocab), dtype=np.intp)
+    matrix = np.bincount(cells, minlength=len(sentences) * width).astype(np.float32).reshape(len(sentences), width)
+    df = np.count_nonzero(matrix, axis=0)
+    np.log1p(matrix, out=matrix)
+    matrix *= (np.log((1 + len(sentences)) / (1 + df)) + 1).astype(np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
+
+def textrank(vectors):
+    """
+    TextRank centrality of each row of `vectors` (unit TF-IDF rows): PageRank
+    over the cosine-similarity graph, by power iteration.
+    """
+    n = vectors.shape[0]
+    if n <= 2:
+        return np.ones(n, dtype=np.float32)
+    if n > MAX_GRAPH:
+        centroid = vectors.sum(axis=0)
+        return vectors @ centroid
+    weights = vectors @ vectors.T
+    np.fill_diagonal(weights, 0.0)
+    totals = weights.sum(axis=1, keepdims=True)
+    # Sentences sharing no terms with any other link to every sentence evenly
+    transition = np.where(totals > 0, weights / np.where(totals > 0, totals, 1.0), 1.0 / n).astype(np.float32)
+    scores = np.full(n, 1.0 / n, dtype=np.float32)
+    for _ in range(ITERATIONS):
+        updated = (1 - DAMPING) / n + DAMPING * (transition.T @ scores)
+        if np.abs(updated - scores).sum() < 1e-6:
+            return updated
+        scores = updated
+    return scores
+
+def top_sentences(scores, k):
+    """
+    Indices of the `k` best scores, in their original order; ties go to the earlier.
+    """
+    order = np.lexsort((np.arange(len(scores)), -scores))
+    return sorted(order[:k].tolist())
+
+# --- SHAPING ---
+def _shorten(text, max_chars=MAX_BULLET_CHARS):
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars].rsplit(" ", 1)[0].rstrip(",;:-")
+    return cut + "…"
+
+def _title_from(sentence):
+    head = re.split(r"[:;—]| - ", sentence, maxsplit=1)[0]
+    words = head.split()
+    title = " ".join(words[:MAX_TITLE_WORDS]).rstrip(".,;:!?")
+    return title[:1].upper() + title[1:] if title else "Overview"
+
+def _notes(sentences, bullets):
+    text = " ".join(sentences) if sentences else "Key points: " + "; ".join(b.rstrip(".") for b in bullets) + "."
+    return _shorten(text, MAX_NOTES_CHARS)
+
+def _section_slide(title, bullets, sentences, scores):
+    if bullets:
+        chosen = bullets
+        notes = _notes(sentences, bullets)
+    else:
+        keep = top_sentences(scores, PROSE_BULLETS)
+        chosen = [sentences[i] for i in keep]
+        rest = [s for i, s in enumerate(sentences) if i not in keep]
+        notes = _notes(rest or sentences, chosen)
+    chosen = [_shorten(b) for b in chosen]
+    title = title or _title_from(sentences[int(np.argmax(scores))] if sentences else chosen[0])
+    # Long lists are split into "(cont.)" slides by the schema validation downstream
+    return {"title": title, "content": chosen, "notes": notes}
+
+def _group_paragraphs(text, groups):
+    """
+    Splits plain text into at most `groups` runs of paragraphs of similar length.
+    """
+    paragraphs = [" ".join(p.split()) for p in re.split(r"\n\s*\n", text) if p.strip()]
+    total = sum(len(p) for p in paragraphs)
+    target = total / max(1, min(groups, len(paragraphs)))
+    runs, current, consumed = [], [], 0
+    for p in paragraphs:
+        # Break where the paragraph's midpoint passes the next run boundary
+        if current and consumed + len(p) / 2 > target * (len(runs) + 1):
+            runs.append(current)
+            current = []
+        current.append(p)
+        consumed += len(p)
+    if current:
+        runs.append(current)
+    return runs
+
+# --- DRAFTING ---
+def draft_slides(text, num_slides_est, max_slides=MAX_SLIDES):
+    """
+    Slides for `text` in the LLM schema, deterministically. Markdown headings
+    set the slide breaks; plain text is split into about `num_slides_est` slides.
+    At most `max_slides` slides: beyond that, the sections least central to the
+    whole document are dropped.
+    """
+    sections = parse_markdown(text)
+    if not any(s.title for s in sections):
+        sections = [Section(None, 0, [], [s for p in run for s in split_sentences(p)])
+                    for run in _group_paragraphs(text, max(1, num_slides_est))]
+        sections = [s for s in sections if s.sentences]
+    if not sections:
+        return []
+
+    sentences = [s for section in sections for s in section.sentences]
+    vectors = tfidf_matrix(sentences) if sentences else np.zeros((0, 1), dtype=np.float32)
+
+    units, start = [], 0
+    for section in sections:
+        end = start + len(section.sentences)
+        units.append((section, vectors[start:end]))
+        start = end
+
+    if len(units) > max_slides:
+        # Keep the sections most similar to the document as a whole, in order
+        centroid = vectors.sum(axis=0)
+        relevance = np.array([float((v @ centroid).mean()) if len(v) else 0.0 for _, v in units])
+        keep = set(top_sentences(relevance, max_slides))
+        units = [unit for i, unit in enumerate(units) if i in keep]
+
+    slides = []
+    for n, (section, section_vectors) in enumerate(units):
+        if not section.bullets and not section.sentences:
+            if n == 0 and section.level == 1:
+                slides.append({"title": section.title, "content": [], "notes": ""})  # Document title
+            continue  # A bare heading over subsections
+        scores = textrank(section_vectors) if section.sentences else np.zeros(0, dtype=np.float32)
+        slides.append(_section_slide(section.title, section.bullets, section.sentences, scores))
+    return slides[:max_slides]
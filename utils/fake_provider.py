@@ -0,0 +1,187 @@
+"""
+Local stand-in for the LLM providers.
+
+Serves OpenAI- (`/v1/chat/completions`) and Anthropic-style (`/v1/messages`)
+endpoints over plain HTTP with a configurable simulated latency, so the async
+provider layer can be exercised and benchmarked offline. OpenAI requests with
+`"stream": true` are answered as server-sent events, one small delta at a time.
+
+    python -m utils.fake_provider --concurrency 32 --requests 200 --latency 0.25
+"""
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+
+FAKE_SLIDES = {
+    "slides": [
+        {"title": "Intro to AI", "content": ["AI is changing the world", "It helps coders"], "notes": "Start with a strong hook."},
+        {"title": "The Solution", "content": ["Automated coding", "Smart presentations"], "notes": "Explain the value prop."}
+    ]
+}
+
+class FakeProviderServer:
+    """
+    Minimal keep-alive HTTP/1.1 server running on its own thread and event loop.
+    Counts accepted TCP connections, which shows whether clients reuse them.
+    """
+    def __init__(self, host="127.0.0.1", port=0, latency=0.2, payload=None, stream_delay=0.01):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.stream_delay = stream_delay
+        self.payload = payload or FAKE_SLIDES
+        self.connections = 0
+        self.requests = 0
+        self._loop = None
+        self._server = None
+        self._ready = threading.Event()
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="fake-provider", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def stop(self):
+        if not self._loop:
+            return
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    async def _shutdown(self):
+        self._server.close()
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        self._server = self._loop.run_until_complete(
+            asyncio.start_server(self._handle, self.host, self.port)
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+
+    def _body_for(self, path):
+        text = json.dumps(self.payload)
+        if path.endswith("/messages"):
+            return {
+                "id": "msg_fake", "type": "message", "role": "assistant", "model": "fake",
+                "content": [{"type": "text", "text": text}],
+                "stop_reason": "end_turn", "stop_sequence": None,
+                "usage": {"input_tokens": 10, "output_tokens": 10},
+            }
+        return {
+            "id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()), "model": "fake",
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": text}}],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 10, "total_tokens": 20},
+        }
+
+    async def _stream(self, writer):
+        """
+        Sends the payload as OpenAI chat.completion.chunk events (chunked transfer encoding).
+        """
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nTransfer-Encoding: chunked\r\n\r\n"
+        )
+        text = json.dumps(self.payload)
+        pieces = [text[i:i + 16] for i in range(0, len(text), 16)]
+        for piece in pieces + [None]:
+            if piece is None:
+                event = "data: [DONE]\n\n"
+            else:
+                event = "data: " + json.dumps({
+                    "id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()),
+                    "model": "fake",
+                    "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+                }) + "\n\n"
+            data = event.encode("utf-8")
+            writer.write(f"{len(data):x}\r\n".encode("latin-1") + data + b"\r\n")
+            await writer.drain()
+            await asyncio.sleep(self.stream_delay)
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                lines = head.decode("latin-1").split("\r\n")
+                path = lines[0].split(" ")[1]
+                headers = {k.strip().lower(): v.strip() for k, _, v in (l.partition(":") for l in lines[1:] if l)}
+                request = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                self.requests += 1
+                await asyncio.sleep(self.latency)
+                if b'"stream":true' in request.replace(b" ", b""):
+                    await self._stream(writer)
+                    continue
+                body = json.dumps(self._body_for(path)).encode("utf-8")
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    + f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+def run_benchmark(concurrency, requests, latency, provider="OpenAI"):
+    """
+    Fires `requests` generations at `concurrency` parallelism through the async
+    provider layer against a local fake server and returns throughput figures.
+    """
+    server = FakeProviderServer(latency=latency).start()
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+    os.environ["ANTHROPIC_BASE_URL"] = server.base_url[:-len("/v1")]
+    os.environ["SMART_PPT_LLM_CACHE"] = "0"
+
+    from utils import llm_engine
+    llm_engine.CACHE_ENABLED = False
+    llm_engine.scheduler.limits[provider] = concurrency
+
+    async def one(i):
+        return await llm_engine.request_slides_async(provider, "fake-key", "prompt", f"text {i}")
+
+    async def main():
+        return await asyncio.gather(*(one(i) for i in range(requests)))
+
+    started = time.perf_counter()
+    results = llm_engine.run_async(main())
+    elapsed = time.perf_counter() - started
+    server.stop()
+    return {
+        "provider": provider,
+        "requests": requests,
+        "concurrency": concurrency,
+        "latency_s": latency,
+        "wall_s": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 1),
+        "ok": sum(1 for r in results if r),
+        "tcp_connections": server.connections,
+        "peak_in_flight": llm_engine.scheduler.stats()[provider]["peak"],
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the async provider layer against a local fake provider.")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--provider", default="OpenAI", choices=["OpenAI", "Anthropic"])
+    args = parser.parse_args()
+    print(json.dumps(run_benchmark(args.concurrency, args.requests, args.latency, args.provider), indent=2))
@@ -0,0 +1,189 @@
+"""
+Image placement for slides: header-only sizing, content-hash deduplication and
+optional downscaling.
+
+    pic = add_image(slide, blob, left, top, max_width, max_height)
+
+Pixel dimensions are read from the PNG/JPEG/GIF/BMP header bytes, so placing
+an image never decodes it and the picture is inserted exactly once, already
+fitted and centered in its box. Image parts are indexed per package by SHA-1
+(seeded with the template's own media), so a logo placed on 200 slides is one
+part in the package, referenced 200 times, without python-pptx's scan of every
+part on each insertion.
+
+Images much larger than their box needs at TARGET_DPI are resampled and
+recompressed with Pillow, when it is installed. SMART_PPT_IMAGE_DPI=0 keeps
+every image as given.
+"""
+import io
+import os
+import struct
+import hashlib
+import threading
+import weakref
+from collections import namedtuple
+from functools import lru_cache
+from pptx.opc.constants import CONTENT_TYPE as CT, RELATIONSHIP_TYPE as RT
+from pptx.parts.image import Image, ImagePart
+from pptx.util import Emu
+
+ImageInfo = namedtuple("ImageInfo", "format width height")  # Pixel size
+
+# format -> (partname extension, content type)
+FORMATS = {
+    "png": ("png", CT.PNG),
+    "jpeg": ("jpeg", CT.JPEG),
+    "gif": ("gif", CT.GIF),
+    "bmp": ("bmp", CT.BMP),
+}
+
+TARGET_DPI = int(os.environ.get("SMART_PPT_IMAGE_DPI", 150))
+OVERSIZE = 1.5        # Only resample images with this much more resolution than needed
+JPEG_QUALITY = 85
+EMU_PER_INCH = 914400
+
+# --- HEADERS ---
+# JPEG start-of-frame markers (all except DHT, JPG and DAC, which share the range)
+_JPEG_SOF = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+# Markers without a length field
+_JPEG_STANDALONE = frozenset(range(0xD0, 0xDA)) | {0x01}
+
+def _jpeg_size(blob):
+    pos, n = 2, len(blob)
+    while pos + 4 <= n:
+        if blob[pos] != 0xFF:
+            return None
+        marker = blob[pos + 1]
+        if marker == 0xFF:  # Fill byte
+            pos += 1
+            continue
+        if marker in _JPEG_STANDALONE:
+            pos += 2
+            continue
+        if marker in _JPEG_SOF and pos + 9 <= n:
+            height, width = struct.unpack(">HH", blob[pos + 5:pos + 9])
+            return width, height
+        pos += 2 + struct.unpack(">H", blob[pos + 2:pos + 4])[0]
+    return None
+
+def image_info(blob):
+    """
+    Format and pixel size from the header bytes alone, or None for anything that
+    isn't a well-formed PNG, JPEG, GIF or BMP.
+    """
+    size = None
+    if blob[:8] == b"\x89PNG\r\n\x1a\n" and len(blob) >= 24:
+        fmt, size = "png", struct.unpack(">II", blob[16:24])
+    elif blob[:2] == b"\xff\xd8":
+        fmt, size = "jpeg", _jpeg_size(blob)
+    elif blob[:6] in (b"GIF87a", b"GIF89a") and len(blob) >= 10:
+        fmt, size = "gif", struct.unpack("<HH", blob[6:10])
+    elif blob[:2] == b"BM" and len(blob) >= 26:
+        fmt = "bmp"
+        if struct.unpack("<I", blob[14:18])[0] == 12:  # OS/2 BITMAPCOREHEADER
+            size = struct.unpack("<HH", blob[18:22])
+        else:
+            width, height = struct.unpack("<ii", blob[18:26])
+            size = (width, abs(height))  # Negative height: rows stored top-down
+    if not size or not all(size):
+        return None
+    return ImageInfo(fmt, *size)
+
+# --- GEOMETRY ---
+def fit_in_box(width, height, left, top, max_width, max_height):
+    """
+    Largest (left, top, width, height) with the image's aspect ratio that fits
+    the box, centered along the axis with room to spare. All but the pixel size in EMU.
+    """
+    scale = min(max_width / width, max_height / height)
+    fitted_width, fitted_height = int(width * scale), int(height * scale)
+    return (
+        int(left + (max_width - fitted_width) / 2),
+        int(top + (max_height - fitted_height) / 2),
+        fitted_width,
+        fitted_height,
+    )
+
+# --- DOWNSCALING ---
+@lru_cache(maxsize=64)
+def _resample(blob, fmt, max_px):
+    try:
+        from PIL import Image as PILImage
+    except ImportError:
+        return blob
+    with PILImage.open(io.BytesIO(blob)) as im:
+        if fmt == "jpeg":
+            im.draft("RGB", max_px)  # Let the decoder skip detail we'd throw away
+        im.thumbnail(max_px, PILImage.LANCZOS)
+        out = io.BytesIO()
+        if fmt == "jpeg":
+            im.save(out, "JPEG", quality=JPEG_QUALITY, optimize=True)
+        else:
+            im.save(out, "PNG", optimize=True)  # BMP is uncompressed; store it as PNG
+    data = out.getvalue()
+    return data if len(data) < len(blob) else blob
+
+def downscale(blob, info, width, height, dpi=TARGET_DPI):
+    """
+    `blob` resampled to what a width x height EMU box needs at `dpi`, when it
+    has more than OVERSIZE times that. Returns (blob, info); the input unchanged
+    if it isn't oversized, is a GIF (may be animated), or Pillow is unavailable.
+    """
+    if not dpi or info.format == "gif":
+        return blob, info
+    max_px = (max(1, round(width / EMU_PER_INCH * dpi)), max(1, round(height / EMU_PER_INCH * dpi)))
+    if info.width <= max_px[0] * OVERSIZE and info.height <= max_px[1] * OVERSIZE:
+        return blob, info
+    resampled = _resample(blob, info.format, max_px)
+    if resampled is blob:
+        return blob, info
+    return resampled, image_info(resampled)
+
+# --- DEDUPLICATION ---
+class ImageStore:
+    """
+    Image parts of each live package, by SHA-1 of their blob. A package is
+    indexed (one walk over its parts) the first time an image is added to it.
+    """
+    def __init__(self):
+        self._index = weakref.WeakKeyDictionary()  # package -> {sha1: ImagePart}
+        self._lock = threading.Lock()
+
+    def image_part(self, package, blob, info):
+        digest = hashlib.sha1(blob).hexdigest()
+        with self._lock:
+            parts = self._index.get(package)
+            if parts is None:
+                parts = self._index[package] = {
+                    part.sha1: part for part in package.iter_parts() if isinstance(part, ImagePart)
+                }
+            part = parts.get(digest)
+            if part is None:
+                ext, content_type = FORMATS[info.format]
+                part = parts[digest] = ImagePart(package.next_partname(f"/ppt/media/image%d.{ext}"),
+                                                 content_type, package, blob)
+            return part
+
+image_store = ImageStore()
+
+# --- PLACEMENT ---
+def add_image(slide, blob, left, top, max_width, max_height, dpi=TARGET_DPI):
+    """
+    Adds `blob` to `slide` as one picture, scaled to fit the box without
+    distortion and centered in it. Returns the Picture shape.
+    """
+    info = image_info(blob)
+    if info is None:
+        # Other formats (TIFF, WMF, ...) go through python-pptx, which measures them with Pillow
+        px_width, px_height = Image.from_blob(blob).size
+        left, top, width, height = fit_in_box(px_width, px_height, left, top, max_width, max_height)
+        return slide.shapes.add_picture(io.BytesIO(blob), Emu(left), Emu(top), Emu(width), Emu(height))
+
+    left, top, width, height = fit_in_box(info.width, info.height, left, top, max_width, max_height)
+    blob, info = downscale(blob, info, width, height, dpi)
+    part = image_store.image_part(slide.part.package, blob, info)
+    rId = slide.part.relate_to(part, RT.IMAGE)
+    shapes = slide.shapes
+    pic = shapes._add_pic_from_image_part(part, rId, Emu(left), Emu(top), Emu(width), Emu(height))
+    shapes._recalculate_extents()
+    return shapes._shape_factory(pic)
@@ -0,0 +1,182 @@
+"""
+Process-wide background jobs for the Streamlit app.
+
+Generation and rendering run on a fixed pool of worker threads shared by every
+session, instead of inline in the script thread. A session keeps only job ids
+in st.session_state, so a rerun (any widget interaction) just polls the job
+again rather than killing or repeating the work.
+
+    job_id = jobs.submit(work, arg, kind="generate")   # work(job, arg)
+    job = jobs.get(job_id)                             # None once expired
+    job.status, job.progress, job.result, job.error
+    jobs.cancel(job_id)
+
+Work functions receive their Job first; long ones should call job.report(item)
+for partial results and stop when job.cancelled is set (or pass job.cancel_event
+to anything that accepts one). Finished jobs are kept for `ttl` seconds.
+"""
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+MAX_WORKERS = int(os.environ.get("SMART_PPT_JOB_WORKERS", 4))
+MAX_QUEUED = int(os.environ.get("SMART_PPT_JOB_QUEUE", 32))
+RESULT_TTL = float(os.environ.get("SMART_PPT_JOB_TTL", 15 * 60))
+
+class QueueFullError(RuntimeError):
+    """
+    Raised by submit() when every worker is busy and the wait queue is full.
+    """
+
+class Job:
+    def __init__(self, kind):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.status = QUEUED
+        self.progress = []      # Partial results, appended by the worker
+        self.result = None
+        self.error = None       # The exception, when status is FAILED
+        self.trace = None       # telemetry.Trace, for work that records one
+        self.preview = None     # Provisional result to show until progress arrives
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+        self._future = None
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    @property
+    def finished(self):
+        return self.status in FINISHED
+
+    def report(self, item, index=None):
+        """
+        Appends a partial result, or with `index` replaces an earlier one.
+        """
+        if index is not None and index < len(self.progress):
+            self.progress[index] = item
+        else:
+            self.progress.append(item)
+
+    def snapshot(self):
+        now = self.finished_at or time.time()
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": len(self.progress),
+            "error": str(self.error) if self.error else None,
+            "queued_s": round((self.started_at or now) - self.submitted_at, 3),
+            "running_s": round(now - self.started_at, 3) if self.started_at else 0.0,
+        }
+
+class JobManager:
+    """
+    Bounded executor: at most `max_workers` jobs run and `max_queued` more wait;
+    beyond that submit() raises QueueFullError instead of queueing unboundedly.
+    """
+    def __init__(self, max_workers=MAX_WORKERS, max_queued=MAX_QUEUED, ttl=RESULT_TTL):
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs = OrderedDict()  # id -> Job, in submission order
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(("submitted", "rejected", DONE, FAILED, CANCELLED), 0)
+
+    def _active(self):
+        return sum(1 for job in self._jobs.values() if not job.finished)
+
+    def submit(self, fn, *args, kind="job", **kwargs):
+        """
+        Queues fn(job, *args, **kwargs) and returns the job id.
+        """
+        self.expire()
+        job = Job(kind)
+        with self._lock:
+            if self._active() >= self.max_workers + self.max_queued:
+                self._counts["rejected"] += 1
+                raise QueueFullError("The server is busy, please try again in a moment.")
+            self._jobs[job.id] = job
+            self._counts["submitted"] += 1
+        job._future = self._executor.submit(self._run, job, fn, args, kwargs)
+        return job.id
+
+    def _run(self, job, fn, args, kwargs):
+        if job.cancelled:
+            return self._finish(job, CANCELLED)
+        job.status = RUNNING
+        job.started_at = time.time()
+        try:
+            result = fn(job, *args, **kwargs)
+        except Exception as e:
+            job.error = e
+            return self._finish(job, CANCELLED if job.cancelled else FAILED)
+        job.result = result
+        self._finish(job, CANCELLED if job.cancelled else DONE)
+
+    def _finish(self, job, status):
+        job.status = status
+        job.finished_at = time.time()
+        with self._lock:
+            self._counts[status] += 1
+
+    def get(self, job_id):
+        """
+        The Job, or None if the id is unknown or its result has expired.
+        """
+        self.expire()
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """
+        Asks a job to stop. Queued jobs never start; running ones stop at their
+        next cancellation check. Returns False if the job already finished.
+        """
+        job = self.get(job_id)
+        if not job or job.finished:
+            return False
+        job.cancel_event.set()
+        if job._future and job._future.cancel():
+            self._finish(job, CANCELLED)  # Never reached a worker
+        return True
+
+    def expire(self):
+        """
+        Drops finished jobs (and their results) older than the TTL.
+        """
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            for job_id in [j.id for j in self._jobs.values() if j.finished and j.finished_at < cutoff]:
+                del self._jobs[job_id]
+
+    def stats(self):
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+            return {
+                "workers": self.max_workers,
+                "running": statuses.count(RUNNING),
+                "queued": statuses.count(QUEUED),
+                "retained": sum(1 for s in statuses if s in FINISHED),
+                **self._counts,
+            }
+
+    def shutdown(self, cancel=True):
+        if cancel:
+            with self._lock:
+                jobs = list(self._jobs.values())
+            for job in jobs:
+                job.cancel_event.set()
+        self._executor.shutdown(wait=True, cancel_futures=cancel)
+
+jobs = JobManager()
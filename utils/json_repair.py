@@ -0,0 +1,247 @@
+"""
+Recovery parser for malformed JSON in LLM responses.
+
+One left-to-right pass, aware of strings and nesting, finds the top-level
+object/array candidates in the surrounding prose and rewrites each into valid
+JSON on the way:
+
+    - trailing and doubled commas are dropped, missing ones between values inserted
+    - raw newlines, tabs and other control characters inside strings are escaped,
+      invalid escapes (e.g. \\' or C:\\Users) are made literal, and quotes that
+      clearly don't end their string are escaped
+    - a closing bracket that doesn't match closes what is open, or is dropped
+    - a truncated candidate is cut back to its last complete slide (or, when even
+      the first slide is cut off, its last complete value) and closed
+
+The scanner jumps between structural characters with compiled regexes, so it is
+linear in the response size. Candidates are validated with json.loads; failed
+ones are rescanned from their next character within a fixed budget, which keeps
+the whole search linear even on adversarial input.
+
+    find_json(text)       -> Candidate(text, value, repairs) or None
+    repair_json(text)     -> the best candidate's JSON text (or `text` unchanged)
+    salvage_slides(text)  -> every usable slide dict
+"""
+import json
+import re
+from collections import namedtuple
+
+# text: repaired JSON; value: its parsed value; repairs: sorted defect names
+Candidate = namedtuple("Candidate", "text value repairs")
+
+# A slide is a direct element of the top-level array, or of an array held by
+# the top-level object, as in IncrementalSlideParser
+SLIDE_DEPTH = 2
+RESCAN_BUDGET = 4  # Total characters scanned stay under this multiple of the input
+
+_STRUCTURAL = re.compile(r'[{}\[\]",:]')
+_STRING_SPECIAL = re.compile(r'["\\\x00-\x1f]')
+_OPENER = re.compile(r"[{\[]")
+# A quote ends its string only if a delimiter, a new line or the end follows
+_STRING_END = re.compile(r'[ \t]*(?:[,:}\]]|\r?\n|$)')
+_HEX4 = re.compile(r"[0-9a-fA-F]{4}")
+_SIMPLE_ESCAPES = frozenset('"\\/bfnrt')
+_CONTROL_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t", "\b": "\\b", "\f": "\\f"}
+
+# --- SCANNER ---
+def _read_string(text, pos, repairs):
+    """
+    Reads a string body from just after its opening quote.
+    Returns (repaired string with quotes, position after it, closed).
+    """
+    n = len(text)
+    buf = ['"']
+    while True:
+        m = _STRING_SPECIAL.search(text, pos)
+        if m is None:
+            buf.append(text[pos:])
+            return "".join(buf), n, False
+        buf.append(text[pos:m.start()])
+        ch = m.group()
+        pos = m.end()
+        if ch == '"':
+            if _STRING_END.match(text, pos):
+                buf.append('"')
+                return "".join(buf), pos, True
+            buf.append('\\"')
+            repairs.add("unescaped_quote")
+        elif ch == "\\":
+            if pos >= n:
+                return "".join(buf), n, False
+            nxt = text[pos]
+            if nxt in _SIMPLE_ESCAPES:
+                buf.append("\\" + nxt)
+                pos += 1
+            elif nxt == "u" and _HEX4.match(text, pos + 1):
+                buf.append(text[pos - 1:pos + 5])
+                pos += 5
+            elif nxt == "'":
+                buf.append("'")  # JavaScript-style \' needs no escape in JSON
+                pos += 1
+                repairs.add("invalid_escape")
+            else:
+                buf.append("\\\\")  # Literal backslash; the next character is read normally
+                repairs.add("invalid_escape")
+        else:
+            buf.append(_CONTROL_ESCAPES.get(ch) or "\\u%04x" % ord(ch))
+            repairs.add("control_character")
+
+def _scan(text, pos, repairs):
+    """
+    Rewrites the candidate whose opener is at text[pos].
+    Returns (JSON text or None, position after the candidate).
+    """
+    n = len(text)
+    out = []
+    stack = []
+    expect_key = False      # Inside an object, before a key
+    after_value = False     # The last token completed a value
+    pending_comma = None    # Index in `out` of a comma no value has followed yet
+    slide_cut = value_cut = None  # (len(out), len(stack)) after the last complete slide / value
+
+    while pos < n:
+        m = _STRUCTURAL.search(text, pos)
+        end = m.start() if m else n
+        if end > pos:
+            # Whitespace or a bare scalar (number, true, false, null)
+            run = text[pos:end]
+            out.append(run)
+            if run.strip():
+                pending_comma = None
+                after_value = True
+        if m is None:
+            break
+        ch = m.group()
+        pos = m.end()
+
+        if ch == '"':
+            if after_value:
+                out.append(",")
+                repairs.add("missing_comma")
+            is_key = expect_key and stack[-1] == "{"
+            string, pos, closed = _read_string(text, pos, repairs)
+            out.append(string)
+            pending_comma = None
+            if not closed:
+                break
+            after_value = not is_key
+            if after_value:
+                value_cut = (len(out), len(stack))
+        elif ch in "{[":
+            if after_value:
+                out.append(",")
+                repairs.add("missing_comma")
+            stack.append(ch)
+            out.append(ch)
+            pending_comma = None
+            after_value = False
+            expect_key = ch == "{"
+        elif ch in "}]":
+            opener = "{" if ch == "}" else "["
+            if opener not in stack:
+                repairs.add("mismatched_bracket")
+                continue
+            if pending_comma is not None:
+                out[pending_comma] = ""
+                pending_comma = None
+                repairs.add("trailing_comma")
+            while stack[-1] != opener:
+                out.append("}" if stack.pop() == "{" else "]")
+                repairs.add("mismatched_bracket")
+            stack.pop()
+            out.append(ch)
+            if not stack:
+                return "".join(out), pos
+            after_value = True
+            expect_key = False
+            value_cut = (len(out), len(stack))
+            # Only an object closing as an element of the slide array completes
+            # a slide; a nested "content" array closing there does not
+            if ch == "}" and stack[-1] == "[" and len(stack) == (1 if stack[0] == "[" else SLIDE_DEPTH):
+                slide_cut = value_cut
+        elif ch == ",":
+            if not after_value:
+                repairs.add("extra_comma")
+                continue
+            pending_comma = len(out)
+            out.append(",")
+            after_value = False
+            expect_key = stack[-1] == "{"
+        else:  # ":"
+            out.append(":")
+            after_value = False
+            expect_key = False
+
+    # Ran out of text with containers still open
+    if not stack:
+        return None, n
+    cut = slide_cut or value_cut
+    if cut is None:
+        return None, n
+    # Nothing after a cut point pops below its depth, so the open containers
+    # at that point are exactly stack[:depth]
+    size, depth = cut
+    del out[size:]
+    out.extend("}" if c == "{" else "]" for c in reversed(stack[:depth]))
+    repairs.add("truncated")
+    return "".join(out), n
+
+# --- CANDIDATES ---
+def _rank(value):
+    if isinstance(value, dict):
+        return 2 if isinstance(value.get("slides"), list) else 1
+    if isinstance(value, list) and any(isinstance(item, dict) for item in value):
+        return 1
+    return 0
+
+def find_json(text):
+    """
+    The best JSON candidate in `text`: an object with a "slides" list beats any
+    other object or a list of objects, which beat anything else; ties go to the
+    longer candidate. Returns a Candidate, or None if nothing could be recovered.
+    """
+    budget = RESCAN_BUDGET * len(text)
+    best, best_key = None, None
+    pos = 0
+    while budget > 0:
+        m = _OPENER.search(text, pos)
+        if m is None:
+            break
+        repairs = set()
+        json_text, end = _scan(text, m.start(), repairs)
+        budget -= end - m.start()
+        try:
+            value = json.loads(json_text) if json_text is not None else None
+        except ValueError:
+            json_text = None
+        if json_text is None:
+            # Probably prose with a stray bracket; the real JSON may start inside it
+            pos = m.start() + 1
+            continue
+        key = (_rank(value), len(json_text))
+        if best_key is None or key > best_key:
+            best, best_key = Candidate(json_text, value, tuple(sorted(repairs))), key
+        if key[0] == 2:
+            break
+        pos = end
+    return best
+
+def repair_json(text):
+    """
+    Valid JSON text recovered from `text`, or `text` itself if there is none.
+    """
+    candidate = find_json(text)
+    return candidate.text if candidate else text
+
+def salvage_slides(text):
+    """
+    Every slide dict recoverable from `text`, including the complete slides of a
+    truncated response. Returns [] when there are none.
+    """
+    candidate = find_json(text)
+    if candidate is None:
+        return []
+    value = candidate.value
+    if isinstance(value, dict):
+        value = value.get("slides", [value])
+    return [slide for slide in value if isinstance(slide, dict)] if isinstance(value, list) else []
@@ -1,105 +1,584 @@
 import json
+import os
 import re
 import time
-import streamlit as st
+import queue
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import contextlib
+import importlib
+from utils.resilience import get_guard, latency_tracker
+from utils.json_repair import find_json
+from utils.schema import dump_slides, load_slides, normalize_slides
+from utils.telemetry import bind, record_tokens, span, timed
+
+# --- MODELS ---
+OPENAI_MODEL = "gpt-4o"
+ANTHROPIC_MODEL = "claude-3-5-sonnet-20240620"
+GOOGLE_MODEL = "gemini-2.5-flash"
+PROVIDER_MODELS = {
+    "OpenAI": OPENAI_MODEL,
+    "Anthropic": ANTHROPIC_MODEL,
+    "Google Gemini": GOOGLE_MODEL,
+}
+OFFLINE_PROVIDER = "Offline (Extractive)"  # No API key, no network: utils.extractive
+
+# --- LONG DOCUMENT SETTINGS ---
+CHARS_PER_SLIDE = 500       # ~500 chars of source text per slide
+MAX_SLIDES = 40             # Global slide budget for a single deck
+CHUNK_CHARS = 12000         # Documents longer than this are outlined chunk by chunk
+MAX_PARALLEL_CHUNKS = 4     # Concurrent per-chunk provider calls
+MAX_MERGED_BULLETS = 6      # Cap when folding duplicate slides together
+
+# --- HEDGING SETTINGS ---
+HEDGE_AFTER_SECONDS = 8.0   # Fire a duplicate request to a backup provider after this long
+HEDGE_PERCENTILE = 90       # With latency history, hedge at the primary's p90 instead
+
+# --- CONCURRENCY SETTINGS ---
+MAX_IN_FLIGHT = {"OpenAI": 8, "Anthropic": 4, "Google Gemini": 8}
+DEFAULT_MAX_IN_FLIGHT = 4
 
 # --- HELPER: JSON CLEANER ---
 def extract_json_from_text(text):
     """
-    Robustly extracts JSON object from text using regex.
-    Fixes issues where LLM adds "Here is the JSON:" or markdown fences.
+    Robustly extracts JSON object from text.
+    Fixes issues where LLM adds "Here is the JSON:" or markdown fences, and repairs
+    common defects (trailing commas, raw newlines in strings, truncated output)
+    instead of paying for another request; see utils.json_repair.
     """
-    # 1. Try standard cleaning
-    text = text.strip()
-    if text.startswith("```json"):
-        text = text[7:]
-    if text.endswith("```"):
-        text = text[:-3]
-    
-    # 2. If simple cleaning failed to make it valid, try regex
-    try:
-        json.loads(text)
-        return text
-    except:
-        # Look for the first opening brace { and the last closing brace }
-        match = re.search(r'(\{.*\})', text, re.DOTALL)
-        if match:
-            return match.group(1)
-        return text
+    with span("extract_json") as attrs:
+        # 1. Try standard cleaning
+        text = text.strip()
+        if text.startswith("```json"):
+            text = text[7:]
+        if text.endswith("```"):
+            text = text[:-3]
+
+        # 2. If simple cleaning failed to make it valid, scan for the best candidate and repair it
+        try:
+            json.loads(text)
+            return text
+        except ValueError:
+            candidate = find_json(text)
+            if candidate is None:
+                return text
+            attrs["repairs"] = candidate.repairs
+            return candidate.text
+
+# --- HELPER: INCREMENTAL JSON PARSER ---
+class IncrementalSlideParser:
+    """
+    Consumes a JSON response in arbitrary text chunks and returns each slide object
+    as soon as its closing brace arrives. A slide is any object that is a direct
+    element of the top-level array, or of an array held by the top-level object
+    (i.e. {"slides": [...]}). Each character is scanned exactly once.
+    """
+    def __init__(self):
+        self._buf = []          # Characters of the slide object currently being read
+        self._stack = []        # Open containers: '{' or '['
+        self._in_string = False
+        self._escape = False
+        self._capture_depth = None
+        self.count = 0
+
+    def feed(self, chunk):
+        slides = []
+        for ch in chunk:
+            if self._capture_depth is not None:
+                self._buf.append(ch)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                if ch == "{" and self._capture_depth is None and self._stack[-1:] == ["["] and len(self._stack) <= 2:
+                    self._capture_depth = len(self._stack)
+                    self._buf = ["{"]
+                self._stack.append(ch)
+            elif ch in "}]" and self._stack:
+                self._stack.pop()
+                if ch == "}" and self._capture_depth == len(self._stack):
+                    slides.extend(self._finish("".join(self._buf)))
+                    self._capture_depth = None
+                    self._buf = []
+        return slides
+
+    def _finish(self, raw):
+        try:
+            slide = json.loads(raw)
+        except json.JSONDecodeError:
+            return []
+        if not isinstance(slide, dict):
+            return []
+        self.count += 1
+        return validate_slides([slide])
 
 # --- HELPER: RETRY LOGIC ---
-def api_retry_wrapper(func, *args, retries=3, **kwargs):
+def api_retry_wrapper(func, *args, provider="default", **kwargs):
     """
     Retries an API call if it fails due to network or overload.
+    Backoff, error classification, rate-limit pacing and circuit breaking
+    come from the provider's guard (see utils.resilience).
     """
-    for attempt in range(retries):
-        try:
-            return func(*args, **kwargs)
-        except Exception as e:
-            if attempt < retries - 1:
-                time.sleep(2) # Wait 2 seconds before retry
-                continue
-            else:
-                raise e
+    return get_guard(provider).call_blocking(func, *args, **kwargs)
+
+async def api_retry_async(provider, func, *args, **kwargs):
+    """
+    Async twin of api_retry_wrapper; waits without blocking the event loop.
+    """
+    return await get_guard(provider).call(func, *args, **kwargs)
+
+# --- HELPER: RESPONSE CACHE ---
+CACHE_DIR = os.environ.get("SMART_PPT_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "smart_ppt"))
+CACHE_ENABLED = os.environ.get("SMART_PPT_LLM_CACHE", "1") != "0"
+
+def _normalize(text):
+    return re.sub(r"\s+", " ", text).strip()
+
+class ResponseCache:
+    """
+    Disk-backed (SQLite) cache of validated slide lists, stored as compact rows.
+    Keyed on a hash of (provider, model, normalized prompt, normalized text) -
+    API keys are never part of the key or the stored value.
+    Entries expire after `ttl` seconds; least recently used entries are evicted
+    once the stored JSON exceeds `max_bytes`.
+    """
+    def __init__(self, path, ttl=7 * 24 * 3600, max_bytes=50 * 1024 * 1024):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._conn = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    @staticmethod
+    def make_key(provider, model, system_prompt, text):
+        payload = "\x1f".join([provider, model or "", _normalize(system_prompt), _normalize(text)])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _db(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created REAL NOT NULL, accessed REAL NOT NULL, elapsed REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed)")
+        return self._conn
+
+    def get(self, key):
+        """
+        Returns the cached slide list or None. Expired entries count as misses.
+        """
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            row = db.execute("SELECT value, created, elapsed FROM responses WHERE key = ?", (key,)).fetchone()
+            if row and now - row[1] <= self.ttl:
+                db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+                db.commit()
+                self.hits += 1
+                self.saved_seconds += row[2]
+                return load_slides(row[0])
+            if row:
+                db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                db.commit()
+            self.misses += 1
+            return None
+
+    def put(self, key, slides, elapsed):
+        """
+        Stores a validated slide list along with how long the provider took to produce it.
+        """
+        value = dump_slides(slides)
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            db.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created, accessed, elapsed) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, value, size, now, now, elapsed),
+            )
+            self._evict(db, now)
+            db.commit()
+
+    def _evict(self, db, now):
+        db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in db.execute("SELECT key, size FROM responses ORDER BY accessed").fetchall():
+            db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def stats(self):
+        with self._lock:
+            entries, total = self._db().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "saved_seconds": round(self.saved_seconds, 3),
+                "entries": entries,
+                "bytes": total,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._db().execute("DELETE FROM responses")
+            self._db().commit()
+            self.hits = self.misses = 0
+            self.saved_seconds = 0.0
+
+response_cache = ResponseCache(os.path.join(CACHE_DIR, "llm_responses.sqlite3"))
+
+# --- HELPER: CHUNKING ---
+HEADING_RE = re.compile(r"^\s{0,3}(#{1,6}\s+\S|[A-Z0-9][A-Z0-9 ,:&'-]{2,60}$)")
+SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+
+def estimate_slide_count(text):
+    """
+    Estimates the deck length from character density, capped by the global budget.
+    """
+    return min(MAX_SLIDES, max(1, len(text) // CHARS_PER_SLIDE))
+
+def _iter_paragraphs(text):
+    """
+    Lazily yields paragraphs (blank-line separated blocks) without copying the document.
+    """
+    start = 0
+    for match in re.finditer(r"\n\s*\n", text):
+        block = text[start:match.start()].strip()
+        if block:
+            yield block
+        start = match.end()
+    block = text[start:].strip()
+    if block:
+        yield block
+
+def _split_long_paragraph(paragraph, max_chars):
+    """
+    Splits a single oversized paragraph on sentence boundaries (hard cut as a last resort).
+    """
+    piece = ""
+    for sentence in SENTENCE_END_RE.split(paragraph):
+        while len(sentence) > max_chars:
+            if piece:
+                yield piece
+                piece = ""
+            yield sentence[:max_chars]
+            sentence = sentence[max_chars:]
+        if piece and len(piece) + len(sentence) + 1 > max_chars:
+            yield piece
+            piece = ""
+        piece = f"{piece} {sentence}" if piece else sentence
+    if piece:
+        yield piece
+
+def iter_text_chunks(text, max_chars=CHUNK_CHARS):
+    """
+    Streams the text as chunks of at most `max_chars`, cut on section and paragraph boundaries.
+    A heading starts a new chunk once the current one is at least half full,
+    so sections stay together whenever they fit.
+    """
+    buf = []
+    size = 0
+    for paragraph in _iter_paragraphs(text):
+        is_heading = bool(HEADING_RE.match(paragraph.split("\n", 1)[0]))
+        if buf and (size + len(paragraph) > max_chars or (is_heading and size >= max_chars // 2)):
+            yield "\n\n".join(buf)
+            buf, size = [], 0
+
+        if len(paragraph) > max_chars:
+            yield from _split_long_paragraph(paragraph, max_chars)
+            continue
+
+        buf.append(paragraph)
+        size += len(paragraph) + 2
+    if buf:
+        yield "\n\n".join(buf)
+
+# --- ASYNC RUNTIME ---
+# All provider I/O runs on one long-lived background event loop. Pooled clients
+# (and their HTTP/gRPC connections) are bound to that loop, so they stay valid
+# across Streamlit reruns and are shared by every session in the process.
+_loop = None
+_loop_lock = threading.Lock()
+
+def _get_loop():
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="llm-engine-loop", daemon=True).start()
+            _loop = loop
+    return _loop
+
+def run_async(coro):
+    """
+    Runs a coroutine on the engine loop from synchronous code and blocks for the result.
+    Must not be called from the engine loop itself.
+    """
+    return asyncio.run_coroutine_threadsafe(bind(coro), _get_loop()).result()
+
+def _make_client(provider, api_key):
+    if provider == "OpenAI":
+        from openai import AsyncOpenAI
+        return AsyncOpenAI(api_key=api_key)
+    if provider == "Anthropic":
+        import anthropic
+        return anthropic.AsyncAnthropic(api_key=api_key)
+    if provider == "Google Gemini":
+        from google.ai import generativelanguage as glm
+        return glm.GenerativeServiceAsyncClient(client_options={"api_key": api_key})
+    raise ValueError(f"Unknown provider: {provider}")
+
+class ClientPool:
+    """
+    Keeps one async SDK client per (provider, API key hash) so TLS sessions and
+    connection pools are reused across calls. Raw keys are not used as dict keys.
+    """
+    def __init__(self):
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def get(self, provider, api_key):
+        key = (provider, hashlib.sha256(api_key.encode("utf-8")).hexdigest())
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = _make_client(provider, api_key)
+                self._clients[key] = client
+            return client
+
+    def __len__(self):
+        return len(self._clients)
+
+class ProviderScheduler:
+    """
+    Caps the number of in-flight requests per provider with asyncio semaphores.
+    Semaphores are created lazily on the engine loop.
+    """
+    def __init__(self, limits=None, default=DEFAULT_MAX_IN_FLIGHT):
+        self.limits = dict(limits or MAX_IN_FLIGHT)
+        self.default = default
+        self._semaphores = {}
+        self.in_flight = {}
+        self.peak = {}
+        self.completed = {}
+
+    def _semaphore(self, provider):
+        sem = self._semaphores.get(provider)
+        if sem is None:
+            sem = asyncio.Semaphore(self.limits.get(provider, self.default))
+            self._semaphores[provider] = sem
+        return sem
+
+    @contextlib.asynccontextmanager
+    async def slot(self, provider):
+        """
+        Holds one in-flight slot for `provider` (used directly by streaming calls).
+        """
+        async with self._semaphore(provider):
+            self.in_flight[provider] = self.in_flight.get(provider, 0) + 1
+            self.peak[provider] = max(self.peak.get(provider, 0), self.in_flight[provider])
+            try:
+                yield
+            finally:
+                self.in_flight[provider] -= 1
+                self.completed[provider] = self.completed.get(provider, 0) + 1
+
+    async def submit(self, provider, func, *args, **kwargs):
+        async with self.slot(provider):
+            return await func(*args, **kwargs)
+
+    def stats(self):
+        return {
+            provider: {
+                "limit": self.limits.get(provider, self.default),
+                "in_flight": self.in_flight.get(provider, 0),
+                "peak": self.peak.get(provider, 0),
+                "completed": self.completed.get(provider, 0),
+            }
+            for provider in set(self.limits) | set(self.completed)
+        }
+
+client_pool = ClientPool()
+scheduler = ProviderScheduler()
 
 # --- PROVIDER FUNCTIONS ---
-def get_openai_json(api_key, system_prompt, user_text):
-    from openai import OpenAI
-    client = OpenAI(api_key=api_key)
-    
-    response = client.chat.completions.create(
-        model="gpt-4o",
+def _record_usage(provider, usage, input_field, output_field):
+    # Token counts as reported by the provider; absent on some responses (e.g. test doubles)
+    if usage is not None:
+        record_tokens(provider, getattr(usage, input_field, 0), getattr(usage, output_field, 0))
+
+async def get_openai_json_async(api_key, system_prompt, user_text):
+    client = client_pool.get("OpenAI", api_key)
+
+    response = await client.chat.completions.create(
+        model=OPENAI_MODEL,
         response_format={"type": "json_object"},
         messages=[
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_text}
         ]
     )
+    _record_usage("OpenAI", getattr(response, "usage", None), "prompt_tokens", "completion_tokens")
     return response.choices[0].message.content
 
-def get_anthropic_json(api_key, system_prompt, user_text):
-    import anthropic
-    client = anthropic.Anthropic(api_key=api_key)
-    
-    response = client.messages.create(
-        model="claude-3-5-sonnet-20240620",
+async def get_anthropic_json_async(api_key, system_prompt, user_text):
+    client = client_pool.get("Anthropic", api_key)
+
+    response = await client.messages.create(
+        model=ANTHROPIC_MODEL,
         max_tokens=4096,
         messages=[
              {"role": "user", "content": f"{system_prompt}\n\n{user_text}"}
         ]
     )
+    _record_usage("Anthropic", getattr(response, "usage", None), "input_tokens", "output_tokens")
     return response.content[0].text
 
-def get_google_json(api_key, system_prompt, user_text):
-    import google.generativeai as genai
-    genai.configure(api_key=api_key)
-    
-    # Updated to a valid model version (1.5 Flash is standard as of late 2024/2025)
-    model = genai.GenerativeModel('gemini-2.5-flash', generation_config={"response_mime_type": "application/json"})
-    
+def _google_request(system_prompt, user_text):
+    # Built for the pooled GenerativeServiceAsyncClient's public API: a per-key
+    # client without the process-global genai.configure() or GenerativeModel internals
+    from google.ai import generativelanguage as glm
+
     prompt = f"{system_prompt}\n\nText to convert:\n{user_text}"
-    response = model.generate_content(prompt)
-    return response.text
+    return glm.GenerateContentRequest(
+        model=f"models/{GOOGLE_MODEL}",
+        contents=[glm.Content(role="user", parts=[glm.Part(text=prompt)])],
+        generation_config=glm.GenerationConfig(response_mime_type="application/json"),
+    )
 
-# --- MAIN ANALYSIS FUNCTION ---
-def analyze_and_structure_text(provider, api_key, text, guidance, num_slides_est):
+def _google_text(response):
+    # The first candidate's text, as genai's response.text
+    if not response.candidates:
+        return ""
+    return "".join(part.text for part in response.candidates[0].content.parts)
+
+async def get_google_json_async(api_key, system_prompt, user_text):
+    client = client_pool.get("Google Gemini", api_key)
+
+    response = await client.generate_content(request=_google_request(system_prompt, user_text))
+    _record_usage("Google Gemini", getattr(response, "usage_metadata", None), "prompt_token_count", "candidates_token_count")
+    return _google_text(response)
+
+# Streaming variants: async generators of text deltas
+async def stream_openai_json(api_key, system_prompt, user_text):
+    client = client_pool.get("OpenAI", api_key)
+
+    stream = await client.chat.completions.create(
+        model=OPENAI_MODEL,
+        response_format={"type": "json_object"},
+        stream=True,
+        stream_options={"include_usage": True},  # Final chunk carries the token counts
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_text}
+        ]
+    )
+    async for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+        if getattr(chunk, "usage", None):
+            _record_usage("OpenAI", chunk.usage, "prompt_tokens", "completion_tokens")
+
+async def stream_anthropic_json(api_key, system_prompt, user_text):
+    client = client_pool.get("Anthropic", api_key)
+
+    async with client.messages.stream(
+        model=ANTHROPIC_MODEL,
+        max_tokens=4096,
+        messages=[
+             {"role": "user", "content": f"{system_prompt}\n\n{user_text}"}
+        ]
+    ) as stream:
+        async for text in stream.text_stream:
+            yield text
+        message = await stream.get_final_message()
+        _record_usage("Anthropic", message.usage, "input_tokens", "output_tokens")
+
+async def stream_google_json(api_key, system_prompt, user_text):
+    client = client_pool.get("Google Gemini", api_key)
+
+    usage = None
+    async for chunk in await client.stream_generate_content(request=_google_request(system_prompt, user_text)):
+        text = _google_text(chunk)
+        if text:
+            yield text
+        usage = getattr(chunk, "usage_metadata", None) or usage  # Running totals; the last chunk has them all
+    _record_usage("Google Gemini", usage, "prompt_token_count", "candidates_token_count")
+
+STREAMING_PROVIDERS = {
+    "OpenAI": stream_openai_json,
+    "Anthropic": stream_anthropic_json,
+    "Google Gemini": stream_google_json,
+}
+
+ASYNC_PROVIDERS = {
+    "OpenAI": get_openai_json_async,
+    "Anthropic": get_anthropic_json_async,
+    "Google Gemini": get_google_json_async,
+}
+
+# Synchronous entry points (kept for callers outside the async pipeline)
+def get_openai_json(api_key, system_prompt, user_text):
+    return run_async(get_openai_json_async(api_key, system_prompt, user_text))
+
+def get_anthropic_json(api_key, system_prompt, user_text):
+    return run_async(get_anthropic_json_async(api_key, system_prompt, user_text))
+
+def get_google_json(api_key, system_prompt, user_text):
+    return run_async(get_google_json_async(api_key, system_prompt, user_text))
+
+# --- PROMPT ---
+@timed("prompt_build")
+def build_system_prompt(guidance, num_slides_est, part=None, notes=True):
     """
-    Routes the request to the correct LLM provider.
-    Analyzes text and returns structured JSON for slides.
-    Includes Prompt Engineering for better quality.
+    Builds the designer prompt. `part` is the 1-based chunk number when a long
+    document is outlined piece by piece. Without `notes`, it asks for a compact
+    outline (titles and bullets) whose notes are written per slide afterwards.
     """
-    
-    # 1. Enhanced System Prompt
-    if api_key == "TEST_KEY":
-        return [
-            {"title": "Intro to AI", "content": ["AI is changing the world", "It helps coders"], "notes": "Start with a strong hook."},
-            {"title": "The Solution", "content": ["Automated coding", "Smart presentations"], "notes": "Explain the value prop."}
-        ]
+    if part is None:
+        scope = "Convert the input text into a structured PowerPoint presentation."
+        opening = "Ensure the first slide is an Intro/Title slide."
+    else:
+        scope = (f"The input is PART {part} of a longer document. Convert only this part into slides; "
+                 "other parts are handled separately and merged in order.")
+        opening = ("Ensure the first slide is an Intro/Title slide." if part == 1
+                   else "Do NOT add an intro, title or agenda slide; continue the flow from earlier parts.")
+    if notes:
+        notes_rule = "4. **Speaker Notes:** Write detailed script-like notes for the speaker to explain the slide."
+        notes_field = ',\n          "notes": "Detailed speaker notes explaining the context of these bullets."'
+    else:
+        notes_rule = "4. **No Speaker Notes:** Output titles and bullets only; notes are written separately for each slide."
+        notes_field = ""
 
-    system_prompt = f"""
+    return f"""
     You are an expert presentation designer and content strategist.
     
-    **Goal:** Convert the input text into a structured PowerPoint presentation.
+    **Goal:** {scope}
     **User Guidance:** "{guidance}"
     **Target Length:** Approximately {num_slides_est} slides (adapt if necessary for flow).
     
@@ -107,7 +586,7 @@ def analyze_and_structure_text(provider, api_key, text, guidance, num_slides_est
     1. **Structure:** Create a logical flow (e.g., Intro -> Problem -> Solution -> Conclusion).
     2. **Content:** Summarize long text into concise, punchy bullet points. Do NOT paste long paragraphs.
     3. **Tone:** Adapt the language to match the requested "{guidance}" tone.
-    4. **Speaker Notes:** Write detailed script-like notes for the speaker to explain the slide.
+    {notes_rule}
     
     Output strictly VALID JSON. Structure:
     **JSON Output Format (Strict):**
@@ -119,46 +598,739 @@ def analyze_and_structure_text(provider, api_key, text, guidance, num_slides_est
             "Short bullet point 1",
             "Short bullet point 2",
             "Key statistic or insight"
-          ],
-          "notes": "Detailed speaker notes explaining the context of these bullets."
+          ]{notes_field}
         }}
       ]
     }}
-    Ensure the first slide is an Intro/Title slide.
+    {opening}
+    """
+
+def validate_slides(items):
     """
+    Normalizes raw slide objects into Slide records (utils.schema): coerced
+    shapes, bullet limits, oversized slides split. Records the fixes applied.
+    """
+    with span("validate_slides") as attrs:
+        fixes = set()
+        slides = normalize_slides(items, fixes)
+        attrs["fixes"] = sorted(fixes)
+    return slides
+
+def parse_slides(raw_content, validate=True):
+    """
+    Cleans a raw provider response and returns the list of slides, as Slide
+    records (or, without `validate`, the raw slide objects).
+    Raises json.JSONDecodeError / ValueError on unusable output.
+    """
+    # Fallback if no provider selected (sanity check, though UI prevents this)
+    if not raw_content:
+        return []
+
+    cleaned_json = extract_json_from_text(raw_content)
+    data = json.loads(cleaned_json)
+
+    if isinstance(data, dict) and "slides" in data:
+        data = data["slides"]
+    if isinstance(data, list):
+        return validate_slides(data) if validate else data
+    raise ValueError("AI returned valid JSON but incorrect structure (missing 'slides' key).")
 
+async def request_slides_async(provider, api_key, system_prompt, text, validate=True):
+    """
+    Calls the provider through the scheduler (with retry logic) and returns the parsed slides.
+    Identical requests are answered from the persistent response cache. Without
+    `validate`, the raw slide objects are returned (and not cached).
+    """
+    cache_key = None
+    if CACHE_ENABLED and validate:
+        cache_key = ResponseCache.make_key(provider, PROVIDER_MODELS.get(provider), system_prompt, text)
+        cached = await asyncio.to_thread(response_cache.get, cache_key)
+        if cached is not None:
+            return cached
+
+    func = ASYNC_PROVIDERS.get(provider)
+    if func is None:
+        return []
+
+    started = time.perf_counter()
+    raw_content = await api_retry_async(provider, scheduler.submit, provider, func, api_key, system_prompt, text)
+    slides = parse_slides(raw_content, validate)
+    latency_tracker.record(provider, time.perf_counter() - started)
+    if cache_key and slides:
+        await asyncio.to_thread(response_cache.put, cache_key, slides, time.perf_counter() - started)
+    return slides
+
+def request_slides(provider, api_key, system_prompt, text):
+    """
+    Blocking wrapper around request_slides_async.
+    """
+    return run_async(request_slides_async(provider, api_key, system_prompt, text))
+
+# --- HEDGING & FAILOVER ---
+def _hedge_delay(provider, hedge_after):
+    if hedge_after is not None:
+        return hedge_after
+    observed = latency_tracker.percentile(provider, HEDGE_PERCENTILE)
+    return observed if observed is not None else HEDGE_AFTER_SECONDS
+
+def _rank_backups(routes):
+    """
+    Orders backup (provider, key) routes by their recent median latency; unknown providers last.
+    """
+    def median(route):
+        p50 = latency_tracker.percentile(route[0], 50)
+        return p50 if p50 is not None else float("inf")
+    return sorted(routes, key=median)
+
+async def request_with_failover_async(routes, system_prompt, text, hedge=False, hedge_after=None, validate=True):
+    """
+    Requests slides from the first (provider, key) route, failing over to the others on errors.
+    With `hedge`, a duplicate request goes to the fastest backup once the primary has
+    been running longer than the hedge delay; the first valid answer wins and the rest
+    are cancelled.
+    """
+    primary, backups = routes[0], _rank_backups(routes[1:])
+    if not backups:
+        return await request_slides_async(primary[0], primary[1], system_prompt, text, validate)
+
+    def launch(route):
+        task = asyncio.ensure_future(request_slides_async(route[0], route[1], system_prompt, text, validate))
+        running[task] = route
+        return task
+
+    running = {}
+    launch(primary)
+    last_error = None
     try:
-        content = ""
-        raw_content = ""
-        
-        # 2. Call Provider with Retry Logic
-        if provider == "OpenAI":
-            raw_content = api_retry_wrapper(get_openai_json, api_key, system_prompt, text)
-        elif provider == "Anthropic":
-            raw_content = api_retry_wrapper(get_anthropic_json, api_key, system_prompt, text)
-        elif provider == "Google Gemini":
-            raw_content = api_retry_wrapper(get_google_json, api_key, system_prompt, text)
-        
-        # Fallback if no provider selected (sanity check, though UI prevents this)
-        if not raw_content:
-             return []
-
-        # 3. Clean and Parse JSON
-        cleaned_json = extract_json_from_text(raw_content)
-        data = json.loads(cleaned_json)
-
-        # 4. Standardize Return
-        if "slides" in data:
-            return data["slides"]
-        elif isinstance(data, list):
-            return data
+        while running:
+            timeout = _hedge_delay(primary[0], hedge_after) if hedge and backups and len(running) == 1 else None
+            done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                # Primary is slow: hedge to the next backup
+                launch(backups.pop(0))
+                continue
+            for task in done:
+                running.pop(task)
+                try:
+                    slides = task.result()
+                except Exception as e:
+                    last_error = e
+                    continue
+                if slides:
+                    return slides
+            # Everything that finished failed or came back empty: fail over
+            if not running and backups:
+                launch(backups.pop(0))
+    finally:
+        for task in running:
+            task.cancel()
+
+    if last_error:
+        raise last_error
+    return []
+
+def _routes(provider, api_key, backups):
+    routes = [(provider, api_key)]
+    for name, key in (backups or {}).items():
+        if key and name != provider:
+            routes.append((name, key))
+    return routes
+
+# --- OUTLINE REUSE ---
+# Iterative editing: a near-duplicate of a document outlined before reuses that
+# outline, and only the changed paragraphs go to the provider (utils.similarity).
+REUSE_OUTLINES = os.environ.get("SMART_PPT_REUSE_OUTLINES", "1") != "0"
+MAX_CHANGED_FRACTION = 0.5  # Past this share of edited text, outline from scratch
+MAX_CONTEXT_CHARS = 160     # Of the paragraph an insertion follows, quoted to place it
+
+_outline_index = None
+_outline_index_lock = threading.Lock()
+
+def get_outline_index():
+    global _outline_index
+    with _outline_index_lock:
+        if _outline_index is None:
+            from utils.similarity import OutlineIndex  # NumPy stays off the startup path
+            _outline_index = OutlineIndex(os.path.join(CACHE_DIR, "outlines.sqlite3"))
+    return _outline_index
+
+def _reuse_enabled(api_key):
+    return CACHE_ENABLED and REUSE_OUTLINES and api_key != "TEST_KEY"
+
+def _owner(api_key):
+    # One-way, so the index never holds anything that could be used as a key
+    return hashlib.sha256(f"smart-ppt-outline\x1f{api_key}".encode("utf-8")).hexdigest()[:16]
+
+def build_update_prompt(guidance):
+    return f"""
+    You are an expert presentation designer and content strategist.
+
+    **Goal:** A document was converted into the slide deck below. The document has since been edited;
+    only the edits are shown. Update the deck so it matches the edited document.
+    **User Guidance:** "{guidance}"
+
+    **Instructions:**
+    1. Change only what the edits affect: add, rewrite or remove slides and bullet points as needed, keeping a logical flow.
+    2. For each slide that stays exactly as it is, output {{"keep": <its index in the current deck>}} instead of repeating it.
+    3. Write new or rewritten slides like the others: concise bullet points and detailed speaker notes.
+
+    Output strictly VALID JSON. Structure:
+    {{
+      "slides": [
+        {{"keep": 0}},
+        {{"title": "Compelling Headline", "content": ["Short bullet point"], "notes": "Detailed speaker notes."}}
+      ]
+    }}
+    """
+
+def _update_request_text(slides, changes):
+    # Titles and bullets are enough to place the edits; notes stay local
+    deck = [{"index": i, "title": s.title, "content": s.content} for i, s in enumerate(slides)]
+    lines = ["CURRENT DECK:", json.dumps(deck, ensure_ascii=False, separators=(",", ":")), "", "EDITS:"]
+    for n, change in enumerate(changes, start=1):
+        where = f' after the paragraph starting "{change.after[:MAX_CONTEXT_CHARS]}"' if change.after else " at the start"
+        if change.removed and change.added:
+            lines.append(f"{n}. REPLACED:\n" + "\n\n".join(change.removed) + "\nWITH:\n" + "\n\n".join(change.added))
+        elif change.added:
+            lines.append(f"{n}. INSERTED{where}:\n" + "\n\n".join(change.added))
         else:
-            st.error("AI returned valid JSON but incorrect structure (missing 'slides' key).")
-            return []
+            lines.append(f"{n}. REMOVED:\n" + "\n\n".join(change.removed))
+    return "\n".join(lines)
+
+def _apply_keeps(updated, prior):
+    """
+    Expands {"keep": i} placeholders into the prior slides (invalid ones are
+    dropped) and validates the rest.
+    """
+    slides = []
+    for slide in updated:
+        if isinstance(slide, dict) and "keep" in slide and "title" not in slide:
+            i = slide["keep"]
+            if isinstance(i, int) and 0 <= i < len(prior):
+                slides.append(prior[i])
+        else:
+            slides.append(slide)
+    return validate_slides(slides)
+
+async def reuse_outline_async(provider, api_key, text, guidance, backups=None, hedge=False, hedge_after=None):
+    """
+    Outline for `text` built from a near-duplicate processed before: returned as is
+    if only whitespace changed, otherwise updated by one provider call that sees
+    the prior titles/bullets and the changed paragraphs instead of the whole text.
+    Returns None when there is no close enough match, or when the update call
+    fails or is unusable: the caller then outlines from scratch.
+    """
+    paragraphs = list(_iter_paragraphs(text))
+    index = get_outline_index()
+    with span("outline_lookup") as attrs:
+        match = await asyncio.to_thread(index.find, _owner(api_key), _normalize(guidance), paragraphs)
+        attrs["similarity"] = match.similarity if match else None
+    if match is None:
+        return None
 
-    except json.JSONDecodeError:
-        st.error("Error: AI response was not valid JSON. Please try again or reduce text size.")
+    from utils.similarity import changed_chars, diff_paragraphs
+    changes = diff_paragraphs(match.paragraphs, paragraphs)
+    if not changes:
+        return list(match.slides)
+    if changed_chars(changes) > MAX_CHANGED_FRACTION * len(text):
         return None
-    except Exception as e:
-        st.error(f"AI Provider Error: {str(e)}")
+    routes = _routes(provider, api_key, backups)
+    try:
+        updated = await request_with_failover_async(routes, build_update_prompt(guidance),
+                                                    _update_request_text(match.slides, changes), hedge, hedge_after,
+                                                    validate=False)
+    except Exception:
+        # Provider error or unusable update (bad JSON or shape): a fresh outline
+        # may still succeed, so the optimisation must not fail the request
         return None
+    slides = _apply_keeps(updated, match.slides)
+    if not slides:
+        return None
+    await _remember_outline(api_key, text, guidance, slides, paragraphs)
+    return slides
+
+async def _remember_outline(api_key, text, guidance, slides, paragraphs=None):
+    if not slides or not _reuse_enabled(api_key):
+        return
+    paragraphs = paragraphs if paragraphs is not None else list(_iter_paragraphs(text))
+    await asyncio.to_thread(get_outline_index().add, _owner(api_key), _normalize(guidance), paragraphs, slides)
+
+# --- STREAMING ---
+async def _stream_attempt(provider, stream_func, api_key, system_prompt, text):
+    """
+    One streaming attempt: yields slides as the parser completes them, and falls
+    back to a full parse if nothing could be parsed incrementally.
+    """
+    parser = IncrementalSlideParser()
+    raw = []
+    async with scheduler.slot(provider):
+        async for delta in stream_func(api_key, system_prompt, text):
+            raw.append(delta)
+            for slide in parser.feed(delta):
+                yield slide
+
+    if not parser.count:
+        # Nothing parsed incrementally (e.g. unexpected shape)
+        for slide in parse_slides("".join(raw)):
+            yield slide
+
+async def stream_request_slides_async(provider, api_key, system_prompt, text):
+    """
+    Streams the provider response through IncrementalSlideParser and yields each
+    slide as soon as it is complete. Failures before the first slide are retried
+    by the provider guard; the finished list is cached like a regular request.
+    """
+    cache_key = None
+    if CACHE_ENABLED:
+        cache_key = ResponseCache.make_key(provider, PROVIDER_MODELS.get(provider), system_prompt, text)
+        cached = await asyncio.to_thread(response_cache.get, cache_key)
+        if cached is not None:
+            for slide in cached:
+                yield slide
+            return
+
+    stream_func = STREAMING_PROVIDERS.get(provider)
+    if stream_func is None:
+        return
+
+    slides = []
+    started = time.perf_counter()
+    async for slide in get_guard(provider).stream(_stream_attempt, provider, stream_func, api_key, system_prompt, text):
+        slides.append(slide)
+        yield slide
+
+    latency_tracker.record(provider, time.perf_counter() - started)
+    if cache_key and slides:
+        await asyncio.to_thread(response_cache.put, cache_key, slides, time.perf_counter() - started)
+
+async def stream_slides_async(provider, api_key, text, guidance, num_slides_est, backups=None, hedge=False, hedge_after=None,
+                              notes=True):
+    """
+    Async generator version of analyze_and_structure_text yielding slides progressively.
+    Long documents go through the chunked pipeline and are yielded once merged.
+    If the stream fails before its first slide, backup providers are tried in turn;
+    hedged requests are not streamed (the winner is yielded once it is known).
+    Near-duplicates of earlier documents are answered by updating their outline.
+    Without `notes`, new outlines come without speaker notes (see stream_two_stage_async).
+    """
+    if api_key == "TEST_KEY":
+        for slide in validate_slides(MOCK_SLIDES):
+            yield slide
+        return
+    if provider == OFFLINE_PROVIDER:
+        for slide in await asyncio.to_thread(draft_slides, text, num_slides_est):
+            yield slide
+        return
+
+    if _reuse_enabled(api_key):
+        reused = await reuse_outline_async(provider, api_key, text, guidance, backups, hedge, hedge_after)
+        if reused is not None:
+            for slide in reused:
+                yield slide
+            return
+
+    slides = []
+    async for slide in _stream_new_outline(provider, api_key, text, guidance, num_slides_est, backups, hedge, hedge_after,
+                                           notes):
+        slides.append(slide)
+        yield slide
+    if notes:
+        await _remember_outline(api_key, text, guidance, slides)  # Outlines without notes are remembered once finished
+
+async def _stream_new_outline(provider, api_key, text, guidance, num_slides_est, backups, hedge, hedge_after, notes=True):
+    num_slides_est = min(num_slides_est, MAX_SLIDES)
+    routes = _routes(provider, api_key, backups)
+    if len(text) > CHUNK_CHARS:
+        for slide in await analyze_in_chunks_async(provider, api_key, text, guidance, num_slides_est,
+                                                   backups=backups, hedge=hedge, hedge_after=hedge_after, notes=notes):
+            yield slide
+        return
+
+    system_prompt = build_system_prompt(guidance, num_slides_est, notes=notes)
+    if hedge and len(routes) > 1:
+        for slide in await request_with_failover_async(routes, system_prompt, text, hedge, hedge_after):
+            yield slide
+        return
+
+    yielded = False
+    try:
+        async for slide in stream_request_slides_async(provider, api_key, system_prompt, text):
+            yielded = True
+            yield slide
+    except Exception:
+        if yielded or len(routes) == 1:
+            raise
+        for slide in await request_with_failover_async(routes[1:], system_prompt, text):
+            yield slide
+
+_STREAM_DONE = object()
+CANCEL_POLL_SECONDS = 0.1
+
+def stream_slides(provider, api_key, text, guidance, num_slides_est, backups=None, hedge=False, hedge_after=None,
+                  cancel=None):
+    """
+    Blocking generator bridging stream_slides_async from the engine loop, so
+    Streamlit can render each slide as soon as it arrives. Provider errors are raised.
+    Setting the optional `cancel` threading.Event ends the stream (and the
+    provider request behind it) even while waiting for the next slide.
+    """
+    return _iter_blocking(stream_slides_async(provider, api_key, text, guidance, num_slides_est,
+                                              backups=backups, hedge=hedge, hedge_after=hedge_after), cancel)
+
+def _iter_blocking(agen, cancel=None):
+    """
+    Runs the async generator `agen` on the engine loop and yields its items here.
+    """
+    items = queue.Queue()
+
+    async def pump():
+        try:
+            async for item in agen:
+                items.put(item)
+        except Exception as e:
+            items.put(e)
+        finally:
+            items.put(_STREAM_DONE)
+
+    future = asyncio.run_coroutine_threadsafe(bind(pump()), _get_loop())
+    try:
+        while True:
+            try:
+                item = items.get(timeout=CANCEL_POLL_SECONDS if cancel else None)
+            except queue.Empty:
+                if cancel.is_set():
+                    break
+                continue
+            if item is _STREAM_DONE:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        future.cancel()
+
+# --- TWO-STAGE PIPELINE ---
+# Stage one streams a compact outline (titles and bullets); stage two writes
+# each slide's notes and polishes its bullets in a call of its own, fanned out as
+# the outline arrives. The deck is done about one slide call after the outline,
+# instead of after one long, truncation-prone generation. It costs one paid
+# call per slide on top of the outline, so it is opt-in.
+TWO_STAGE = os.environ.get("SMART_PPT_TWO_STAGE", "0") == "1"
+REFINE_WORKERS = 6              # Concurrent per-slide refinement calls
+REFINE_CONTEXT_CHARS = 2500     # Source excerpt sent along with each slide
+_WORD_RE = re.compile(r"[a-z0-9]{3,}")
+
+def build_refine_prompt(guidance):
+    return f"""
+    You are an expert presentation designer and content strategist.
+
+    **Goal:** Finish one slide of a deck whose outline is already written.
+    **User Guidance:** "{guidance}"
+
+    **Instructions:**
+    1. **Content:** Polish the slide's bullet points: concise, punchy and faithful to the source excerpt. Keep roughly the same number of bullets.
+    2. **Speaker Notes:** Write detailed script-like notes for the speaker to explain the slide, using the source excerpt.
+    3. **Tone:** Adapt the language to match the requested "{guidance}" tone.
+    4. Keep the title exactly as given.
+
+    Output strictly VALID JSON. Structure:
+    {{
+      "slides": [
+        {{"title": "The given title", "content": ["Polished bullet point"], "notes": "Detailed speaker notes."}}
+      ]
+    }}
+    """
+
+def _source_excerpt(paragraphs, slide, max_chars=REFINE_CONTEXT_CHARS):
+    """
+    The source paragraphs sharing the most words with the slide, in document
+    order, up to `max_chars`. `paragraphs` holds (paragraph, word set) pairs.
+    """
+    if sum(len(p) for p, _ in paragraphs) <= max_chars:
+        return "\n\n".join(p for p, _ in paragraphs)
+    wanted = set(_WORD_RE.findall(" ".join((slide.title,) + slide.content).lower()))
+    ranked = sorted(range(len(paragraphs)), key=lambda i: (-len(paragraphs[i][1] & wanted), i))
+    chosen, size = [], 0
+    for i in ranked:
+        if size + len(paragraphs[i][0]) > max_chars:
+            if chosen:
+                break
+            chosen.append(i)  # One oversized paragraph beats no context
+            break
+        chosen.append(i)
+        size += len(paragraphs[i][0]) + 2
+    return "\n\n".join(paragraphs[i][0][:max_chars] for i in sorted(chosen))
+
+def _refine_request_text(index, slide, titles, excerpt):
+    lines = [
+        f"SLIDE {index + 1} (deck so far: {' | '.join(titles)})",
+        json.dumps({"title": slide.title, "content": slide.content}, ensure_ascii=False),
+        "",
+        "SOURCE EXCERPT:",
+        excerpt,
+    ]
+    return "\n".join(lines)
+
+async def _refine_slide_async(routes, guidance, index, slide, request_text, hedge, hedge_after):
+    try:
+        with span("slide_refine", index=index):
+            refined = await request_with_failover_async(routes, build_refine_prompt(guidance), request_text,
+                                                        hedge, hedge_after)
+    except Exception:
+        return slide  # The outline slide stands; one failed polish shouldn't fail the deck
+    return _apply_refinement(slide, refined)
+
+def _apply_refinement(slide, refined):
+    """
+    The outline slide updated from a refinement answer. Only a slide with the
+    outline's title counts; anything else leaves the outline slide as it was.
+    When validation split the answer into "(cont.)" parts, the outline bullets
+    stay (a deck position holds one slide) and only the notes are taken.
+    """
+    wanted = _title_key(slide)
+    matches = [s for s in refined if _title_key(s) == wanted]
+    if not matches:
+        return slide
+    match = matches[0]
+    parts = sum(1 for s in refined if _title_key(s) == f"{wanted} cont")
+    content = slide.content if parts else match.content or slide.content
+    return slide.replace(content=content, notes=match.notes)
+
+async def stream_two_stage_async(provider, api_key, text, guidance, num_slides_est, backups=None, hedge=False,
+                                 hedge_after=None, workers=REFINE_WORKERS):
+    """
+    Two-stage generation, yielding (index, slide) updates: every outline slide
+    as soon as it streams in, then the same index again once its notes and
+    polished bullets are back. A slide's refinement starts the moment it
+    arrives, at most `workers` at a time. Slides that already have notes (mock,
+    offline or reused ones) are final as they come.
+    """
+    routes = _routes(provider, api_key, backups)
+    limit = asyncio.Semaphore(workers)
+    updates = asyncio.Queue()
+    done = object()
+    paragraphs = [(p, set(_WORD_RE.findall(p.lower()))) for p in _iter_paragraphs(text)]
+
+    deck = []
+
+    async def refine(index, slide, request_text):
+        async with limit:
+            deck[index] = await _refine_slide_async(routes, guidance, index, slide, request_text, hedge, hedge_after)
+        await updates.put((index, deck[index]))
+
+    async def outline():
+        tasks = []
+        try:
+            async for slide in stream_slides_async(provider, api_key, text, guidance, num_slides_est,
+                                                   backups=backups, hedge=hedge, hedge_after=hedge_after, notes=False):
+                index = len(deck)
+                deck.append(slide)
+                await updates.put((index, slide))
+                if slide.notes is None:
+                    request_text = _refine_request_text(index, slide, [s.title for s in deck],
+                                                        _source_excerpt(paragraphs, slide))
+                    tasks.append(asyncio.ensure_future(refine(index, slide, request_text)))
+            await asyncio.gather(*tasks)
+            await _remember_outline(api_key, text, guidance, deck)
+        except BaseException as e:
+            for task in tasks:
+                task.cancel()
+            if not isinstance(e, asyncio.CancelledError):
+                await updates.put(e)
+            raise
+        finally:
+            await updates.put(done)
+
+    producer = asyncio.ensure_future(outline())
+    try:
+        while True:
+            item = await updates.get()
+            if item is done:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        producer.cancel()
+        with contextlib.suppress(BaseException):
+            await producer
+
+def stream_slide_updates(provider, api_key, text, guidance, num_slides_est, backups=None, hedge=False,
+                         hedge_after=None, cancel=None):
+    """
+    Blocking generator over stream_two_stage_async's (index, slide) updates,
+    with the same `cancel` handling as stream_slides.
+    """
+    return _iter_blocking(stream_two_stage_async(provider, api_key, text, guidance, num_slides_est,
+                                                 backups=backups, hedge=hedge, hedge_after=hedge_after), cancel)
+
+# --- MAP-REDUCE FOR LONG DOCUMENTS ---
+def _title_key(slide):
+    return re.sub(r"[^a-z0-9]+", " ", slide.title.lower()).strip()
+
+def merge_chunk_slides(chunk_results, budget):
+    """
+    Merges per-chunk slide lists (in document order) into one deck.
+    Slides repeating an earlier title are folded into it (new bullets only),
+    and each chunk is held to its share of the global slide budget.
+    """
+    merged = []
+    by_title = {}  # Title key -> position in merged
+    for slides, allowance in chunk_results:
+        taken = 0
+        for slide in slides:
+            key = _title_key(slide)
+            if key and key in by_title:
+                existing = merged[by_title[key]]
+                content = list(existing.content)
+                for point in slide.content:
+                    if len(content) >= MAX_MERGED_BULLETS:
+                        break
+                    if point not in content:
+                        content.append(point)
+                merged[by_title[key]] = existing.replace(content=content)
+                continue
+            if taken >= allowance or len(merged) >= budget:
+                break
+            merged.append(slide)
+            if key:
+                by_title[key] = len(merged) - 1
+            taken += 1
+    return merged
+
+async def analyze_in_chunks_async(provider, api_key, text, guidance, budget, max_chars=CHUNK_CHARS, workers=MAX_PARALLEL_CHUNKS,
+                                  backups=None, hedge=False, hedge_after=None, notes=True):
+    """
+    Map-reduce pipeline for long documents: outlines each chunk concurrently and merges
+    the results in order. At most `workers` chunks are held/in flight at a time.
+    """
+    routes = _routes(provider, api_key, backups)
+    total_chars = max(1, len(text))
+    results = []  # (slides, allowance) in document order
+    pending = []
+    try:
+        for part, chunk in enumerate(iter_text_chunks(text, max_chars), start=1):
+            allowance = max(1, round(budget * len(chunk) / total_chars))
+            prompt = build_system_prompt(guidance, allowance, part=part, notes=notes)
+            task = asyncio.ensure_future(request_with_failover_async(routes, prompt, chunk, hedge, hedge_after))
+            pending.append((task, allowance))
+            # Keep only a bounded window of chunks alive
+            while len(pending) >= workers:
+                task, allowance = pending.pop(0)
+                results.append((await task, allowance))
+        for task, allowance in pending:
+            results.append((await task, allowance))
+    finally:
+        for task, _ in pending:
+            task.cancel()
+
+    return merge_chunk_slides(results, budget)
+
+def analyze_in_chunks(provider, api_key, text, guidance, budget, max_chars=CHUNK_CHARS, workers=MAX_PARALLEL_CHUNKS, **routing):
+    return run_async(analyze_in_chunks_async(provider, api_key, text, guidance, budget, max_chars, workers, **routing))
+
+# --- OFFLINE DRAFTS ---
+def draft_slides(text, num_slides_est):
+    """
+    Slides drafted from the text itself, without any provider call: markdown
+    structure plus TextRank-ranked sentences. Deterministic, and fast enough to
+    show while an LLM is still working.
+    """
+    from utils.extractive import draft_slides as extract  # NumPy stays off the startup path
+    with span("extractive_draft") as attrs:
+        slides = extract(text, min(num_slides_est, MAX_SLIDES), MAX_SLIDES)
+        attrs["slides"] = len(slides)
+    return validate_slides(slides)
+
+# --- ERRORS ---
+class GenerationError(Exception):
+    """
+    A failed generation, classified for UI layers: `kind` is "invalid_json"
+    (unparseable response), "invalid_structure" (JSON without usable slides)
+    or "provider" (API, network or key problems); `message` is user-facing.
+    """
+    def __init__(self, kind, message):
+        super().__init__(message)
+        self.kind = kind
+        self.message = message
+
+def as_generation_error(exc):
+    if isinstance(exc, GenerationError):
+        return exc
+    if isinstance(exc, json.JSONDecodeError):
+        return GenerationError("invalid_json", "Error: AI response was not valid JSON. Please try again or reduce text size.")
+    if isinstance(exc, ValueError):
+        return GenerationError("invalid_structure", str(exc))
+    return GenerationError("provider", f"AI Provider Error: {str(exc)}")
+
+# --- WARMUP ---
+# SDK modules each provider needs; imported lazily so only the ones in use cost anything
+PROVIDER_SDKS = {
+    "OpenAI": ("openai",),
+    "Anthropic": ("anthropic",),
+    "Google Gemini": ("google.ai.generativelanguage",),
+    OFFLINE_PROVIDER: ("utils.extractive",),
+}
+
+def warmup_provider(provider):
+    """
+    Imports the provider's SDK and starts the engine loop ahead of the first
+    request. Safe to call repeatedly; returns the seconds it took.
+    """
+    started = time.perf_counter()
+    _get_loop()
+    for module in PROVIDER_SDKS.get(provider, ()):
+        importlib.import_module(module)
+    return time.perf_counter() - started
+
+# --- MAIN ANALYSIS FUNCTION ---
+MOCK_SLIDES = [
+    {"title": "Intro to AI", "content": ["AI is changing the world", "It helps coders"], "notes": "Start with a strong hook."},
+    {"title": "The Solution", "content": ["Automated coding", "Smart presentations"], "notes": "Explain the value prop."}
+]
+
+async def generate_slides_async(provider, api_key, text, guidance, num_slides_est, backups=None, hedge=False, hedge_after=None):
+    """
+    Core of analyze_and_structure_text without any UI reporting: returns the slide
+    list and lets provider / JSON errors propagate. Used by headless callers.
+    """
+    if api_key == "TEST_KEY":
+        return validate_slides(MOCK_SLIDES)
+    if provider == OFFLINE_PROVIDER:
+        return await asyncio.to_thread(draft_slides, text, num_slides_est)
+
+    if _reuse_enabled(api_key):
+        reused = await reuse_outline_async(provider, api_key, text, guidance, backups, hedge, hedge_after)
+        if reused is not None:
+            return reused
+
+    num_slides_est = min(num_slides_est, MAX_SLIDES)
+
+    # Call Provider with Retry Logic (chunked for long documents)
+    if len(text) > CHUNK_CHARS:
+        slides = await analyze_in_chunks_async(provider, api_key, text, guidance, num_slides_est,
+                                               backups=backups, hedge=hedge, hedge_after=hedge_after)
+    else:
+        system_prompt = build_system_prompt(guidance, num_slides_est)
+        routes = _routes(provider, api_key, backups)
+        slides = await request_with_failover_async(routes, system_prompt, text, hedge, hedge_after)
+    await _remember_outline(api_key, text, guidance, slides)
+    return slides
+
+def generate_slides(provider, api_key, text, guidance, num_slides_est, **routing):
+    return run_async(generate_slides_async(provider, api_key, text, guidance, num_slides_est, **routing))
+
+def analyze_and_structure_text(provider, api_key, text, guidance, num_slides_est, backups=None, hedge=False, hedge_after=None):
+    """
+    Routes the request to the correct LLM provider.
+    Analyzes text and returns structured JSON for slides.
+    Includes Prompt Engineering for better quality.
+    Long documents are split into chunks and outlined concurrently (map-reduce).
+    `backups` ({provider: api_key}) enables failover, and with `hedge` also hedged requests.
+    Failures are raised as GenerationError; how to show them is up to the caller.
+    """
+    try:
+        return generate_slides(provider, api_key, text, guidance, num_slides_est,
+                               backups=backups, hedge=hedge, hedge_after=hedge_after)
+    except Exception as e:
+        raise as_generation_error(e) from e
@@ -1,153 +1,681 @@
 import io
 import os
+import copy
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict, namedtuple
+from lxml import etree
 from pptx import Presentation
-from pptx.util import Inches, Pt
+from pptx.enum.shapes import PP_PLACEHOLDER
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+from pptx.opc.package import XmlPart
+from pptx.opc.packuri import PackURI
+from pptx.util import Inches, Pt, lazyproperty
+from utils.images import add_image
+from utils.pptx_package import DeckSkeleton, DeckWriter, Rel, SlideFragment, read_fragments
+from utils.schema import Slide, iter_slides, normalize_slides
+from utils.telemetry import span
+from utils.text_fit import fit_font_size, get_metrics, text_height
 
-def fit_image_in_box(slide, img_blob, left, top, max_width, max_height):
+# --- TEMPLATE INDEX ---
+# One pass over the layouts when a template is first loaded; rendering then works
+# from these records instead of walking placeholder XML (and the layout/master
+# inheritance chain) for every slide.
+PlaceholderInfo = namedtuple("PlaceholderInfo", "idx type left top width height font_size font indent")
+BodyCapacity = namedtuple("BodyCapacity", "lines chars_per_line")
+LayoutInfo = namedtuple("LayoutInfo", "index name placeholders title body body_capacity")
+TemplateIndex = namedtuple("TemplateIndex", "slide_width slide_height layouts content_layout")
+
+TITLE_TYPES = (PP_PLACEHOLDER.TITLE, PP_PLACEHOLDER.CENTER_TITLE, PP_PLACEHOLDER.VERTICAL_TITLE)
+BODY_TYPES = (PP_PLACEHOLDER.BODY, PP_PLACEHOLDER.OBJECT)
+
+# Layout placeholder type -> the master placeholder it inherits text styles from
+_MASTER_TYPE = {
+    PP_PLACEHOLDER.CENTER_TITLE: PP_PLACEHOLDER.TITLE,
+    PP_PLACEHOLDER.VERTICAL_TITLE: PP_PLACEHOLDER.TITLE,
+    PP_PLACEHOLDER.SUBTITLE: PP_PLACEHOLDER.BODY,
+    PP_PLACEHOLDER.OBJECT: PP_PLACEHOLDER.BODY,
+    PP_PLACEHOLDER.VERTICAL_BODY: PP_PLACEHOLDER.BODY,
+    PP_PLACEHOLDER.VERTICAL_OBJECT: PP_PLACEHOLDER.BODY,
+}
+_A = "http://schemas.openxmlformats.org/drawingml/2006/main"
+
+def level1_style(placeholder, master, attr):
     """
-    Smartly fits an image into a bounding box while maintaining aspect ratio.
-    It prevents distortion and centers the image within the available space.
+    Resolves a level-1 paragraph style value (e.g. "a:defRPr/@sz") the way
+    PowerPoint inherits it: layout placeholder, then master placeholder, then
+    the master's title/body text style. Returns the raw string, or None.
     """
-    if not img_blob: return
-    
-    stream = io.BytesIO(img_blob)
-    
-    # 1. Add Picture (constrain by Width first)
-    pic = slide.shapes.add_picture(stream, left, top, width=max_width)
-
-    # 2. Check if it's too tall
-    if pic.height > max_height:
-        # It's too tall! Remove and add by Height instead.
-        # We need to access the element to delete it properly
-        sp = pic.element
-        sp.getparent().remove(sp)
-
-        # Re-add using Height constraint
-        stream.seek(0) 
-        pic = slide.shapes.add_picture(stream, left, top, height=max_height)
-
-        # Center Horizontally in the box
-        if pic.width < max_width:
-            center_offset = (max_width - pic.width) / 2
-            pic.left = int(left + center_offset)
+    ph_type = placeholder.placeholder_format.type
+    master_ph = master.placeholders.get(_MASTER_TYPE.get(ph_type, ph_type))
+    style = "titleStyle" if ph_type in TITLE_TYPES else "bodyStyle"
+    lst_style = f"./p:txBody/a:lstStyle/a:lvl1pPr/{attr}"
+    candidates = (
+        placeholder.element.xpath(lst_style)
+        + (master_ph.element.xpath(lst_style) if master_ph is not None else [])
+        + master.element.xpath(f"./p:txStyles/p:{style}/a:lvl1pPr/{attr}")
+    )
+    return candidates[0] if candidates else None
+
+def _theme_fonts(master):
+    """
+    The master theme's (major, minor) latin typefaces, e.g. ("Calibri", "Calibri").
+    """
+    try:
+        theme = etree.fromstring(master.part.part_related_by(RT.THEME).blob)
+    except (KeyError, etree.XMLSyntaxError):
+        return None, None
+    fonts = [theme.xpath(f"//a:fontScheme/a:{kind}/a:latin/@typeface", namespaces={"a": _A})
+             for kind in ("majorFont", "minorFont")]
+    return tuple(f[0] if f else None for f in fonts)
+
+def _placeholder_info(ph, master, theme_fonts):
+    fmt = ph.placeholder_format
+    size = level1_style(ph, master, "a:defRPr/@sz")
+    font = level1_style(ph, master, "a:defRPr/a:latin/@typeface")
+    if not font or font.startswith("+"):
+        # "+mj-lt"/"+mn-lt" (or nothing): the theme's heading/body font
+        major, minor = theme_fonts
+        font = (major if (font or "").startswith("+mj") or (not font and fmt.type in TITLE_TYPES) else minor)
+    indent = level1_style(ph, master, "@marL")
+    return PlaceholderInfo(fmt.idx, fmt.type, ph.left, ph.top, ph.width, ph.height,
+                           Pt(int(size) / 100) if size else None, font or "Calibri",
+                           int(indent) if indent else 0)
+
+def _is_vertical(placeholder):
+    return placeholder.element.xpath("./p:txBody/a:bodyPr/@vert") not in ([], ["horz"])
+
+def _body_capacity(body):
+    """
+    Rough lines x characters the body box holds at its default size
+    (1.2 line spacing, average glyph about half an em wide).
+    """
+    if not body or not body.font_size:
+        return None
+    return BodyCapacity(
+        lines=int(body.height // (body.font_size * 1.2)),
+        chars_per_line=int(body.width // (body.font_size * 0.5)),
+    )
 
+def analyze_template(prs):
+    """
+    Builds a TemplateIndex: per layout, every placeholder's idx, type, resolved
+    bounding box, default font size/face and bullet indent, plus the title/body
+    pair and body capacity.
+    `content_layout` is the index of the layout generated slides use.
+    """
+    layouts = []
+    theme_fonts = {}
+    for index, layout in enumerate(prs.slide_layouts):
+        master = layout.slide_master
+        if master.part not in theme_fonts:
+            theme_fonts[master.part] = _theme_fonts(master)
+        placeholders = []
+        title = body = None
+        bodies = 0
+        vertical = False
+        for ph in layout.placeholders:
+            fmt = ph.placeholder_format
+            info = _placeholder_info(ph, master, theme_fonts[master.part])
+            placeholders.append(info)
+            if fmt.type in TITLE_TYPES and title is None:
+                title = info
+            elif fmt.type in BODY_TYPES:
+                bodies += 1
+                body = body or info
+            else:
+                continue
+            vertical = vertical or fmt.type == PP_PLACEHOLDER.VERTICAL_TITLE or _is_vertical(ph)
+
+        # Only a horizontal "title + exactly one text body" layout gets a body slot
+        if bodies != 1 or vertical:
+            body = None
+        layouts.append(LayoutInfo(index, layout.name, tuple(placeholders), title, body,
+                                  _body_capacity(body)))
+
+    content = [l for l in layouts if l.title and l.body]
+    if content:
+        # Biggest text area wins; ties go to the earlier layout ("Title and Content")
+        content_layout = max(content, key=lambda l: (l.body.width * l.body.height, -l.index)).index
     else:
-        # It fits in height, but might be short. Center Vertically.
-        if pic.height < max_height:
-            center_offset = (max_height - pic.height) / 2
-            pic.top = int(top + center_offset)
+        # Usually index 1 is "Title and Content"; fill whatever sits at idx 1.
+        content_layout = 1 if len(layouts) > 1 else 0
+        if layouts:
+            fallback = layouts[content_layout]
+            body = next((p for p in fallback.placeholders if p.idx == 1 and p is not fallback.title), None)
+            layouts[content_layout] = fallback._replace(body=body, body_capacity=_body_capacity(body))
+    return TemplateIndex(prs.slide_width, prs.slide_height, tuple(layouts), content_layout)
 
-def create_presentation(template_path, slides_data):
+# --- TEMPLATE CACHE ---
+def _load_template(template_bytes):
     """
-    Creates a PowerPoint presentation from structured data using a template.
+    Parses a template once and strips its existing slides so only the
+    design (masters, layouts, theme) is left, ready to be cloned.
+    Returns the stripped Presentation and its TemplateIndex.
     """
-    prs = Presentation(template_path)
-    
+    prs = Presentation(io.BytesIO(template_bytes))
+
     # Delete existing slides from the template so we start fresh with the design/master
     # Note: python-pptx doesn't have a simple "delete all slides", we have to remove them via xml
+    # Dropping the relationship as well keeps the old slide parts out of the saved file.
     xml_slides = prs.slides._sldIdLst
-    slides = list(xml_slides)
-    for slide in slides:
-        xml_slides.remove(slide)
-
-    # Use the first reasonable layout. 
-    # Usually index 1 is "Title and Content".
-    if len(prs.slide_layouts) > 1:
-        slide_layout = prs.slide_layouts[1]
-    else:
-        slide_layout = prs.slide_layouts[0]
-
-    for i, slide_data in enumerate(slides_data):
-        slide = prs.slides.add_slide(slide_layout)
-        
-        # Data extraction
-        title_text = slide_data.get("title", "Untitled")
-        content_lines = slide_data.get("content", [])
-        
-        # Since we don't have image generation in this version yet, disable images
-        img_count = 0 
-        img_blob = None # Placeholder for future
-        
-        # 1. Set Title & Calculate Safe Top Margin
-        title_shape = slide.shapes.title
-        
-        # Default safe top (starts at 2.0 inches to be very safe)
-        safe_top = Inches(2.0) 
-
-        if title_shape:
-            title_shape.text = title_text
-            # Calculate where the title visually ends to prevent overlap
-            safe_top = title_shape.top + title_shape.height + Inches(0.2)
-            # If title is long, add extra buffer
-            if len(title_text) > 40: safe_top += Inches(0.4)
-            
-            # CALCULATE OVERLAP BARRIER
-            # We take the title's bottom edge + 0.5 inches buffer
-            title_bottom = title_shape.top + title_shape.height
-            barrier = title_bottom + Inches(0.5)
-            
-            # If the calculated barrier is deeper than the default, use the barrier
-            if barrier > safe_top:
-                safe_top = barrier
-                
-            # Extra check: If title is very long (wrapping), push it down further
-            if len(title_text) > 50:
-                 safe_top += Inches(0.5)
+    for sld_id in list(xml_slides):
+        xml_slides.remove(sld_id)
+        prs.part.drop_rel(sld_id.rId)
+
+    return prs, analyze_template(prs)
+
+def _shallow_clone(obj):
+    """
+    Copies a python-pptx object without the values its @lazyproperty
+    attributes cached, so they are rebuilt against the cloned graph.
+    """
+    clone = copy.copy(obj)
+    cls = type(obj)
+    clone.__dict__ = {
+        k: v for k, v in obj.__dict__.items()
+        if not isinstance(getattr(cls, k, None), lazyproperty)
+    }
+    return clone
+
+def _clone_rels(rels, part_map):
+    new_rels = _shallow_clone(rels)
+    mapping = {}
+    for rId, rel in rels.items():
+        new_rel = _shallow_clone(rel)
+        if not rel.is_external:
+            new_rel._target = part_map[rel._target]
+        mapping[rId] = new_rel
+    new_rels.__dict__["_rels"] = mapping
+    return new_rels
+
+class _PartnameAllocator:
+    """
+    Drop-in for OpcPackage.next_partname on a cloned package. The stock version
+    scans every part on each call, and python-pptx calls it once per notes slide,
+    which made decks quadratic in their slide count. Existing names are collected
+    once per template (e.g. "/ppt/notesSlides/notesSlide%d.xml") and then tracked.
+    Same numbering rule as the stock version: the search runs down from
+    count + 1, so with gaps it takes the highest free number, not the lowest
+    (names {1, 4} give 3).
+    """
+    def __init__(self, package):
+        self._package = package
+        self._used = {}  # prefix -> set of partnames
+
+    def __call__(self, tmpl):
+        prefix = tmpl[: (tmpl % 42).find("42")]
+        used = self._used.get(prefix)
+        if used is None:
+            used = self._used[prefix] = {
+                p.partname for p in self._package.iter_parts() if p.partname.startswith(prefix)
+            }
+        for n in range(len(used) + 1, 0, -1):
+            candidate = tmpl % n
+            if candidate not in used:
+                used.add(candidate)
+                return PackURI(candidate)
+        raise RuntimeError(f"No free partname for {tmpl}")
+
+def _clone_presentation(prs):
+    """
+    Clones a loaded Presentation without going back through the zip/XML parser.
+    XML trees are copied by lxml; binary parts (images, fonts) share their
+    immutable blobs with the original.
+    Note: copy.deepcopy(prs) is not an option, lxml ignores the deepcopy memo so
+    proxies and parts would end up pointing at different copies of the same tree.
+    """
+    package = prs.part.package
+    new_package = _shallow_clone(package)
+    part_map = {}
+    for part in package.iter_parts():
+        new_part = _shallow_clone(part)
+        new_part._package = new_package
+        if isinstance(part, XmlPart):
+            new_part._element = copy.deepcopy(part._element)
+        part_map[part] = new_part
+
+    for part, new_part in part_map.items():
+        new_part.__dict__["_rels"] = _clone_rels(part.rels, part_map)
+    new_package.__dict__["_rels"] = _clone_rels(package._rels, part_map)
+    new_package.next_partname = _PartnameAllocator(new_package)
+    return part_map[prs.part].presentation
+
+class TemplateCache:
+    """
+    In-memory LRU cache of parsed templates, keyed by the SHA-256 of the file bytes.
+    Repeat exports against the same template skip the zip/XML parse and the slide
+    stripping; callers get a clone of the cached, pre-stripped Presentation.
+    Bounded by entry count and by the total size of the source template files.
+    """
+    def __init__(self, max_entries=8, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # digest -> (prs, index, size)
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, template_bytes):
+        """
+        Returns (presentation, TemplateIndex) for the given template bytes.
+        The presentation is a private copy the caller may freely add slides to.
+        """
+        digest = hashlib.sha256(template_bytes).hexdigest()
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry:
+                self._entries.move_to_end(digest)
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        if not entry:
+            prs, index = _load_template(template_bytes)
+            entry = (prs, index, len(template_bytes))
+            self._store(digest, entry)
+
+        prs, index, _ = entry
+        return _clone_presentation(prs), index
+
+    def _store(self, digest, entry):
+        size = entry[2]
+        if size > self.max_bytes:
+            return  # Too big to keep around, serve it uncached
+        with self._lock:
+            if digest in self._entries:
+                return
+            self._entries[digest] = entry
+            self._total_bytes += size
+            while len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes:
+                _, (_, _, old_size) = self._entries.popitem(last=False)
+                self._total_bytes -= old_size
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+            self.hits = 0
+            self.misses = 0
+
+template_cache = TemplateCache()
+
+def fit_image_in_box(slide, img_blob, left, top, max_width, max_height):
+    """
+    Smartly fits an image into a bounding box while maintaining aspect ratio.
+    It prevents distortion and centers the image within the available space.
+    Sizes come from the image header, so the picture is inserted once, already
+    fitted; identical images share one part in the package (see utils.images).
+    """
+    if not img_blob: return
+
+    return add_image(slide, img_blob, left, top, max_width, max_height)
+
+def read_template(template):
+    """
+    Accepts template bytes, a file-like object (e.g. a Streamlit UploadedFile)
+    or a path, and returns the raw .pptx bytes.
+    """
+    if isinstance(template, (bytes, bytearray, memoryview)):
+        return bytes(template)
+    if hasattr(template, "getvalue"):
+        return template.getvalue()
+    if hasattr(template, "read"):
+        template.seek(0)
+        return template.read()
+    with open(template, "rb") as f:
+        return f.read()
+
+# --- TEXT FITTING ---
+TITLE_MIN_PT = 20
+BODY_MAX_PT = 28
+BODY_MIN_PT = 12
+BODY_SPACE_BEFORE_PT = 6
+TITLE_GAP = Inches(0.2)        # Clear space between the title's bottom edge and the body
+BOTTOM_MARGIN = Inches(0.5)
+H_INSET, V_INSET = Inches(0.1), Inches(0.05)  # Default text box insets (a:bodyPr)
+
+def _pt(emu):
+    return emu / 12700
+
+def _fit_title(title, text):
+    """
+    Returns (font size in points, or None when the layout default fits; the
+    EMU offset where the title's text visually ends). Titles shrink down to
+    TITLE_MIN_PT before they are allowed to grow past their box.
+    """
+    width = _pt(title.width - 2 * H_INSET)
+    height = _pt(title.height - 2 * V_INSET)
+    default = round(title.font_size.pt) if title.font_size else 44
+    size = fit_font_size(text, width, height, title.font, max_size=default, min_size=TITLE_MIN_PT)
+    needed = Pt(text_height((text,), title.font, size, width)) + 2 * V_INSET
+    return (None if size == default else size), title.top + max(title.height, needed)
+
+def _fit_body(body, lines, top, height):
+    """
+    Largest point size at which `lines` fit the body box once it is moved to
+    `top` and clipped to `height`.
+    """
+    width = _pt(body.width - 2 * H_INSET - body.indent)
+    default = round(body.font_size.pt) if body.font_size else BODY_MAX_PT
+    return fit_font_size(lines, width, _pt(height - 2 * V_INSET), body.font,
+                         max_size=min(default, BODY_MAX_PT), min_size=BODY_MIN_PT,
+                         space_before=BODY_SPACE_BEFORE_PT)
+
+SlidePlan = namedtuple("SlidePlan", "title_size body_top body_height body_size")
+
+def plan_slide(layout, slide_height, slide_data):
+    """
+    Where a slide's text goes on `layout` (a LayoutInfo): the title size in
+    points (None when the layout default fits) and the body box top and height
+    (EMU) with its fitted size in points. The body is pushed below where the
+    title's text visually ends, and clipped to the slide. Body fields are None
+    for a layout without a body. The exporter and the thumbnails both lay out from this.
+    """
+    title_size = None
+    # Default safe top (starts at 2.0 inches to be very safe)
+    safe_top = Inches(2.0)
+    if layout.title:
+        title_size, title_bottom = _fit_title(layout.title, slide_data.title)
+        safe_top = title_bottom + TITLE_GAP
+    body = layout.body
+    if not body:
+        return SlidePlan(title_size, None, None, None)
+    # CRITICAL OVERLAP FIX
+    top = max(body.top, safe_top)
+    # Ensure height doesn't run off slide
+    height = min(body.height, slide_height - top - BOTTOM_MARGIN)
+    return SlidePlan(title_size, top, height, _fit_body(body, slide_data.content, top, height))
+
+class _SlideBuilder:
+    """
+    Adds filled-in slides to one deck on the template's content layout.
+    The layout placeholders to clone are resolved once per deck, not once per slide.
+    """
+    def __init__(self, prs, index):
+        self.prs = prs
+        self.index = index
+        self.layout = index.layouts[index.content_layout]
+        self.slide_layout = prs.slide_layouts[self.layout.index]
+        by_idx = {ph.placeholder_format.idx: ph for ph in self.slide_layout.placeholders}
+        self.keep = [info for info in (self.layout.title, self.layout.body) if info]
+        self.layout_placeholders = [by_idx[info.idx] for info in self.keep]
+
+    def _add_slide(self):
+        """
+        Same as prs.slides.add_slide, but clones only the layout placeholders we
+        fill, so there are no ghost placeholders to find and delete afterwards.
+        """
+        rId, slide = self.prs.part.add_slide(self.slide_layout)
+        for placeholder in self.layout_placeholders:
+            slide.shapes.clone_placeholder(placeholder)
+        self.prs.slides._sldIdLst.add_sldId(rId)
+        return slide
+
+    def add(self, slide_data):
+        layout, body = self.layout, self.layout.body
+        slide = self._add_slide()
+        shapes = dict(zip((info.idx for info in self.keep), slide.shapes))
+        # Title size and a body box pushed clear of the title (geometry comes from the index)
+        plan = plan_slide(layout, self.index.slide_height, slide_data)
+
+        # 1. Set Title
+        if layout.title:
+            title_shape = shapes[layout.title.idx]
+            title_shape.text = slide_data.title
+            if plan.title_size:
+                title_shape.text_frame.paragraphs[0].font.size = Pt(plan.title_size)
 
         # 2. Add Content (Text Body)
-        body_shape = None
-        for shape in slide.placeholders:
-             if shape.placeholder_format.idx == 1:
-                 body_shape = shape
-                 break
-        
-        # Basic Logic (Strategy A/B condensed since we have no images)
-        final_body_shape = body_shape
-        
-        if final_body_shape:
-            # CRITICAL OVERLAP FIX
-            if final_body_shape.top < safe_top:
-                final_body_shape.top = safe_top
-            
-            # Ensure height doesn't run off slide
-            slide_height = prs.slide_height
-            remaining_height = slide_height - safe_top - Inches(0.5)
-            if final_body_shape.height > remaining_height:
-                final_body_shape.height = remaining_height
-            
-            # Add text
-            tf = final_body_shape.text_frame
+        if body:
+            body_shape = shapes[body.idx]
+            if (plan.body_top, plan.body_height) != (body.top, body.height):
+                # A full xfrm: setting only `top` on an inheriting placeholder leaves x/size unset
+                body_shape.left, body_shape.top = body.left, plan.body_top
+                body_shape.width, body_shape.height = body.width, plan.body_height
+
+            # Add text at the largest size that fits the box
+            tf = body_shape.text_frame
             tf.clear()
-            for point in content_lines:
-                p = tf.add_paragraph()
+            font_size = Pt(plan.body_size)
+            for j, point in enumerate(slide_data.content):
+                p = tf.paragraphs[0] if j == 0 else tf.add_paragraph()
                 p.text = point
                 p.level = 0
-                p.space_before = Pt(6)
-
-                # Readable Font Size
-                if p.font.size is None or p.font.size > Pt(32):
-                    p.font.size = Pt(20)
-                if i == 0: # First slide might be title slide essentially
-                    p.font.size = Pt(24)
-
-        # 5. Cleanup Ghost Placeholders (if any interfering)
-        for shape in list(slide.placeholders):
-            if slide.shapes.title and shape.element == slide.shapes.title.element: continue
-            if final_body_shape and shape.element == final_body_shape.element: continue
+                p.space_before = Pt(BODY_SPACE_BEFORE_PT)
+                p.font.size = font_size
 
+        # 3. Notes
+        if slide_data.notes is not None:
             try:
-                sp = shape.element
-                sp.getparent().remove(sp)
+                slide.notes_slide.notes_text_frame.text = slide_data.notes
             except:
                 pass
+        return slide
 
-        # 6. Notes
-        if "notes" in slide_data:
-            try:
-                slide.notes_slide.notes_text_frame.text = slide_data["notes"]
-            except:
-                pass
+    def detach(self, slide):
+        """
+        Serializes `slide` (and its notes) into a SlideFragment and removes it
+        from the deck, so its XML tree can be freed.
+        """
+        slide_part = slide.part
+        notes_part = slide_part.part_related_by(RT.NOTES_SLIDE) if slide.has_notes_slide else None
+        fragment = SlideFragment(
+            slide_part.blob, _part_rels(slide_part, RT.NOTES_SLIDE),
+            notes_part.blob if notes_part else None,
+            _part_rels(notes_part, RT.SLIDE) if notes_part else None,
+        )
+        sld_id_lst = self.prs.slides._sldIdLst
+        sld_id = sld_id_lst[-1]
+        sld_id_lst.remove(sld_id)
+        self.prs.part.drop_rel(sld_id.rId)
+        return fragment
+
+def _part_rels(part, partner_reltype):
+    """
+    A part's relationships in SlideFragment form: package-absolute targets,
+    None for the slide/notes partner.
+    """
+    return tuple(
+        Rel(rId, rel.reltype,
+            rel.target_ref if rel.is_external
+            else None if rel.reltype == partner_reltype
+            else rel.target_part.partname.lstrip("/"),
+            rel.is_external)
+        for rId, rel in part.rels.items()
+    )
+
+def create_presentation(template, slides_data, output=None):
+    """
+    Creates a PowerPoint presentation from structured data using a template.
+    `template` may be bytes, a file-like object or a path; `slides_data` any
+    iterable of Slide records or raw slide dicts (validated on the way), including a generator.
+    Returns the finished deck as an in-memory BytesIO; nothing touches the disk.
+
+    With `output` (a path or writable binary file), the deck is streamed there
+    instead: each slide is serialized into the zip as soon as it is built and then
+    dropped, so memory stays flat however many slides come through. Returns `output`.
+    """
+    template_bytes = read_template(template)
+
+    # Parsed + stripped template and its layout index come from the cache on repeat exports
+    with span("template_load"):
+        prs, index = template_cache.get(template_bytes)
+    builder = _SlideBuilder(prs, index)
+
+    if output is not None:
+        with span("template_load", skeleton=True):
+            skeleton = fragment_cache.skeleton(hashlib.sha256(template_bytes).hexdigest(), template_bytes)
+        with DeckWriter(output, skeleton) as writer:
+            for slide_data in iter_slides(slides_data):
+                with span("slide_render"):
+                    slide = builder.add(slide_data)
+                with span("slide_write"):
+                    writer.add_slide(builder.detach(slide))
+        return output
+
+    for slide_data in iter_slides(slides_data):
+        with span("slide_render"):
+            builder.add(slide_data)
+
+    output = io.BytesIO()
+    with span("save"):
+        prs.save(output)
+    output.seek(0)
+    return output
+
+def warm_template(template):
+    """
+    Does a template's one-time work ahead of its first export: parse, layout
+    index, export skeleton and the glyph metrics of its fonts. Returns the seconds it took.
+    """
+    started = time.perf_counter()
+    template_bytes = read_template(template)
+    _, index = template_cache.get(template_bytes)
+    fragment_cache.skeleton(hashlib.sha256(template_bytes).hexdigest(), template_bytes)
+    for layout in index.layouts:
+        for info in (layout.title, layout.body):
+            if info:
+                get_metrics(info.font)
+    return time.perf_counter() - started
+
+# --- INCREMENTAL RE-RENDER ---
+# Renders a one-slide deck (with notes, so the notes master is part of it) to
+# take the template skeleton from.
+PROBE_SLIDE = Slide("", (), "")
+
+def slide_hash(slide_data):
+    """
+    Content hash of one Slide record; equal records render to identical slide XML.
+    """
+    payload = json.dumps(slide_data.to_row(), ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def _fragment_size(fragment):
+    return len(fragment.slide_xml) + len(fragment.notes_xml or b"")
+
+class FragmentCache:
+    """
+    LRU cache of rendered slide fragments keyed by (template digest, slide hash),
+    plus one skeleton per template. Bounded by the total fragment XML size;
+    skeletons are evicted along with the template's last fragment.
+    """
+    def __init__(self, max_bytes=128 * 1024 * 1024, max_templates=8):
+        self.max_bytes = max_bytes
+        self.max_templates = max_templates
+        self._fragments = OrderedDict()  # (digest, slide hash) -> SlideFragment
+        self._skeletons = OrderedDict()  # digest -> DeckSkeleton
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def skeleton(self, digest, template_bytes):
+        with self._lock:
+            skeleton = self._skeletons.get(digest)
+            if skeleton:
+                self._skeletons.move_to_end(digest)
+                return skeleton
+        skeleton = DeckSkeleton.from_deck(create_presentation(template_bytes, [PROBE_SLIDE]))
+        with self._lock:
+            self._skeletons[digest] = skeleton
+            while len(self._skeletons) > self.max_templates:
+                old, _ = self._skeletons.popitem(last=False)
+                for key in [k for k in self._fragments if k[0] == old]:
+                    self._total_bytes -= _fragment_size(self._fragments.pop(key))
+        return skeleton
+
+    def lookup(self, digest, hashes):
+        """
+        Returns {slide hash: fragment} for the cached ones among `hashes`.
+        """
+        found = {}
+        with self._lock:
+            for h in hashes:
+                fragment = self._fragments.get((digest, h))
+                if fragment:
+                    self._fragments.move_to_end((digest, h))
+                    found[h] = fragment
+            self.hits += len(found)
+            self.misses += len(set(hashes) - set(found))
+        return found
+
+    def put(self, digest, h, fragment):
+        size = _fragment_size(fragment)
+        with self._lock:
+            if (digest, h) in self._fragments:
+                return
+            self._fragments[(digest, h)] = fragment
+            self._total_bytes += size
+            while self._total_bytes > self.max_bytes and len(self._fragments) > 1:
+                _, old = self._fragments.popitem(last=False)
+                self._total_bytes -= _fragment_size(old)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "fragments": len(self._fragments),
+                "templates": len(self._skeletons),
+                "bytes": self._total_bytes,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._fragments.clear()
+            self._skeletons.clear()
+            self._total_bytes = 0
+            self.hits = 0
+            self.misses = 0
+
+fragment_cache = FragmentCache()
+
+def render_presentation(template, slides_data):
+    """
+    Same output contract as create_presentation, for repeat exports of a deck
+    that is being edited. Slides rendered before against the same template are
+    reused byte for byte from the fragment cache; only new or changed slides go
+    through python-pptx, and the zip is reassembled around them.
+    """
+    template_bytes = read_template(template)
+    digest = hashlib.sha256(template_bytes).hexdigest()
+    with span("template_load", skeleton=True):
+        skeleton = fragment_cache.skeleton(digest, template_bytes)
+
+    slides_data = normalize_slides(slides_data)
+    hashes = [slide_hash(slide) for slide in slides_data]
+    fragments = fragment_cache.lookup(digest, hashes)
+    dirty = {}
+    for h, slide in zip(hashes, slides_data):
+        if h not in fragments:
+            dirty.setdefault(h, slide)
+    if dirty:
+        rendered = read_fragments(create_presentation(template_bytes, list(dirty.values())))
+        for h, fragment in zip(dirty, rendered):
+            fragments[h] = fragment
+            fragment_cache.put(digest, h, fragment)
 
-    output_filename = "generated_presentation.pptx"
-    prs.save(output_filename)
-    return output_filename
+    output = io.BytesIO()
+    try:
+        with DeckWriter(output, skeleton) as writer:
+            for h in hashes:
+                with span("slide_write"):
+                    writer.add_slide(fragments[h])
+    except ValueError:
+        # A slide points at parts the skeleton doesn't have (e.g. its own media)
+        return create_presentation(template_bytes, slides_data)
+    output.seek(0)
+    return output
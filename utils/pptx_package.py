@@ -0,0 +1,232 @@
+"""
+Zip-level assembly of .pptx packages.
+
+A deck rendered by python-pptx is split into a skeleton (everything the template
+contributes: masters, layouts, themes, the notes master, document properties) and
+per-slide fragments (slide XML, notes XML and their relationships). DeckWriter puts
+them back together: it numbers the slide parts itself and writes presentation.xml,
+its relationships and [Content_Types].xml last, once the slide list is known.
+Fragments hold no position-dependent data, so one rendered slide can be placed
+anywhere in any deck built from the same skeleton.
+"""
+import io
+import posixpath
+import zipfile
+from collections import namedtuple
+from lxml import etree
+from utils.telemetry import timed
+
+CT_NS = "http://schemas.openxmlformats.org/package/2006/content-types"
+PR_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+P_NS = "http://schemas.openxmlformats.org/presentationml/2006/main"
+R_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+
+RT_OFFICE_DOCUMENT = R_NS + "/officeDocument"
+RT_SLIDE = R_NS + "/slide"
+RT_NOTES_SLIDE = R_NS + "/notesSlide"
+
+CT_SLIDE = "application/vnd.openxmlformats-officedocument.presentationml.slide+xml"
+CT_NOTES_SLIDE = "application/vnd.openxmlformats-officedocument.presentationml.notesSlide+xml"
+
+FIRST_SLIDE_ID = 256  # Lowest id PowerPoint accepts in p:sldIdLst
+
+# rels are tuples of Rel; a target of None stands for the slide's partner part
+# (its notes slide, or the notes slide's slide), which is numbered at write time.
+Rel = namedtuple("Rel", "rId reltype target external")
+SlideFragment = namedtuple("SlideFragment", "slide_xml slide_rels notes_xml notes_rels")
+
+# --- HELPERS ---
+def _rels_path(partname):
+    directory, name = posixpath.split(partname)
+    return posixpath.join(directory, "_rels", name + ".rels")
+
+def _resolve(partname, target):
+    return posixpath.normpath(posixpath.join(posixpath.dirname(partname), target))
+
+def parse_rels(xml):
+    return tuple(
+        Rel(el.get("Id"), el.get("Type"), el.get("Target"), el.get("TargetMode") == "External")
+        for el in etree.fromstring(xml)
+    )
+
+def rels_xml(rels):
+    root = etree.Element(f"{{{PR_NS}}}Relationships", nsmap={None: PR_NS})
+    for rel in rels:
+        el = etree.SubElement(root, f"{{{PR_NS}}}Relationship", Id=rel.rId, Type=rel.reltype, Target=rel.target)
+        if rel.external:
+            el.set("TargetMode", "External")
+    return _xml_bytes(root)
+
+def _xml_bytes(element):
+    return etree.tostring(element, xml_declaration=True, encoding="UTF-8", standalone=True)
+
+def _open(deck):
+    if isinstance(deck, (bytes, bytearray)):
+        deck = io.BytesIO(deck)
+    return zipfile.ZipFile(deck)
+
+def _presentation_partname(zf):
+    for rel in parse_rels(zf.read("_rels/.rels")):
+        if rel.reltype == RT_OFFICE_DOCUMENT:
+            return rel.target.lstrip("/")
+    raise ValueError("Not a presentation package (no officeDocument relationship).")
+
+def _slide_parts(zf, prs_name):
+    """
+    Yields (slide partname, notes partname or None) in presentation order.
+    """
+    prs_rels = {rel.rId: rel for rel in parse_rels(zf.read(_rels_path(prs_name)))}
+    root = etree.fromstring(zf.read(prs_name))
+    for sld_id in root.iterfind(f"{{{P_NS}}}sldIdLst/{{{P_NS}}}sldId"):
+        slide_name = _resolve(prs_name, prs_rels[sld_id.get(f"{{{R_NS}}}id")].target)
+        notes_name = None
+        for rel in parse_rels(zf.read(_rels_path(slide_name))):
+            if rel.reltype == RT_NOTES_SLIDE:
+                notes_name = _resolve(slide_name, rel.target)
+        yield slide_name, notes_name
+
+# --- READING ---
+def read_fragments(deck):
+    """
+    Splits a rendered deck (bytes or file-like) into SlideFragments, in slide order.
+    """
+    with _open(deck) as zf:
+        fragments = []
+        for slide_name, notes_name in _slide_parts(zf, _presentation_partname(zf)):
+            slide_rels = tuple(
+                rel._replace(target=None) if rel.reltype == RT_NOTES_SLIDE
+                else rel._replace(target=_resolve(slide_name, rel.target)) if not rel.external else rel
+                for rel in parse_rels(zf.read(_rels_path(slide_name)))
+            )
+            notes_xml = notes_rels = None
+            if notes_name:
+                notes_xml = zf.read(notes_name)
+                notes_rels = tuple(
+                    rel._replace(target=None) if rel.reltype == RT_SLIDE
+                    else rel._replace(target=_resolve(notes_name, rel.target)) if not rel.external else rel
+                    for rel in parse_rels(zf.read(_rels_path(notes_name)))
+                )
+            fragments.append(SlideFragment(zf.read(slide_name), slide_rels, notes_xml, notes_rels))
+        return fragments
+
+class DeckSkeleton:
+    """
+    Everything in a rendered deck except its slides: the parts to copy verbatim,
+    plus presentation.xml, its rels and [Content_Types].xml with the slide
+    entries taken out, ready for DeckWriter to fill in.
+    Fragment targets (layouts, notes master) are stored package-absolute, e.g.
+    "ppt/slideLayouts/slideLayout2.xml".
+    """
+    def __init__(self, entries, prs_name, presentation, presentation_rels, content_types):
+        self.entries = entries                      # [(name, bytes)] in original order
+        self.prs_name = prs_name
+        self.presentation = presentation            # bytes, empty p:sldIdLst
+        self.presentation_rels = presentation_rels  # tuple of Rel, no slide rels
+        self.content_types = content_types          # bytes, no slide/notes overrides
+        self.names = {name for name, _ in entries}
+        self.size = sum(len(data) for _, data in entries) + len(presentation) + len(content_types)
+
+    @classmethod
+    def from_deck(cls, deck):
+        with _open(deck) as zf:
+            prs_name = _presentation_partname(zf)
+            prs_rels_name = _rels_path(prs_name)
+            slide_parts = set()
+            for slide_name, notes_name in _slide_parts(zf, prs_name):
+                slide_parts.update((slide_name, _rels_path(slide_name)))
+                if notes_name:
+                    slide_parts.update((notes_name, _rels_path(notes_name)))
+
+            presentation = etree.fromstring(zf.read(prs_name))
+            sld_id_lst = presentation.find(f"{{{P_NS}}}sldIdLst")
+            if sld_id_lst is None:
+                raise ValueError("Skeleton deck needs at least one slide.")
+            for sld_id in list(sld_id_lst):
+                sld_id_lst.remove(sld_id)
+
+            content_types = etree.fromstring(zf.read("[Content_Types].xml"))
+            for override in list(content_types.iterfind(f"{{{CT_NS}}}Override")):
+                if override.get("PartName").lstrip("/") in slide_parts:
+                    content_types.remove(override)
+
+            skip = slide_parts | {prs_name, prs_rels_name, "[Content_Types].xml"}
+            entries = [(info.filename, zf.read(info.filename)) for info in zf.infolist() if info.filename not in skip]
+            prs_rels = tuple(rel for rel in parse_rels(zf.read(prs_rels_name)) if rel.reltype != RT_SLIDE)
+            return cls(entries, prs_name, _xml_bytes(presentation), prs_rels, _xml_bytes(content_types))
+
+# --- WRITING ---
+class DeckWriter:
+    """
+    Streams a deck into `out` (path or writable file object): skeleton parts
+    first, then each slide as it is added, then the presentation part, its rels
+    and the content types on close().
+    """
+    def __init__(self, out, skeleton, compression=zipfile.ZIP_DEFLATED):
+        self.skeleton = skeleton
+        self._zip = zipfile.ZipFile(out, "w", compression)
+        self._slides = []  # (slide partname, has notes)
+        for name, data in skeleton.entries:
+            self._zip.writestr(name, data)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._zip.close()
+
+    def _targets(self, rels, partname, partner):
+        """
+        Turns stored (package-absolute) targets back into ones relative to `partname`.
+        """
+        base = posixpath.dirname(partname)
+        out = []
+        for rel in rels:
+            if rel.external:
+                out.append(rel)
+                continue
+            target = partner if rel.target is None else rel.target
+            if target not in self.skeleton.names and rel.target is not None:
+                raise ValueError(f"Slide refers to {target}, which the skeleton doesn't contain.")
+            out.append(rel._replace(target=posixpath.relpath(target, base)))
+        return out
+
+    def add_slide(self, fragment):
+        n = len(self._slides) + 1
+        slide_name = f"ppt/slides/slide{n}.xml"
+        notes_name = f"ppt/notesSlides/notesSlide{n}.xml" if fragment.notes_xml is not None else None
+        slide_rels = [rel for rel in fragment.slide_rels if notes_name or rel.target is not None]
+
+        self._zip.writestr(slide_name, fragment.slide_xml)
+        self._zip.writestr(_rels_path(slide_name), rels_xml(self._targets(slide_rels, slide_name, notes_name)))
+        if notes_name:
+            self._zip.writestr(notes_name, fragment.notes_xml)
+            self._zip.writestr(_rels_path(notes_name), rels_xml(self._targets(fragment.notes_rels, notes_name, slide_name)))
+        self._slides.append((slide_name, notes_name is not None))
+
+    @timed("save")
+    def close(self):
+        skeleton = self.skeleton
+        prs_rels = list(skeleton.presentation_rels)
+        next_rid = 1 + max((int(rel.rId[3:]) for rel in prs_rels if rel.rId[3:].isdigit()), default=0)
+
+        presentation = etree.fromstring(skeleton.presentation)
+        sld_id_lst = presentation.find(f"{{{P_NS}}}sldIdLst")
+        content_types = etree.fromstring(skeleton.content_types)
+        prs_dir = posixpath.dirname(skeleton.prs_name)
+        for i, (slide_name, has_notes) in enumerate(self._slides):
+            rId = f"rId{next_rid + i}"
+            prs_rels.append(Rel(rId, RT_SLIDE, posixpath.relpath(slide_name, prs_dir), False))
+            etree.SubElement(sld_id_lst, f"{{{P_NS}}}sldId", {"id": str(FIRST_SLIDE_ID + i), f"{{{R_NS}}}id": rId})
+            etree.SubElement(content_types, f"{{{CT_NS}}}Override", PartName="/" + slide_name, ContentType=CT_SLIDE)
+            if has_notes:
+                notes_name = slide_name.replace("slides/slide", "notesSlides/notesSlide")
+                etree.SubElement(content_types, f"{{{CT_NS}}}Override", PartName="/" + notes_name, ContentType=CT_NOTES_SLIDE)
+
+        self._zip.writestr(skeleton.prs_name, _xml_bytes(presentation))
+        self._zip.writestr(_rels_path(skeleton.prs_name), rels_xml(prs_rels))
+        self._zip.writestr("[Content_Types].xml", _xml_bytes(content_types))
+        self._zip.close()
+        return len(self._slides)
@@ -0,0 +1,470 @@
+import re
+import time
+import random
+import asyncio
+import threading
+from collections import deque
+from email.utils import parsedate_to_datetime
+from utils.telemetry import span
+
+# --- SETTINGS ---
+# Client-side pacing per provider: (requests per second, burst size)
+RATE_LIMITS = {
+    "OpenAI": (8.0, 16),
+    "Anthropic": (4.0, 8),
+    "Google Gemini": (8.0, 16),
+}
+DEFAULT_RATE_LIMIT = (4.0, 8)
+
+FATAL_STATUS = {400, 401, 403, 404, 405, 413, 422}
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504, 529}
+
+# Error kinds returned by classify_error
+FATAL = "fatal"
+RETRYABLE = "retryable"
+RATE_LIMITED = "rate_limited"
+
+class CircuitOpenError(Exception):
+    """
+    Raised without calling the provider while its circuit breaker is open.
+    """
+    def __init__(self, provider, retry_in):
+        super().__init__(f"{provider} is temporarily unavailable (circuit open, retry in {retry_in:.0f}s).")
+        self.provider = provider
+        self.retry_in = retry_in
+
+class RetryBudgetExceeded(Exception):
+    """
+    Raised when the server asks us to wait longer than the policy allows.
+    """
+
+# --- ERROR CLASSIFICATION ---
+def _status_of(exc):
+    for attr in ("status_code", "code", "status"):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(exc, "response", None)
+    value = getattr(response, "status_code", None)
+    return value if isinstance(value, int) else None
+
+def _parse_duration(value):
+    """
+    Parses '2', '1.5', '250ms', '6m0s' or an HTTP date into seconds.
+    """
+    value = str(value).strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parts = re.findall(r"(\d+(?:\.\d+)?)(ms|s|m|h)", value)
+    if parts:
+        scale = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+        return sum(float(n) * scale[u] for n, u in parts)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def retry_after_seconds(exc):
+    """
+    Reads the server's rate-limit hint (Retry-After and friends) from an SDK exception.
+    """
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    for name in ("retry-after", "x-ratelimit-reset-requests", "x-ratelimit-reset-tokens", "anthropic-ratelimit-requests-reset"):
+        if headers.get(name):
+            seconds = _parse_duration(headers[name])
+            if seconds is not None:
+                return seconds
+    return None
+
+def classify_error(exc):
+    """
+    Returns (kind, retry_after) for an exception raised by a provider SDK.
+    Auth/validation errors are fatal; timeouts, connection drops, 429 and 5xx are retried.
+    """
+    if isinstance(exc, CircuitOpenError):
+        return FATAL, None
+
+    status = _status_of(exc)
+    if status == 429:
+        return RATE_LIMITED, retry_after_seconds(exc)
+    if status in FATAL_STATUS:
+        return FATAL, None
+    if status in RETRYABLE_STATUS or (status is not None and status >= 500):
+        return RETRYABLE, retry_after_seconds(exc)
+
+    name = type(exc).__name__
+    if isinstance(exc, (asyncio.TimeoutError, TimeoutError, ConnectionError)) \
+            or "Timeout" in name or "Connection" in name or name in ("ServiceUnavailable", "InternalServerError", "ResourceExhausted"):
+        return (RATE_LIMITED if name == "ResourceExhausted" else RETRYABLE), None
+    if "Authentication" in name or "PermissionDenied" in name or "InvalidArgument" in name or "BadRequest" in name:
+        return FATAL, None
+    # Unknown errors: retry, like the original wrapper did
+    return RETRYABLE, None
+
+# --- POLICY ---
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter. Server rate-limit hints win over the
+    computed delay, unless they exceed `max_retry_after`.
+    """
+    def __init__(self, max_attempts=4, base_delay=0.5, max_delay=20.0, max_retry_after=60.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+
+    def backoff(self, attempt, retry_after=None):
+        if retry_after is not None:
+            if retry_after > self.max_retry_after:
+                raise RetryBudgetExceeded(f"Server asked to retry after {retry_after:.0f}s.")
+            return retry_after + random.uniform(0, self.base_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+class TokenBucket:
+    """
+    Client-side request pacing. Refills `rate` tokens per second up to `capacity`.
+    A 429 can `pause` the bucket so every caller backs off, not just the one that hit it.
+    """
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _take(self):
+        """
+        Takes a token if one is available; otherwise returns seconds to wait.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now < self._paused_until:
+                return self._paused_until - now
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    async def acquire(self):
+        waited = 0.0
+        while True:
+            wait = self._take()
+            if not wait:
+                return waited
+            waited += wait
+            await asyncio.sleep(wait)
+
+    def acquire_blocking(self):
+        waited = 0.0
+        while True:
+            wait = self._take()
+            if not wait:
+                return waited
+            waited += wait
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive retryable failures and fails fast
+    for `reset_timeout` seconds; then lets a single trial call through (half-open).
+    Fatal errors (bad key, bad request) are the caller's problem and don't count.
+    """
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, provider, failure_threshold=5, reset_timeout=30.0):
+        self.provider = provider
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """
+        Admits a call or raises CircuitOpenError. Returns True when the call is
+        the half-open trial, which must end in record_success, record_failure,
+        release or abandon.
+        """
+        with self._lock:
+            if self.state == self.OPEN:
+                elapsed = time.monotonic() - self._opened_at
+                if elapsed < self.reset_timeout:
+                    raise CircuitOpenError(self.provider, self.reset_timeout - elapsed)
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.HALF_OPEN:
+                if self._trial_in_flight:
+                    raise CircuitOpenError(self.provider, 0)
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+    def release(self):
+        """
+        Ends a call that neither succeeded nor failed for availability purposes (fatal error).
+        """
+        with self._lock:
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN:
+                self.state = self.CLOSED
+                self._failures = 0
+
+    def abandon(self):
+        """
+        Ends a half-open trial that was cancelled before it said anything about
+        the provider: the circuit stays half-open and the next call is the trial.
+        """
+        with self._lock:
+            self._trial_in_flight = False
+
+# --- METRICS ---
+class RetryMetrics:
+    """
+    Per-provider counters for calls, retries, failures and time spent backing off.
+    """
+    FIELDS = ("calls", "attempts", "retries", "rate_limited", "fatal_errors",
+              "gave_up", "circuit_rejections", "backoff_seconds", "pacing_seconds")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}
+
+    def add(self, provider, field, amount=1):
+        with self._lock:
+            row = self._data.setdefault(
+                provider, {f: 0.0 if f.endswith("_seconds") else 0 for f in self.FIELDS}
+            )
+            row[field] += amount
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                provider: {k: (round(v, 3) if isinstance(v, float) else v) for k, v in row.items()}
+                for provider, row in self._data.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._data.clear()
+
+# --- PROVIDER GUARD ---
+class ProviderGuard:
+    """
+    Bundles pacing, circuit breaking and the retry policy for one provider.
+    """
+    def __init__(self, provider, policy=None, bucket=None, breaker=None, metrics=None):
+        rate, burst = RATE_LIMITS.get(provider, DEFAULT_RATE_LIMIT)
+        self.provider = provider
+        self.policy = policy or RetryPolicy()
+        self.bucket = bucket or TokenBucket(rate, burst)
+        self.breaker = breaker or CircuitBreaker(provider)
+        self.metrics = metrics or retry_metrics
+
+    def _on_error(self, exc, attempt, last_error=None):
+        """
+        Books the failure and returns how long to back off, or re-raises if we should stop.
+        `last_error` is the previous attempt's error: when that attempt opened the
+        breaker, it is what the caller sees instead of the CircuitOpenError.
+        """
+        kind, retry_after = classify_error(exc)
+        if isinstance(exc, CircuitOpenError):
+            self.metrics.add(self.provider, "circuit_rejections")
+            raise last_error or exc
+        if kind == FATAL:
+            self.breaker.release()
+            self.metrics.add(self.provider, "fatal_errors")
+            raise exc
+
+        self.breaker.record_failure()
+        if kind == RATE_LIMITED:
+            self.metrics.add(self.provider, "rate_limited")
+        if attempt >= self.policy.max_attempts - 1:
+            self.metrics.add(self.provider, "gave_up")
+            raise exc
+
+        delay = self.policy.backoff(attempt, retry_after)
+        if kind == RATE_LIMITED:
+            self.bucket.pause(delay)
+        self.metrics.add(self.provider, "retries")
+        self.metrics.add(self.provider, "backoff_seconds", delay)
+        return delay
+
+    async def call(self, func, *args, **kwargs):
+        """
+        Awaits func(*args, **kwargs) under the provider's pacing, breaker and retry policy.
+        """
+        self.metrics.add(self.provider, "calls")
+        last_error = None
+        for attempt in range(self.policy.max_attempts):
+            self.metrics.add(self.provider, "pacing_seconds", await self.bucket.acquire())
+            trial = False
+            try:
+                trial = self.breaker.before_call()
+                self.metrics.add(self.provider, "attempts")
+                with span("provider_attempt", provider=self.provider, attempt=attempt + 1):
+                    result = await func(*args, **kwargs)
+            except Exception as e:
+                await asyncio.sleep(self._on_error(e, attempt, last_error))
+                last_error = e
+                continue
+            except BaseException:
+                # Cancelled (e.g. a losing hedge): no verdict, but the trial slot must be freed
+                if trial:
+                    self.breaker.abandon()
+                raise
+            self.breaker.record_success()
+            return result
+
+    def call_blocking(self, func, *args, **kwargs):
+        """
+        Synchronous twin of `call` for code that is not on an event loop.
+        """
+        self.metrics.add(self.provider, "calls")
+        last_error = None
+        for attempt in range(self.policy.max_attempts):
+            self.metrics.add(self.provider, "pacing_seconds", self.bucket.acquire_blocking())
+            trial = False
+            try:
+                trial = self.breaker.before_call()
+                self.metrics.add(self.provider, "attempts")
+                with span("provider_attempt", provider=self.provider, attempt=attempt + 1):
+                    result = func(*args, **kwargs)
+            except Exception as e:
+                time.sleep(self._on_error(e, attempt, last_error))
+                last_error = e
+                continue
+            except BaseException:
+                if trial:
+                    self.breaker.abandon()
+                raise
+            self.breaker.record_success()
+            return result
+
+    async def stream(self, gen_func, *args, **kwargs):
+        """
+        Async-generator variant of `call`. An attempt is only retried if it failed
+        before yielding anything; once items went out, errors propagate.
+        """
+        self.metrics.add(self.provider, "calls")
+        last_error = None
+        for attempt in range(self.policy.max_attempts):
+            self.metrics.add(self.provider, "pacing_seconds", await self.bucket.acquire())
+            yielded = trial = False
+            try:
+                trial = self.breaker.before_call()
+                self.metrics.add(self.provider, "attempts")
+                with span("provider_attempt", provider=self.provider, attempt=attempt + 1, stream=True):
+                    async for item in gen_func(*args, **kwargs):
+                        yielded = True
+                        yield item
+            except GeneratorExit:
+                # Closed early by the consumer: no verdict on the provider either
+                if trial:
+                    self.breaker.abandon()
+                raise
+            except Exception as e:
+                if not yielded:
+                    await asyncio.sleep(self._on_error(e, attempt, last_error))
+                    last_error = e
+                    continue
+                if classify_error(e)[0] == FATAL:
+                    self.breaker.release()
+                else:
+                    self.breaker.record_failure()
+                raise
+            except BaseException:
+                # Cancelled mid-stream: as in `call`, free the trial without a verdict
+                if trial:
+                    self.breaker.abandon()
+                raise
+            self.breaker.record_success()
+            return
+
+# --- LATENCY TRACKING ---
+class LatencyTracker:
+    """
+    Rolling window of successful request latencies per provider, used to decide
+    when and to whom a request should be hedged.
+    """
+    def __init__(self, window=50):
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, provider, seconds):
+        with self._lock:
+            self._samples.setdefault(provider, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, provider, q):
+        """
+        Returns the q-th percentile (0-100) of recent latencies, or None without samples.
+        """
+        with self._lock:
+            samples = sorted(self._samples.get(provider, ()))
+        if not samples:
+            return None
+        rank = min(len(samples) - 1, max(0, int(round(q / 100 * (len(samples) - 1)))))
+        return samples[rank]
+
+    def snapshot(self):
+        with self._lock:
+            providers = list(self._samples)
+        return {
+            provider: {
+                "samples": len(self._samples[provider]),
+                "p50": self.percentile(provider, 50),
+                "p90": self.percentile(provider, 90),
+                "p99": self.percentile(provider, 99),
+            }
+            for provider in providers
+        }
+
+retry_metrics = RetryMetrics()
+latency_tracker = LatencyTracker()
+_guards = {}
+_guards_lock = threading.Lock()
+
+def get_guard(provider):
+    with _guards_lock:
+        guard = _guards.get(provider)
+        if guard is None:
+            guard = ProviderGuard(provider)
+            _guards[provider] = guard
+        return guard
+
+def circuit_states():
+    with _guards_lock:
+        return {provider: guard.breaker.state for provider, guard in _guards.items()}
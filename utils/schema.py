@@ -0,0 +1,218 @@
+"""
+Slide schema: compact typed records, and the validation that turns whatever a
+provider returned into them.
+
+    slides = normalize_slides(json.loads(raw))   # [Slide, ...]
+    slide.title, slide.content, slide.notes       # str, tuple of str, str or None
+
+Normalization coerces instead of rejecting: content given as a string is split
+into lines, nested lists are flattened, numbers become text, common aliases
+("bullets", "speaker_notes", ...) are accepted. Limits are enforced up front, so
+nothing oversized reaches the renderer: long bullets are split on sentence
+boundaries (or truncated), slides with too many bullets continue on balanced
+"(cont.)" slides, and titles and notes are truncated.
+
+Records serialize as [title, [bullets...], notes] rows (dump_slides /
+load_slides) for the response cache and the outline index.
+"""
+import json
+import re
+
+MAX_TITLE_CHARS = 120
+MAX_BULLET_CHARS = 200
+MAX_BULLETS = 8             # Per slide; more continue on "(cont.)" slides
+MAX_NOTES_CHARS = 3000
+UNTITLED = "Untitled"
+CONT_SUFFIX = " (cont.)"
+
+# Accepted keys, preferred first
+TITLE_KEYS = ("title", "heading", "headline")
+CONTENT_KEYS = ("content", "bullets", "points", "bullet_points")
+NOTES_KEYS = ("notes", "speaker_notes", "speakerNotes")
+
+_MARKER = re.compile(r"^\s*(?:[-*+•▪–]|\d{1,3}[.)])\s+")
+_SENTENCE = re.compile(r"(?<=[.!?;])\s+")
+
+class Slide:
+    """
+    One slide: `title` (str), `content` (tuple of bullet strings) and `notes`
+    (str, or None for no notes slide). Treat as immutable; replace() makes edits.
+    """
+    __slots__ = ("title", "content", "notes")
+
+    def __init__(self, title=UNTITLED, content=(), notes=None):
+        self.title = title
+        self.content = tuple(content)
+        self.notes = notes
+
+    def replace(self, **changes):
+        return Slide(changes.get("title", self.title), changes.get("content", self.content),
+                     changes.get("notes", self.notes))
+
+    def to_dict(self):
+        data = {"title": self.title, "content": list(self.content)}
+        if self.notes is not None:
+            data["notes"] = self.notes
+        return data
+
+    def to_row(self):
+        return [self.title, list(self.content), self.notes]
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(row[0], row[1], row[2])
+
+    def __reduce__(self):
+        return Slide, (self.title, self.content, self.notes)
+
+    def __eq__(self, other):
+        if not isinstance(other, Slide):
+            return NotImplemented
+        return (self.title, self.content, self.notes) == (other.title, other.content, other.notes)
+
+    def __hash__(self):
+        return hash((self.title, self.content, self.notes))
+
+    def __repr__(self):
+        return f"Slide(title={self.title!r}, content={self.content!r}, notes={self.notes!r})"
+
+# --- SERIALIZATION ---
+def dump_slides(slides):
+    return json.dumps([slide.to_row() for slide in slides], ensure_ascii=False, separators=(",", ":"))
+
+def load_slides(text):
+    # Entries stored before slides were records hold slide objects, not rows
+    return normalize_slides(Slide.from_row(row) if isinstance(row, list) else row for row in json.loads(text))
+
+# --- COERCION ---
+def _first(item, keys):
+    for key in keys:
+        if key in item:
+            return item[key]
+    return None
+
+def _text(value):
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return " ".join(value.split())
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    if isinstance(value, dict):
+        # e.g. {"text": "..."} or {"point": "..."}: the first text-like value
+        for v in value.values():
+            text = _text(v)
+            if text:
+                return text
+        return ""
+    if isinstance(value, (list, tuple)):
+        return " ".join(t for t in map(_text, value) if t)
+    return str(value)
+
+def _truncate(text, limit, fixes, fix):
+    if len(text) <= limit:
+        return text
+    fixes.add(fix)
+    cut = text[:limit - 1].rsplit(" ", 1)[0] if " " in text[:limit - 1] else text[:limit - 1]
+    return cut.rstrip(",;:-") + "…"
+
+def _bullets(value, fixes):
+    """
+    Flat list of non-empty bullet strings from a content value of any shape.
+    """
+    if value is None:
+        return []
+    if isinstance(value, str):
+        fixes.add("coerced_content")
+        return [b for b in (" ".join(_MARKER.sub("", line).split()) for line in value.splitlines()) if b]
+    if not isinstance(value, (list, tuple)):
+        fixes.add("coerced_content")
+        value = [value]
+    bullets = []
+    for item in value:
+        if isinstance(item, (list, tuple)):
+            fixes.add("flattened_content")
+            bullets.extend(_bullets(item, fixes))
+        elif isinstance(item, str):
+            text = " ".join(_MARKER.sub("", item).split())
+            if text:
+                bullets.append(text)
+        else:
+            text = _text(item)
+            if text:
+                fixes.add("coerced_content")
+                bullets.append(text)
+    return bullets
+
+def _fit_bullet(bullet, fixes):
+    """
+    A bullet over MAX_BULLET_CHARS as several, split between sentences; a
+    single sentence that is still too long is truncated.
+    """
+    if len(bullet) <= MAX_BULLET_CHARS:
+        return [bullet]
+    fixes.add("split_bullet")
+    pieces, current = [], ""
+    for sentence in _SENTENCE.split(bullet):
+        if current and len(current) + 1 + len(sentence) > MAX_BULLET_CHARS:
+            pieces.append(current)
+            current = ""
+        current = f"{current} {sentence}" if current else sentence
+    if current:
+        pieces.append(current)
+    return [_truncate(piece, MAX_BULLET_CHARS, fixes, "truncated_bullet") for piece in pieces]
+
+# --- VALIDATION ---
+def normalize_slide(item, fixes=None):
+    """
+    The Slide records for one raw slide object: one, or several when it had to
+    be split; [] for anything that isn't an object. Names of the fixes applied
+    are added to the `fixes` set.
+    """
+    fixes = set() if fixes is None else fixes
+    if isinstance(item, Slide):
+        return [item]
+    if not isinstance(item, dict):
+        fixes.add("not_an_object")
+        return []
+
+    title = _text(_first(item, TITLE_KEYS))
+    if not title:
+        fixes.add("missing_title")
+        title = UNTITLED
+    title = _truncate(title, MAX_TITLE_CHARS, fixes, "truncated_title")
+
+    content = [piece for bullet in _bullets(_first(item, CONTENT_KEYS), fixes) for piece in _fit_bullet(bullet, fixes)]
+
+    notes = _first(item, NOTES_KEYS)
+    if notes is not None:
+        if not isinstance(notes, str):
+            fixes.add("coerced_notes")
+            notes = _text(notes)
+        if len(notes) > MAX_NOTES_CHARS:
+            notes = _truncate(notes, MAX_NOTES_CHARS, fixes, "truncated_notes")
+
+    if len(content) <= MAX_BULLETS:
+        return [Slide(title, content, notes)]
+    # Balanced parts: 9 bullets become 5 + 4, not 8 + 1
+    fixes.add("split_slide")
+    parts = -(-len(content) // MAX_BULLETS)
+    size = -(-len(content) // parts)
+    # The notes go with the first part only; the marker survives a long title
+    cont_title = _truncate(title, MAX_TITLE_CHARS - len(CONT_SUFFIX), fixes, "truncated_title") + CONT_SUFFIX
+    return [
+        Slide(title if start == 0 else cont_title, content[start:start + size], notes if start == 0 else None)
+        for start in range(0, len(content), size)
+    ]
+
+def iter_slides(items, fixes=None):
+    """
+    Lazily yields the Slide records for an iterable of raw slide objects (or
+    records, passed through), e.g. a generator feeding a streamed export.
+    """
+    fixes = set() if fixes is None else fixes
+    for item in items:
+        yield from normalize_slide(item, fixes)
+
+def normalize_slides(items, fixes=None):
+    return list(iter_slides(items, fixes))
@@ -0,0 +1,208 @@
+"""
+Near-duplicate detection for submitted documents, and the index of earlier
+outlines it looks them up in.
+
+Documents are compared by MinHash over word 5-shingles: each shingle's 32-bit
+CRC goes through NUM_PERM (128) universal hashes (a*x + b) mod 2^32 + 15,
+vectorized with NumPy and stored as uint64; the fraction of equal signature
+slots estimates their Jaccard similarity. Signatures are split into LSH bands stored
+in SQLite, so a lookup only scores documents sharing at least one band.
+
+    index = OutlineIndex(path)
+    match = index.find(owner, guidance, paragraphs)      # Match or None
+    changes = diff_paragraphs(match.paragraphs, paragraphs)
+    index.add(owner, guidance, paragraphs, slides)
+
+`owner` scopes entries (the engine passes a one-way hash of the API key), so an
+outline is only ever offered back to whoever it was generated for.
+"""
+import os
+import re
+import json
+import time
+import zlib
+import sqlite3
+import difflib
+import threading
+from collections import namedtuple
+import numpy as np
+from utils.schema import dump_slides, load_slides
+
+NUM_PERM = 128
+BANDS = 32              # LSH bands of NUM_PERM // BANDS slots each
+SHINGLE_WORDS = 5
+THRESHOLD = float(os.environ.get("SMART_PPT_SIMILARITY", 0.8))
+_BLOCK = 4096           # Shingles hashed per NumPy step, bounds the temporary matrix
+
+# Universal hashing (a*x + b) mod p over 32-bit shingle hashes; a < 2^31 keeps
+# a*x + b inside uint64. Fixed seed: signatures are stored and must stay comparable.
+_PRIME = np.uint64(4294967311)
+_rng = np.random.RandomState(20240607)
+_A = _rng.randint(1, 1 << 31, size=NUM_PERM).astype(np.uint64)
+_B = _rng.randint(0, 1 << 31, size=NUM_PERM).astype(np.uint64)
+_EMPTY = np.iinfo(np.uint64).max
+_WORD = re.compile(r"\w+")
+
+Match = namedtuple("Match", "id similarity paragraphs slides")
+# One edit between two paragraph lists: what went, what came, and the unchanged
+# paragraph it follows in the new text (None at the start)
+Change = namedtuple("Change", "removed added after")
+
+# --- MINHASH ---
+def shingle_hashes(text):
+    words = _WORD.findall(text.lower())
+    if len(words) < SHINGLE_WORDS:
+        grams = [" ".join(words)] if words else []
+    else:
+        grams = (" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1))
+    return np.fromiter({zlib.crc32(g.encode("utf-8")) for g in grams}, dtype=np.uint64)
+
+def minhash(text):
+    """
+    MinHash signature of `text`: NUM_PERM uint64 values.
+    """
+    hashes = shingle_hashes(text)
+    signature = np.full(NUM_PERM, _EMPTY, dtype=np.uint64)
+    for start in range(0, hashes.size, _BLOCK):
+        block = hashes[start:start + _BLOCK]
+        np.minimum(signature, ((_A[:, None] * block[None, :] + _B[:, None]) % _PRIME).min(axis=1), out=signature)
+    return signature
+
+def similarity(sig_a, sig_b):
+    """
+    Estimated Jaccard similarity of the shingle sets behind two signatures.
+    """
+    return float(np.count_nonzero(sig_a == sig_b)) / NUM_PERM
+
+def band_keys(signature):
+    rows = NUM_PERM // BANDS
+    return [(band, zlib.crc32(signature[band * rows:(band + 1) * rows].tobytes())) for band in range(BANDS)]
+
+# --- DIFF ---
+def _norm(paragraph):
+    return " ".join(paragraph.split())
+
+def diff_paragraphs(old, new):
+    """
+    Paragraph-level edits turning `old` into `new` (lists of paragraphs), as
+    Change tuples; whitespace-only differences don't count. [] if nothing changed.
+    """
+    matcher = difflib.SequenceMatcher(None, [_norm(p) for p in old], [_norm(p) for p in new], autojunk=False)
+    changes = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag != "equal":
+            changes.append(Change(old[i1:i2], new[j1:j2], new[j1 - 1] if j1 else None))
+    return changes
+
+def changed_chars(changes):
+    return sum(len(p) for change in changes for p in change.removed + change.added)
+
+# --- INDEX ---
+class OutlineIndex:
+    """
+    Disk-backed (SQLite) index of processed documents and the outlines made
+    from them, searchable by near-duplicate text. Entries expire after `ttl`
+    seconds; beyond `max_entries` the least recently used go first.
+    """
+    def __init__(self, path, threshold=THRESHOLD, ttl=7 * 24 * 3600, max_entries=2000):
+        self.path = path
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._conn = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _db(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.executescript(
+                "CREATE TABLE IF NOT EXISTS outlines ("
+                "id INTEGER PRIMARY KEY, owner TEXT NOT NULL, guidance TEXT NOT NULL, signature BLOB NOT NULL, "
+                "paragraphs TEXT NOT NULL, slides TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL);"
+                "CREATE TABLE IF NOT EXISTS bands (band INTEGER NOT NULL, hash INTEGER NOT NULL, outline INTEGER NOT NULL);"
+                "CREATE INDEX IF NOT EXISTS bands_key ON bands(band, hash);"
+                "CREATE INDEX IF NOT EXISTS bands_outline ON bands(outline);"
+                "CREATE INDEX IF NOT EXISTS outlines_accessed ON outlines(accessed);"
+                "CREATE INDEX IF NOT EXISTS outlines_owner ON outlines(owner, guidance);"
+            )
+        return self._conn
+
+    def find(self, owner, guidance, paragraphs):
+        """
+        The most similar earlier document of `owner` with the same guidance, if
+        it is at least `threshold` similar. Returns a Match or None.
+        """
+        signature = minhash("\n\n".join(paragraphs))
+        keys = band_keys(signature)
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            where = " OR ".join(["(band = ? AND hash = ?)"] * len(keys))
+            rows = db.execute(
+                f"SELECT id, signature, paragraphs, slides FROM outlines WHERE owner = ? AND guidance = ? "
+                f"AND created >= ? AND id IN (SELECT outline FROM bands WHERE {where})",
+                (owner, guidance, now - self.ttl, *[v for key in keys for v in key]),
+            ).fetchall()
+            best = None
+            for outline_id, stored, stored_paragraphs, slides in rows:
+                score = similarity(signature, np.frombuffer(stored, dtype=np.uint64))
+                if score >= self.threshold and (best is None or score > best[1]):
+                    best = (outline_id, score, stored_paragraphs, slides)
+            if best is None:
+                self.misses += 1
+                return None
+            db.execute("UPDATE outlines SET accessed = ? WHERE id = ?", (now, best[0]))
+            db.commit()
+            self.hits += 1
+            return Match(best[0], best[1], json.loads(best[2]), load_slides(best[3]))
+
+    def add(self, owner, guidance, paragraphs, slides):
+        """
+        Stores the outline made from `paragraphs`, replacing any earlier one of
+        the same owner and guidance for exactly the same paragraphs.
+        """
+        signature = minhash("\n\n".join(paragraphs))
+        stored = json.dumps(paragraphs, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            for (outline_id,) in db.execute("SELECT id FROM outlines WHERE owner = ? AND guidance = ? AND paragraphs = ?",
+                                            (owner, guidance, stored)).fetchall():
+                self._delete(db, outline_id)
+            cursor = db.execute(
+                "INSERT INTO outlines (owner, guidance, signature, paragraphs, slides, created, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (owner, guidance, signature.tobytes(), stored, dump_slides(slides), now, now),
+            )
+            db.executemany("INSERT INTO bands (band, hash, outline) VALUES (?, ?, ?)",
+                           [(band, h, cursor.lastrowid) for band, h in band_keys(signature)])
+            self._evict(db, now)
+            db.commit()
+
+    def _evict(self, db, now):
+        stale = [row[0] for row in db.execute(
+            "SELECT id FROM outlines WHERE created < ? UNION "
+            "SELECT id FROM (SELECT id FROM outlines ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+            (now - self.ttl, self.max_entries),
+        )]
+        for outline_id in stale:
+            self._delete(db, outline_id)
+
+    @staticmethod
+    def _delete(db, outline_id):
+        db.execute("DELETE FROM bands WHERE outline = ?", (outline_id,))
+        db.execute("DELETE FROM outlines WHERE id = ?", (outline_id,))
+
+    def stats(self):
+        with self._lock:
+            entries = self._db().execute("SELECT COUNT(*) FROM outlines").fetchone()[0]
+            return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+    def clear(self):
+        with self._lock:
+            self._db().executescript("DELETE FROM bands; DELETE FROM outlines;")
+            self._db().commit()
+            self.hits = self.misses = 0
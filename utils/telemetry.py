@@ -0,0 +1,274 @@
+"""
+Timing spans and token accounting across the generation and render pipeline.
+
+    with telemetry.trace("generate") as run:        # one per user-visible run
+        with telemetry.span("prompt_build"):
+            ...
+    run.summary()   # {"stages": {"prompt_build": {"count", "total_s", "max_s"}, ...}, "tokens": ...}
+
+Every span feeds process-wide aggregates (exported as Prometheus text); spans
+opened while a trace is active are also kept on that trace. The active trace
+lives in a context variable, so it follows asyncio tasks; code handing a
+coroutine to another thread's loop wraps it with bind().
+
+Stages recorded by the engine: prompt_build, provider_attempt, extract_json,
+template_load, slide_render, slide_write, save.
+
+Exports, all optional:
+    SMART_PPT_TELEMETRY_FILE   finished traces appended as JSONL
+    SMART_PPT_METRICS_FILE     Prometheus text, rewritten after each trace
+    SMART_PPT_METRICS_PORT     Prometheus text served on http://127.0.0.1:<port>/metrics
+"""
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TRACE_FILE = os.environ.get("SMART_PPT_TELEMETRY_FILE")
+METRICS_FILE = os.environ.get("SMART_PPT_METRICS_FILE")
+METRICS_PORT = os.environ.get("SMART_PPT_METRICS_PORT")
+
+_current = contextvars.ContextVar("smart_ppt_trace", default=None)
+
+# --- TRACES ---
+class Trace:
+    """
+    The spans and token usage of one run (a generation, an export, ...).
+    """
+    def __init__(self, name, attrs=None):
+        self.id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.attrs = attrs or {}
+        self.started_at = time.time()
+        self.wall_s = None
+        self.spans = []   # (name, offset_s, duration_s, attrs, error)
+        self.tokens = {}  # provider -> {"input": n, "output": n}
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add_span(self, name, start, duration, attrs, error):
+        with self._lock:
+            self.spans.append((name, round(start - self._t0, 6), round(duration, 6), attrs, error))
+
+    def add_tokens(self, provider, input_tokens, output_tokens):
+        with self._lock:
+            usage = self.tokens.setdefault(provider, {"input": 0, "output": 0})
+            usage["input"] += input_tokens
+            usage["output"] += output_tokens
+
+    def finish(self):
+        self.wall_s = round(time.perf_counter() - self._t0, 6)
+
+    def summary(self):
+        """
+        Per-stage count, total and max seconds, plus token usage; what the debug panel shows.
+        """
+        stages = {}
+        with self._lock:
+            for name, _, duration, _, error in self.spans:
+                stage = stages.setdefault(name, {"count": 0, "total_s": 0.0, "max_s": 0.0, "errors": 0})
+                stage["count"] += 1
+                stage["total_s"] = round(stage["total_s"] + duration, 6)
+                stage["max_s"] = max(stage["max_s"], duration)
+                stage["errors"] += bool(error)
+            tokens = {p: dict(u) for p, u in self.tokens.items()}
+        return {"name": self.name, "wall_s": self.wall_s, "stages": stages, "tokens": tokens}
+
+    def to_dict(self):
+        with self._lock:
+            spans = [
+                {"name": n, "start_s": s, "duration_s": d, **({"attrs": a} if a else {}), **({"error": e} if e else {})}
+                for n, s, d, a, e in self.spans
+            ]
+        return {"trace_id": self.id, "name": self.name, "started_at": round(self.started_at, 3),
+                "wall_s": self.wall_s, "attrs": self.attrs, "tokens": self.tokens, "spans": spans}
+
+# --- AGGREGATES ---
+class Registry:
+    """
+    Process-wide totals per stage and per provider token kind.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages = {}  # name -> [count, total seconds, errors]
+        self.tokens = {}  # (provider, kind) -> count
+        self.traces = 0
+
+    def observe(self, name, duration, error):
+        with self._lock:
+            stage = self.stages.setdefault(name, [0, 0.0, 0])
+            stage[0] += 1
+            stage[1] += duration
+            stage[2] += bool(error)
+
+    def add_tokens(self, provider, input_tokens, output_tokens):
+        with self._lock:
+            for kind, n in (("input", input_tokens), ("output", output_tokens)):
+                self.tokens[(provider, kind)] = self.tokens.get((provider, kind), 0) + n
+
+    def prometheus(self):
+        with self._lock:
+            stages = sorted(self.stages.items())
+            tokens = sorted(self.tokens.items())
+            traces = self.traces
+        lines = [
+            "# HELP smart_ppt_stage_seconds Time spent in each pipeline stage.",
+            "# TYPE smart_ppt_stage_seconds summary",
+        ]
+        for name, (count, total, _) in stages:
+            lines.append(f'smart_ppt_stage_seconds_count{{stage="{name}"}} {count}')
+            lines.append(f'smart_ppt_stage_seconds_sum{{stage="{name}"}} {total:.6f}')
+        lines += ["# HELP smart_ppt_stage_errors_total Stage executions that raised.",
+                  "# TYPE smart_ppt_stage_errors_total counter"]
+        lines += [f'smart_ppt_stage_errors_total{{stage="{name}"}} {errors}' for name, (_, _, errors) in stages]
+        lines += ["# HELP smart_ppt_tokens_total Provider tokens billed.",
+                  "# TYPE smart_ppt_tokens_total counter"]
+        lines += [f'smart_ppt_tokens_total{{provider="{p}",kind="{k}"}} {n}' for (p, k), n in tokens]
+        lines += ["# HELP smart_ppt_traces_total Finished traced runs.",
+                  "# TYPE smart_ppt_traces_total counter",
+                  f"smart_ppt_traces_total {traces}"]
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self.stages.clear()
+            self.tokens.clear()
+            self.traces = 0
+
+registry = Registry()
+_export_lock = threading.Lock()
+
+# --- API ---
+def current_trace():
+    return _current.get()
+
+@contextmanager
+def trace(name, **attrs):
+    """
+    Opens a trace for the enclosed run; it is exported when the block exits.
+    """
+    run = Trace(name, attrs)
+    token = _current.set(run)
+    try:
+        yield run
+    finally:
+        _current.reset(token)
+        run.finish()
+        with registry._lock:
+            registry.traces += 1
+        _export(run)
+
+@contextmanager
+def span(name, **attrs):
+    """
+    Times the enclosed block as one execution of stage `name`. Values put in
+    the yielded dict are recorded as span attributes.
+    """
+    start = time.perf_counter()
+    error = None
+    try:
+        yield attrs
+    except GeneratorExit:
+        raise  # A consumer closing a stream early is not a failure
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        registry.observe(name, duration, error)
+        run = _current.get()
+        if run is not None:
+            run.add_span(name, start, duration, attrs, error)
+
+def timed(name):
+    """
+    Decorator form of span() for plain functions.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def record_tokens(provider, input_tokens, output_tokens):
+    input_tokens, output_tokens = int(input_tokens or 0), int(output_tokens or 0)
+    registry.add_tokens(provider, input_tokens, output_tokens)
+    run = _current.get()
+    if run is not None:
+        run.add_tokens(provider, input_tokens, output_tokens)
+
+def bind(coro):
+    """
+    Wraps a coroutine so it runs under the caller's active trace, e.g. when it
+    is handed to an event loop on another thread.
+    """
+    run = _current.get()
+    if run is None:
+        return coro
+
+    async def bound():
+        token = _current.set(run)
+        try:
+            return await coro
+        finally:
+            _current.reset(token)
+    return bound()
+
+# --- EXPORT ---
+def _export(run):
+    if not (TRACE_FILE or METRICS_FILE):
+        return
+    with _export_lock:
+        if TRACE_FILE:
+            with open(TRACE_FILE, "a", encoding="utf-8") as f:
+                f.write(json.dumps(run.to_dict(), default=str) + "\n")
+        if METRICS_FILE:
+            write_prometheus(METRICS_FILE)
+
+def write_prometheus(path):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(registry.prometheus())
+    os.replace(tmp_path, path)
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") not in ("", "/metrics"):
+            self.send_error(404)
+            return
+        body = registry.prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+_server = None
+_server_lock = threading.Lock()
+
+def serve_metrics(port=None, host="127.0.0.1"):
+    """
+    Starts (once per process) a background HTTP endpoint serving /metrics.
+    Returns the server, or None when no port is configured.
+    """
+    global _server
+    port = port if port is not None else METRICS_PORT
+    if _server or port is None:
+        return _server
+    with _server_lock:
+        # Sessions starting together: only the first one binds the port
+        if _server is None:
+            server = ThreadingHTTPServer((host, int(port)), _MetricsHandler)
+            threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+            _server = server
+    return _server
@@ -0,0 +1,193 @@
+"""
+Text measurement and font-size fitting for placeholders.
+
+Glyph widths come from a local font file when one matching the template font
+(or a metric-compatible substitute, e.g. Carlito for Calibri) can be read with
+Pillow; otherwise from bundled Helvetica AFM widths, which run slightly wide for
+most sans-serif fonts and so err on the side of smaller text.
+Widths are kept per font in units of 1/1000 em, so one table serves every size.
+
+All measurements are memoized: wrapping is keyed by (text, font, size, width) and
+fitting by the full paragraph tuple, so re-fitting a large deck is mostly cache hits.
+"""
+import os
+import re
+from functools import lru_cache
+
+# --- METRICS ---
+# Helvetica AFM advance widths for printable ASCII (32..126), 1/1000 em
+HELVETICA_WIDTHS = (
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+)
+BOLD_FACTOR = 1.06      # Helvetica-Bold is about 6% wider on average text
+FALLBACK_WIDTH = 556    # Anything outside the table (accents, CJK gets wider below)
+WIDE_WIDTH = 1000       # East Asian full-width characters
+LINE_SPACING = 1.2      # Single spacing, as PowerPoint lays it out
+
+# Metric-compatible open fonts to look for when the template font itself isn't installed
+SUBSTITUTES = {
+    "calibri": ["carlito"],
+    "cambria": ["caladea"],
+    "arial": ["liberationsans", "arimo"],
+    "helvetica": ["liberationsans", "arimo", "arial"],
+    "timesnewroman": ["liberationserif", "tinos"],
+    "couriernew": ["liberationmono", "cousine"],
+}
+
+FONT_DIRS = [
+    os.path.expanduser("~/.fonts"),
+    os.path.expanduser("~/.local/share/fonts"),
+    "/usr/share/fonts",
+    "/usr/local/share/fonts",
+    "/Library/Fonts",
+    os.path.expanduser("~/Library/Fonts"),
+    os.path.join(os.environ.get("WINDIR", r"C:\Windows"), "Fonts"),
+]
+FONT_DIRS[:0] = [d for d in os.environ.get("SMART_PPT_FONT_DIRS", "").split(os.pathsep) if d]
+
+def _norm(name):
+    return re.sub(r"[^a-z0-9]", "", name.lower())
+
+@lru_cache(maxsize=1)
+def _font_files():
+    """
+    Normalized file stem -> path for every .ttf/.otf under FONT_DIRS (walked once).
+    """
+    files = {}
+    for root_dir in FONT_DIRS:
+        if not os.path.isdir(root_dir):
+            continue
+        for root, _, names in os.walk(root_dir):
+            for name in names:
+                stem, ext = os.path.splitext(name)
+                if ext.lower() in (".ttf", ".otf"):
+                    files.setdefault(_norm(stem), os.path.join(root, name))
+    return files
+
+def _find_font_file(font, bold):
+    files = _font_files()
+    for family in [_norm(font)] + SUBSTITUTES.get(_norm(font), []):
+        stems = [family + "bold", family + "b"] if bold else [family, family + "regular"]
+        for stem in stems:
+            if stem in files:
+                return files[stem]
+    return None
+
+def _widths_from_file(path):
+    try:
+        from PIL import ImageFont
+        face = ImageFont.truetype(path, 1000)
+        return tuple(int(round(face.getlength(chr(c)))) for c in range(32, 127))
+    except Exception:
+        return None  # Pillow missing or unreadable font; use the bundled table
+
+class FontMetrics:
+    """
+    Advance widths for one font/weight, in 1/1000 em.
+    """
+    def __init__(self, name, widths, source):
+        self.name = name
+        self.widths = widths
+        self.source = source  # font file path, or "builtin"
+
+    def char_width(self, ch):
+        code = ord(ch)
+        if 32 <= code < 127:
+            return self.widths[code - 32]
+        if code >= 0x2E80:
+            return WIDE_WIDTH
+        return FALLBACK_WIDTH
+
+    def text_width(self, text):
+        """
+        Width of `text` in em (multiply by the font size for points).
+        """
+        return sum(self.char_width(ch) for ch in text) / 1000
+
+@lru_cache(maxsize=64)
+def get_metrics(font="Calibri", bold=False):
+    path = _find_font_file(font, bold)
+    widths = _widths_from_file(path) if path else None
+    if widths:
+        return FontMetrics(font, widths, path)
+    widths = HELVETICA_WIDTHS
+    if bold:
+        widths = tuple(int(w * BOLD_FACTOR) for w in widths)
+    return FontMetrics(font, widths, "builtin")
+
+# --- WRAPPING ---
+@lru_cache(maxsize=16384)
+def _word_widths(text, font, bold):
+    """
+    (word widths, space width) for `text`, in em.
+    """
+    metrics = get_metrics(font, bold)
+    return tuple(metrics.text_width(w) for w in text.split()), metrics.char_width(" ") / 1000
+
+@lru_cache(maxsize=65536)
+def wrapped_lines(text, font, size, width, bold=False):
+    """
+    Number of lines `text` takes at `size` points in a box `width` points wide,
+    wrapping greedily at spaces like PowerPoint does. Words wider than the box
+    are broken across lines. Empty text still takes one line.
+    """
+    words, space = _word_widths(text, font, bold)
+    limit = width / size  # box width in em
+    if not words or limit <= 0:
+        return 1
+    lines, used = 1, 0.0
+    for w in words:
+        if used and used + space + w <= limit:
+            used += space + w
+            continue
+        if used:
+            lines += 1
+        # A word longer than the line is broken: it fills whole lines, the rest carries on
+        extra, used = divmod(w, limit)
+        if not used:
+            extra, used = extra - 1, limit
+        lines += int(extra)
+    return lines
+
+def text_height(paragraphs, font, size, width, space_before=0, bold=False):
+    """
+    Height in points of `paragraphs` laid out at `size` points.
+    """
+    lines = sum(wrapped_lines(p, font, size, width, bold) for p in paragraphs)
+    return lines * size * LINE_SPACING + space_before * max(len(paragraphs) - 1, 0)
+
+# --- FITTING ---
+@lru_cache(maxsize=8192)
+def _fit(paragraphs, font, width, height, max_size, min_size, space_before, bold):
+    # Binary search over whole point sizes; text height only grows with size
+    lo, hi = min_size, max_size
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if text_height(paragraphs, font, mid, width, space_before, bold) <= height:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+def fit_font_size(paragraphs, width, height, font="Calibri", max_size=28, min_size=12,
+                  space_before=0, bold=False):
+    """
+    Largest whole point size in [min_size, max_size] at which `paragraphs`
+    (a string or a sequence of strings) fit a width x height box, both in points.
+    Returns min_size when nothing fits; the caller decides how to handle overflow.
+    """
+    if isinstance(paragraphs, str):
+        paragraphs = (paragraphs,)
+    return _fit(tuple(paragraphs), font, round(width, 1), round(height, 1),
+                int(max_size), int(min(min_size, max_size)), space_before, bold)
+
+def cache_info():
+    return {
+        "wrapped_lines": wrapped_lines.cache_info()._asdict(),
+        "fit": _fit.cache_info()._asdict(),
+    }
@@ -0,0 +1,459 @@
+"""
+PNG thumbnails of exported slides, drawn in-process with Pillow: no export,
+no download, no office suite.
+
+    pngs = render_thumbnails(template, slides)   # [PNG bytes, ...], one per slide
+
+A thumbnail is laid out by the exporter's own decisions (ppt_engine.plan_slide:
+the fitted title size, the body box pushed below the title and the fitted body
+size) on top of the template's design for the content layout: the layout or
+master background (solid color or picture), their non-placeholder pictures and
+filled shapes, and outlines of the title and body placeholders. Text is wrapped
+with the template font, or its metric-compatible substitute, when one is
+installed (see text_fit), so line breaks and overflow match the deck. Gradients
+use their first stop; effects, rotation and group shapes are skipped.
+
+The design layer is drawn once per template and width. Thumbnails are cached
+per (template digest, slide hash, width), so after an edit only the changed
+slides are drawn again.
+"""
+import io
+import colorsys
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from lxml import etree
+from PIL import Image, ImageDraw, ImageFont
+from pptx.enum.shapes import PP_PLACEHOLDER
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+from utils.ppt_engine import (
+    BODY_SPACE_BEFORE_PT, H_INSET, TITLE_TYPES, V_INSET,
+    level1_style, plan_slide, read_template, slide_hash, template_cache,
+)
+from utils.schema import normalize_slides
+from utils.telemetry import span
+from utils.text_fit import LINE_SPACING, get_metrics
+
+THUMB_WIDTH = 480               # Pixels; the height follows the template's aspect ratio
+WHITE, BLACK = (255, 255, 255), (0, 0, 0)
+OUTLINE = (128, 128, 128, 110)  # Placeholder box outlines, over any background
+EMU_PER_PT = 12700
+
+_NS = {
+    "a": "http://schemas.openxmlformats.org/drawingml/2006/main",
+    "p": "http://schemas.openxmlformats.org/presentationml/2006/main",
+    "r": "http://schemas.openxmlformats.org/officeDocument/2006/relationships",
+}
+_EMBED = f"{{{_NS['r']}}}embed"
+_PRESET_COLORS = {"black": "000000", "white": "FFFFFF", "red": "FF0000", "green": "008000", "blue": "0000FF",
+                  "yellow": "FFFF00", "gray": "808080", "grey": "808080"}
+_SHAPES = {"ellipse": "ellipse", "roundRect": "rounded_rectangle"}
+
+# --- COLORS ---
+def _hex(value):
+    return tuple(int(value[i:i + 2], 16) for i in (0, 2, 4))
+
+def _modified(rgb, mods):
+    """
+    Applies DrawingML color transforms (lumMod/lumOff, tint, shade), approximately.
+    """
+    for mod in mods:
+        name, amount = etree.QName(mod).localname, int(mod.get("val", 100000)) / 100000
+        if name == "tint":
+            rgb = tuple(c + (255 - c) * (1 - amount) for c in rgb)
+        elif name == "shade":
+            rgb = tuple(c * amount for c in rgb)
+        elif name in ("lumMod", "lumOff"):
+            h, l, s = colorsys.rgb_to_hls(*(c / 255 for c in rgb))
+            l = l * amount if name == "lumMod" else l + amount
+            rgb = tuple(c * 255 for c in colorsys.hls_to_rgb(h, min(max(l, 0.0), 1.0), s))
+    return tuple(int(round(c)) for c in rgb)
+
+class _Colors:
+    """
+    Resolves color elements against the master's theme and color map.
+    """
+    def __init__(self, master):
+        self.scheme = {}
+        try:
+            theme = etree.fromstring(master.part.part_related_by(RT.THEME).blob)
+        except (KeyError, etree.XMLSyntaxError):
+            theme = None
+        if theme is not None:
+            for slot in theme.xpath("//a:clrScheme/*", namespaces=_NS):
+                value = slot.xpath("./a:srgbClr/@val | ./a:sysClr/@lastClr", namespaces=_NS)
+                if value:
+                    self.scheme[etree.QName(slot).localname] = value[0]
+        clr_map = master.element.find("p:clrMap", _NS)
+        self.clr_map = dict(clr_map.attrib) if clr_map is not None else {"bg1": "lt1", "tx1": "dk1", "bg2": "lt2", "tx2": "dk2"}
+
+    def resolve(self, el):
+        """
+        RGB tuple for a color element (a:srgbClr, a:schemeClr, ...), or None.
+        """
+        kind, val = etree.QName(el).localname, el.get("val")
+        if kind == "srgbClr":
+            value = val
+        elif kind == "sysClr":
+            value = el.get("lastClr")
+        elif kind == "schemeClr":
+            value = self.scheme.get(self.clr_map.get(val, val), "")
+        elif kind == "prstClr":
+            value = _PRESET_COLORS.get(val)
+        else:
+            value = None
+        if not value or len(value) != 6:
+            return None
+        return _modified(_hex(value), el)
+
+    def scheme_color(self, name):
+        value = self.scheme.get(self.clr_map.get(name, name), "")
+        return _hex(value) if len(value) == 6 else None
+
+    def fill(self, parent, part):
+        """
+        The fill set directly under `parent` (e.g. p:spPr, p:bgPr): an RGB
+        tuple, image bytes, or None for no (or an unsupported) fill.
+        """
+        for el in parent:
+            kind = etree.QName(el).localname
+            if kind == "solidFill" and len(el):
+                return self.resolve(el[0])
+            if kind == "gradFill":
+                stop = el.find("a:gsLst/a:gs", _NS)
+                return self.resolve(stop[0]) if stop is not None and len(stop) else None
+            if kind == "blipFill":
+                return _blip(el, part)
+            if kind == "noFill":
+                return None
+        return None
+
+def _blip(blip_fill, part):
+    blip = blip_fill.find("a:blip", _NS)
+    try:
+        return part.related_part(blip.get(_EMBED)).blob if blip is not None else None
+    except KeyError:
+        return None
+
+# --- TEMPLATE DESIGN ---
+def _box(el):
+    xfrm = el.find("p:spPr/a:xfrm", _NS)
+    off = xfrm.find("a:off", _NS) if xfrm is not None else None
+    ext = xfrm.find("a:ext", _NS) if xfrm is not None else None
+    if off is None or ext is None:
+        return None
+    return int(off.get("x")), int(off.get("y")), int(ext.get("cx")), int(ext.get("cy"))
+
+def _open_image(blob):
+    try:
+        image = Image.open(io.BytesIO(blob))
+        image.load()
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None  # EMF/WMF/SVG or damaged media: not drawn
+    return image.convert("RGBA")
+
+@lru_cache(maxsize=256)
+def _font(path, px):
+    if path:
+        return ImageFont.truetype(path, px)
+    try:
+        return ImageFont.load_default(px)
+    except TypeError:
+        return ImageFont.load_default()  # Pillow < 10.1: one bitmap size
+
+@lru_cache(maxsize=16384)
+def _wrap(text, font, bold, width):
+    """
+    Lines of `text` wrapped greedily at spaces to `width` (em of `font`),
+    measured with the same metrics the exporter fits text with (text_fit), so
+    the breaks agree with its sizing. Words wider than a line are broken.
+    """
+    metrics = get_metrics(font, bold)
+    space = metrics.char_width(" ") / 1000
+    lines, current, used = [], "", 0.0
+    for word in text.split():
+        w = metrics.text_width(word)
+        if current and used + space + w <= width:
+            current, used = f"{current} {word}", used + space + w
+            continue
+        if current:
+            lines.append(current)
+        while w > width and len(word) > 1:
+            cut, taken = 0, 0.0
+            while cut < len(word) - 1 and taken + metrics.char_width(word[cut]) / 1000 <= width:
+                taken += metrics.char_width(word[cut]) / 1000
+                cut += 1
+            cut = max(cut, 1)
+            lines.append(word[:cut])
+            word = word[cut:]
+            w = metrics.text_width(word)
+        current, used = word, w
+    return tuple(lines + [current] if current or not lines else lines)
+
+class TextStyle:
+    """
+    How one placeholder's level-1 text looks: font, weight, color, alignment,
+    vertical anchor and whether it has bullets.
+    """
+    def __init__(self, ph, master, info, colors):
+        color = level1_style(ph, master, "a:defRPr/a:solidFill/*")
+        self.color = (colors.resolve(color) if color is not None else None) or colors.scheme_color("tx1") or BLACK
+        self.font = info.font
+        self.bold = level1_style(ph, master, "a:defRPr/@b") in ("1", "true")
+        self.align = level1_style(ph, master, "@algn") or "l"
+        master_type = PP_PLACEHOLDER.TITLE if info.type in TITLE_TYPES else PP_PLACEHOLDER.BODY
+        master_ph = master.placeholders.get(master_type)
+        anchors = ph.element.xpath("./p:txBody/a:bodyPr/@anchor") + (
+            master_ph.element.xpath("./p:txBody/a:bodyPr/@anchor") if master_ph is not None else [])
+        self.anchor = anchors[0] if anchors else "t"
+        self.bullet = level1_style(ph, master, "a:buNone") is None
+        self.hanging = int(level1_style(ph, master, "@indent") or 0)
+
+    def face(self, px):
+        source = get_metrics(self.font, self.bold).source
+        return _font(None if source == "builtin" else source, max(1, int(round(px))))
+
+class TemplateDesign:
+    """
+    A template's content layout, drawn once at one width: the background and
+    decoration layer plus the title/body text styles. draw() adds one slide's text.
+    """
+    def __init__(self, template_bytes, width=THUMB_WIDTH):
+        prs, index = template_cache.get(template_bytes)
+        self.index = index
+        self.layout = index.layouts[index.content_layout]
+        self.width = width
+        self.height = max(1, round(width * index.slide_height / index.slide_width))
+        self.scale = width / index.slide_width  # Pixels per EMU
+
+        slide_layout = prs.slide_layouts[self.layout.index]
+        master = slide_layout.slide_master
+        colors = _Colors(master)
+        self.base = self._background(slide_layout, master, colors)
+        parts = [master, slide_layout] if slide_layout.element.get("showMasterSp") != "0" else [slide_layout]
+        for owner in parts:
+            self._decorate(owner, colors)
+
+        by_idx = {ph.placeholder_format.idx: ph for ph in slide_layout.placeholders}
+        self.styles = {info.idx: TextStyle(by_idx[info.idx], master, info, colors)
+                       for info in (self.layout.title, self.layout.body) if info and info.idx in by_idx}
+
+    def _px(self, emu):
+        return emu * self.scale
+
+    def _background(self, slide_layout, master, colors):
+        for owner in (slide_layout, master):
+            bg = owner.element.find("p:cSld/p:bg", _NS)
+            if bg is None:
+                continue
+            props, ref = bg.find("p:bgPr", _NS), bg.find("p:bgRef", _NS)
+            fill = colors.fill(props, owner.part) if props is not None else (
+                colors.resolve(ref[0]) if ref is not None and len(ref) else None)
+            if isinstance(fill, bytes):
+                image = _open_image(fill)
+                if image is not None:
+                    return image.convert("RGB").resize((self.width, self.height), Image.LANCZOS)
+            elif fill:
+                return Image.new("RGB", (self.width, self.height), fill)
+        return Image.new("RGB", (self.width, self.height), WHITE)
+
+    def _decorate(self, owner, colors):
+        """
+        Draws the pictures and filled shapes of a layout or master, skipping placeholders.
+        """
+        draw = ImageDraw.Draw(self.base, "RGBA")
+        for el in owner.element.find("p:cSld/p:spTree", _NS):
+            kind = etree.QName(el).localname
+            if kind not in ("pic", "sp") or el.find(f"p:nv{kind.capitalize()}Pr/p:nvPr/p:ph", _NS) is not None:
+                continue
+            box = _box(el)
+            if not box or box[2] <= 0 or box[3] <= 0:
+                continue
+            left, top = round(self._px(box[0])), round(self._px(box[1]))
+            size = (max(1, round(self._px(box[2]))), max(1, round(self._px(box[3]))))
+            fill = _blip(el.find("p:blipFill", _NS), owner.part) if kind == "pic" else (
+                colors.fill(el.find("p:spPr", _NS), owner.part))
+            if isinstance(fill, bytes):
+                image = _open_image(fill)
+                if image is not None:
+                    image = image.resize(size, Image.LANCZOS)
+                    self.base.paste(image, (left, top), image)
+            elif fill:
+                geometry = el.xpath("./p:spPr/a:prstGeom/@prst")
+                shape = _SHAPES.get(geometry[0] if geometry else "rect", "rectangle")
+                xy = (left, top, left + size[0] - 1, top + size[1] - 1)
+                if shape == "rounded_rectangle":
+                    draw.rounded_rectangle(xy, radius=min(size) // 6, fill=fill)
+                else:
+                    getattr(draw, shape)(xy, fill=fill)
+
+    # --- SLIDE TEXT ---
+    def _text(self, draw, paragraphs, style, size_pt, box, indent=0, space_before=0, bullets=False):
+        """
+        Draws `paragraphs` at `size_pt` in the EMU `box` (left, top, width,
+        height), anchored the way the placeholder anchors its text.
+        """
+        px = size_pt * EMU_PER_PT * self.scale
+        face = style.face(px)
+        line_px, gap = px * LINE_SPACING, space_before * EMU_PER_PT * self.scale
+        left = self._px(box[0] + H_INSET)
+        inner = self._px(box[2] - 2 * H_INSET)
+        text_left, text_width = left + self._px(indent), inner - self._px(indent)
+        wrapped = [_wrap(p, style.font, style.bold, text_width / px) for p in paragraphs]
+        total = sum(len(lines) for lines in wrapped) * line_px + gap * max(len(wrapped) - 1, 0)
+        y = self._px(box[1] + V_INSET)
+        if style.anchor == "ctr":
+            y = self._px(box[1]) + (self._px(box[3]) - total) / 2
+        elif style.anchor == "b":
+            y = self._px(box[1] + box[3] - V_INSET) - total
+        for n, lines in enumerate(wrapped):
+            if n:
+                y += gap
+            if bullets and style.bullet:
+                # A dot rather than the template's bullet glyph, which the font may not have
+                cx, cy, r = left + self._px(indent + style.hanging) + px * 0.25, y + line_px / 2, max(1.0, px * 0.14)
+                draw.ellipse((cx - r, cy - r, cx + r, cy + r), fill=style.color)
+            for line in lines:
+                x = text_left
+                if style.align in ("ctr", "r"):
+                    # Placed by the drawn face's width: the fitting metrics may be a stand-in
+                    slack = text_width - face.getlength(line)
+                    x = text_left + (slack / 2 if style.align == "ctr" else slack)
+                draw.text((x, y), line, font=face, fill=style.color)
+                y += line_px
+
+    def draw(self, slide):
+        """
+        PNG bytes of `slide` (a Slide record) on this design.
+        """
+        plan = plan_slide(self.layout, self.index.slide_height, slide)
+        image = self.base.copy()
+        draw = ImageDraw.Draw(image, "RGBA")
+        title, body = self.layout.title, self.layout.body
+        if title and title.idx in self.styles:
+            box = (title.left, title.top, title.width, title.height)
+            draw.rectangle(self._rect(box), outline=OUTLINE)
+            size = plan.title_size or (round(title.font_size.pt) if title.font_size else 44)
+            self._text(draw, [slide.title], self.styles[title.idx], size, box)
+        if body and body.idx in self.styles:
+            box = (body.left, plan.body_top, body.width, plan.body_height)
+            if plan.body_height > 0:  # Not when a long title pushed the body off the slide
+                draw.rectangle(self._rect(box), outline=OUTLINE)
+            self._text(draw, slide.content, self.styles[body.idx], plan.body_size, box,
+                       indent=body.indent, space_before=BODY_SPACE_BEFORE_PT, bullets=True)
+        output = io.BytesIO()
+        image.save(output, "PNG", compress_level=1)
+        return output.getvalue()
+
+    def _rect(self, box):
+        left, top = self._px(box[0]), self._px(box[1])
+        return left, top, left + self._px(box[2]) - 1, top + self._px(box[3]) - 1
+
+# --- CACHE ---
+class ThumbnailCache:
+    """
+    LRU cache of thumbnail PNGs keyed by (template digest, slide hash, width),
+    plus one drawn design per (template digest, width). Bounded by the total
+    PNG size; designs are evicted along with the template's last thumbnail.
+    """
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_designs=8):
+        self.max_bytes = max_bytes
+        self.max_designs = max_designs
+        self._images = OrderedDict()   # (digest, slide hash, width) -> PNG bytes
+        self._designs = OrderedDict()  # (digest, width) -> TemplateDesign
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def design(self, digest, template_bytes, width):
+        with self._lock:
+            design = self._designs.get((digest, width))
+            if design:
+                self._designs.move_to_end((digest, width))
+                return design
+        with span("thumbnail_design"):
+            design = TemplateDesign(template_bytes, width)
+        with self._lock:
+            self._designs[(digest, width)] = design
+            while len(self._designs) > self.max_designs:
+                old, _ = self._designs.popitem(last=False)
+                for key in [k for k in self._images if (k[0], k[2]) == old]:
+                    self._total_bytes -= len(self._images.pop(key))
+        return design
+
+    def lookup(self, digest, hashes, width):
+        """
+        Returns {slide hash: PNG bytes} for the cached ones among `hashes`.
+        """
+        found = {}
+        with self._lock:
+            for h in hashes:
+                png = self._images.get((digest, h, width))
+                if png:
+                    self._images.move_to_end((digest, h, width))
+                    found[h] = png
+            self.hits += len(found)
+            self.misses += len(set(hashes) - set(found))
+        return found
+
+    def put(self, digest, h, width, png):
+        with self._lock:
+            if (digest, h, width) in self._images:
+                return
+            self._images[(digest, h, width)] = png
+            self._total_bytes += len(png)
+            while self._total_bytes > self.max_bytes and len(self._images) > 1:
+                _, old = self._images.popitem(last=False)
+                self._total_bytes -= len(old)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "thumbnails": len(self._images),
+                "designs": len(self._designs),
+                "bytes": self._total_bytes,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._images.clear()
+            self._designs.clear()
+            self._total_bytes = 0
+            self.hits = 0
+            self.misses = 0
+
+thumbnail_cache = ThumbnailCache()
+
+def warm_thumbnails(template, width=THUMB_WIDTH):
+    """
+    Draws a template's design layer ahead of its first preview grid.
+    """
+    template_bytes = read_template(template)
+    thumbnail_cache.design(hashlib.sha256(template_bytes).hexdigest(), template_bytes, width)
+
+def render_thumbnails(template, slides_data, width=THUMB_WIDTH):
+    """
+    One PNG (bytes) per slide of `slides_data` as the exporter would lay it out
+    on `template` (bytes, file-like or path), `width` pixels wide. Slides drawn
+    before against the same template come from the cache; equal slides are drawn once.
+    """
+    template_bytes = read_template(template)
+    digest = hashlib.sha256(template_bytes).hexdigest()
+    slides_data = normalize_slides(slides_data)
+    hashes = [slide_hash(slide) for slide in slides_data]
+    found = thumbnail_cache.lookup(digest, hashes, width)
+    dirty = {}
+    for h, slide in zip(hashes, slides_data):
+        if h not in found:
+            dirty.setdefault(h, slide)
+    if dirty:
+        design = thumbnail_cache.design(digest, template_bytes, width)
+        for h, slide in dirty.items():
+            with span("thumbnail_render"):
+                found[h] = design.draw(slide)
+            thumbnail_cache.put(digest, h, width, found[h])
+    return [found[h] for h in hashes]
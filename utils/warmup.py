@@ -0,0 +1,103 @@
+"""
+Moves one-time costs off the request path.
+
+start() warms provider SDKs and templates on a background thread, once per
+process, so the first generation, preview or export doesn't pay for SDK
+imports, template parsing, font metrics or the thumbnail background. The CLI
+prints an import-time profile (python -X importtime) of what the app imports
+at startup versus what warmup now loads in the background:
+
+    python -m utils.warmup
+"""
+import argparse
+import hashlib
+import subprocess
+import sys
+import threading
+import time
+
+_state = {}  # warmup key -> None (pending), seconds taken, or an error string
+_lock = threading.Lock()
+
+def _warm_engine():
+    import utils.ppt_engine  # noqa: F401  (python-pptx, lxml, Pillow)
+
+def _warm_provider(provider):
+    from utils.llm_engine import warmup_provider
+    warmup_provider(provider)
+
+def _warm_template(template_bytes):
+    from utils.ppt_engine import warm_template
+    from utils.thumbnails import warm_thumbnails
+    warm_template(template_bytes)
+    warm_thumbnails(template_bytes)
+
+def _run(tasks):
+    for key, fn, args in tasks:
+        started = time.perf_counter()
+        try:
+            fn(*args)
+            result = round(time.perf_counter() - started, 3)
+        except Exception as e:
+            result = f"failed: {e}"  # Warmup is best effort; the real request reports errors
+        with _lock:
+            _state[key] = result
+
+def start(providers=(), templates=()):
+    """
+    Warms the rendering engine, each provider SDK and each template (bytes)
+    that hasn't been warmed in this process yet. Returns the background
+    thread, or None when there was nothing new to do.
+    """
+    wanted = [("engine", _warm_engine, ())]
+    wanted += [(f"provider:{p}", _warm_provider, (p,)) for p in providers]
+    wanted += [(f"template:{hashlib.sha256(t).hexdigest()[:16]}", _warm_template, (t,)) for t in templates]
+    with _lock:
+        tasks = [task for task in wanted if task[0] not in _state]
+        for key, _, _ in tasks:
+            _state[key] = None
+    if not tasks:
+        return None
+    thread = threading.Thread(target=_run, args=(tasks,), name="warmup", daemon=True)
+    thread.start()
+    return thread
+
+def status():
+    with _lock:
+        return dict(_state)
+
+# --- IMPORT PROFILE ---
+# Imported when app.py starts vs. loaded by start() in the background
+STARTUP_MODULES = ["streamlit", "utils.jobs", "utils.llm_engine"]
+WARMED_MODULES = ["utils.ppt_engine", "utils.thumbnails", "openai", "anthropic", "google.ai.generativelanguage"]
+
+def import_cost(module):
+    """
+    Cumulative import time of `module` in a fresh interpreter, in ms, from
+    -X importtime. Returns None if it can't be imported.
+    """
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        return None
+    for line in reversed(proc.stderr.splitlines()):
+        parts = [p.strip() for p in line.split("|")]
+        if len(parts) == 3 and parts[2] == module:
+            return int(parts[1]) / 1000
+    return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m utils.warmup", description="Import-time profile of the app's modules.")
+    parser.add_argument("--modules", nargs="*", help="Profile these modules instead")
+    args = parser.parse_args(argv)
+
+    groups = [("extra", args.modules)] if args.modules else [("startup", STARTUP_MODULES), ("warmup", WARMED_MODULES)]
+    for group, modules in groups:
+        for module in modules:
+            cost = import_cost(module)
+            shown = "not installed" if cost is None else f"{cost:9.1f} ms"
+            print(f"{group:<8} {module:<24} {shown}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())